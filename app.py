@@ -1,21 +1,37 @@
 from datetime import datetime, timedelta
 import hashlib
 
-from flask import jsonify, redirect
+from flask import Response, current_app, jsonify, redirect, request, stream_with_context
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, get_jwt, get_jwt_identity, jwt_required
-from flask_openapi3 import OpenAPI, Info, Tag
-from flask_restful import Api, reqparse
-import requests
+from flask_openapi3 import Info, Tag
 
 from blacklist import BLACKLIST
 from model.produto import ProductBody, ProductPath
+from schemas.listagem import ListagemQuery
 from schemas.error import ErrorAuthorizationSchema, ErrorSchema, ServerErrorSchema
-from schemas.nota import ListagemNotaSchema, NotaSchema
-from schemas.produto import DeleteSchema, ListagemProdutosApiSchema, NotFoundSchema
+from schemas.monitoramento import EstatisticasSchema, ListagemPerfisSchema, PerfilPath, PerfilSchema
+from schemas.nota import JobPath, JobSchema, ListagemNotaSchema, NotaLoteItemSchema, NotaLoteSchema, NotaSchema
+from schemas.produto import DeleteSchema, ListagemProdutosApiSchema, NotFoundSchema, ProdutoCatalogoQuery
 from schemas.usuario import InvalidProtectedSchema, ListagemUsuariosApiSchema, LoginRepSchema
 from schemas.usuario import LoginSchema, LogoutSchema, ProtectedSchema, RegisterSchema
-from services.nota_fiscal_eletronica import NotaFiscalExtractor
+from services import metricas, repasse, resiliencia, upstream
+from services.aplicacao import GatewayOpenAPI, Rotas, carregar_spec
+from services.catalogo_produtos import CatalogoProdutos
+from services.espelho import IDENTIDADE_SINCRONIZACAO
+from services.espelho_usuarios import EspelhoUsuarios
+from services.importacao import ImportadorLote, ImportadorNota, RegistradorProdutos
+from services.jobs import JobRunner, carregar_store
+from services.json_rapido import ler_json
+from services.nota_cache import NotaCache, NotaDuplicada
+from services.profiler import PROFILER_HEADER, RequestProfiler
+from services.repasse import LISTAGEM_STREAMING, CursorInvalido, ler_cursor_posicao
+from services.resiliencia import UpstreamIndisponivel
+from services.response_cache import TTLCache
+from services.resposta_preparada import RespostaPreparada
+from services.singleflight import SingleFlight
+from services.token_cache import TokenCache
+from services.upstream import UpstreamClient
 
 import os
 from dotenv import load_dotenv
@@ -23,35 +39,41 @@ from dotenv import load_dotenv
 load_dotenv()
 
 info = Info(title="API Token", version="1.0.0", description="API para gerenciar acesso.")
-app = OpenAPI(__name__, info=info)
+JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=1)
 
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
-app.config['JWT_BLACKLIST_ENABLED'] = True
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
-
-api = Api(app)
-jwt = JWTManager(app)
-
-CORS(app) 
-
-@jwt.token_in_blocklist_loader
-def verifica_blacklist(self, token):
-    return token['jti'] in BLACKLIST
-
-@jwt.revoked_token_loader
-def token_de_acesso_invalidado(jwt_header, jwt_payload):
-    return jsonify({'mesage': 'Você foi desconectado.'}), 401
+tokens_servico = TokenCache(JWT_ACCESS_TOKEN_EXPIRES.total_seconds())
+perfilador = RequestProfiler()
+rotas = Rotas()
 
 home_tag = Tag(name="Documentação", description="Seleção de documentação: Swagger")
 auth_tag = Tag(name="Autentificação", description="Rotas para Autentificação")
 nota_tag = Tag(name="Nota fiscal", description="Rota para (API EXTERNA)")
 produto_tag = Tag(name="Produto", description="Rotas para Produto")
 usuario_tag = Tag(name="Usuário", description="Rotas para Usuário")
+monitoramento_tag = Tag(name="Monitoramento", description="Rotas para acompanhamento do gateway")
 
 
 api_usuario = os.getenv('SERVER1')
 api_produto = os.getenv('SERVER2')
 
+upstream_usuario = UpstreamClient('usuario', api_usuario)
+upstream_produto = UpstreamClient('produto', api_produto)
+nota_cache = NotaCache()
+cache_listagens = TTLCache()
+listagens_em_voo = SingleFlight()
+
+def token_sincronizacao():
+    return tokens_servico.obter('sincronizacao', IDENTIDADE_SINCRONIZACAO, lambda identidade: create_access_token(identity=identidade))
+
+espelho_usuarios = EspelhoUsuarios(upstream_usuario, token_sincronizacao)
+catalogo_produtos = CatalogoProdutos(upstream_produto, token_sincronizacao)
+registrador_produtos = RegistradorProdutos(upstream_produto, catalogo=catalogo_produtos)
+importador_nota = ImportadorNota(registrador_produtos, cache=nota_cache, listagens=cache_listagens,
+                                 catalogo=catalogo_produtos)
+importador_lote = ImportadorLote(importador_nota)
+NOTA_LOTE_MAX = int(os.getenv('NOTA_LOTE_MAX', 100))
+nota_jobs = JobRunner(carregar_store())
+
 security_scheme = {
     "Bearer Token": {
         "type": "http",
@@ -59,7 +81,48 @@ security_scheme = {
         "bearerFormat": "JWT"
     }
 }
-app.security_schemes = security_scheme
+
+def verifica_blacklist(self, token):
+    return token['jti'] in BLACKLIST
+
+def token_de_acesso_invalidado(jwt_header, jwt_payload):
+    return jsonify({'mesage': 'Você foi desconectado.'}), 401
+
+def create_app():
+    """ Cria o app do gateway.
+
+        Com OPENAPI_SPEC apontando para um documento gerado por `flask --app app:create_app openapi`,
+        a documentação é servida a partir dele em vez de ser montada rota a rota.
+    """
+    app = GatewayOpenAPI(__name__, info=info, spec=carregar_spec())
+
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
+    app.config['JWT_BLACKLIST_ENABLED'] = True
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = JWT_ACCESS_TOKEN_EXPIRES
+
+    jwt = JWTManager(app)
+    jwt.token_in_blocklist_loader(verifica_blacklist)
+    jwt.revoked_token_loader(token_de_acesso_invalidado)
+    BLACKLIST.init_app(app)
+    espelho_usuarios.init_app(app)
+    catalogo_produtos.init_app(app)
+
+    CORS(app)
+    metricas.instrumentar(app)
+    perfilador.init_app(app)
+    resiliencia.init_app(app)
+
+    app.security_schemes = security_scheme
+    rotas.registrar(app)
+    return app
+
+def __getattr__(nome):
+    # `app.app` continua disponível para quem importa o módulo, criado só no primeiro acesso.
+    if nome == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
 
 def verificar_token_valido():
     try:
@@ -74,7 +137,86 @@ def verificar_token_valido():
 
     return jsonify({'message': 'Token expirado ou inválido'}), 401
 
-@app.get('/', tags=[home_tag], doc_ui=False)
+def token_servico():
+    """ Token repassado aos serviços internos, reaproveitado enquanto for válido.
+    """
+    return tokens_servico.obter(get_jwt()['jti'], get_jwt_identity(), lambda identidade: create_access_token(identity=identidade))
+
+def buscar_listagem(cliente, path, chave):
+    preparada = cache_listagens.buscar(chave)
+    if preparada is not None:
+        return preparada.responder()
+
+    # A geração entra na chave: quem chega depois de uma escrita não pega uma busca anterior a ela.
+    geracao = cache_listagens.geracao
+    return responder_listagem(listagens_em_voo.executar(f"{chave}:{geracao}",
+                                                        lambda: buscar_listagem_upstream(cliente, path, chave, geracao)))
+
+def responder_listagem(resultado):
+    """ resultado é a RespostaPreparada da listagem, compartilhada pelo single-flight e pelo cache,
+        ou o erro (corpo, status); a ETag e a compressão dependem dos headers de cada requisição.
+    """
+    if isinstance(resultado, RespostaPreparada):
+        return resultado.responder()
+    return resultado
+
+def buscar_listagem_upstream(cliente, path, chave, geracao):
+    headers = {
+            'Authorization': f'Bearer {token_servico()}'  
+        }
+    
+    response = cliente.get(path, headers=headers)
+    return resposta_listagem(response, chave, geracao)
+
+def listagem_em_partes(formato, limite):
+    """ A listagem é repassada do upstream em partes (corpo original, NDJSON ou página) em vez de
+        montada em memória e guardada no cache.
+    """
+    return LISTAGEM_STREAMING or formato == 'ndjson' or bool(limite)
+
+def listar_upstream(cliente, path, chave, lista, query):
+    if not listagem_em_partes(query.formato, query.limite):
+        return buscar_listagem(cliente, path, chave)
+    try:
+        inicio = ler_cursor_posicao(query.cursor) if query.cursor else 0
+    except CursorInvalido:
+        return {'error': 'Cursor inválido.'}, 400
+
+    headers = {
+            'Authorization': f'Bearer {token_servico()}'
+        }
+    response = cliente.get(path, headers=headers, stream=True)
+    if response.status_code != 200:
+        response.close()
+        return erro_listagem(response.status_code)
+
+    if query.formato == 'ndjson':
+        return Response(repasse.gerar_ndjson(repasse.lotes(response, lista)), mimetype='application/x-ndjson')
+    if query.limite:
+        return Response(repasse.gerar_pagina(repasse.lotes(response, lista), lista, inicio, query.limite),
+                        mimetype='application/json')
+    return Response(repasse.repassar(response), content_type=response.headers.get('Content-Type', 'application/json'))
+
+# As funções resposta_* traduzem a resposta do upstream (requests ou httpx, no modo ASGI) no retorno da rota.
+def resposta_listagem(response, chave, geracao):
+    if response.status_code == 200:
+        # O corpo do upstream já é o JSON da listagem: vai para o cache sem ser decodificado.
+        preparada = RespostaPreparada(response.content)
+        cache_listagens.salvar(chave, preparada, geracao)
+        return preparada
+    return erro_listagem(response.status_code)
+
+def erro_listagem(status_code):
+    if status_code == 401:
+        return {"error": "Token inválido ou expirado"}, 401
+    elif status_code == 404:
+        return {"error": "Endpoint não encontrado"}, 404
+    elif status_code == 500:
+        return {"error": "Erro interno no servidor"}, 500
+    else:
+        return {"error": f"Erro inesperado: {status_code}"}, status_code
+
+@rotas.get('/', tags=[home_tag], doc_ui=False)
 def home():
     """ Home da aplicação.
 
@@ -82,7 +224,7 @@ def home():
     """
     return redirect('/openapi/swagger')
 
-@app.get('/protected', methods=['GET'], tags=[auth_tag], 
+@rotas.get('/protected', methods=['GET'], tags=[auth_tag], 
          responses={
                     "200": ProtectedSchema,
                     "401": InvalidProtectedSchema,
@@ -99,7 +241,7 @@ def protected():
     else:
         return jsonify({'message': 'Token expirado'}), 401
     
-@app.get('/usuarios', methods=['GET'], tags=[usuario_tag], 
+@rotas.get('/usuarios', methods=['GET'], tags=[usuario_tag], 
          responses={
                     "200": ListagemUsuariosApiSchema, 
                     "400": ErrorSchema, 
@@ -107,172 +249,210 @@ def protected():
                     "500": ServerErrorSchema}, 
         security=[{"Bearer Token": []}])
 @jwt_required()
-def all_users():
+def all_users(query: ListagemQuery):
     """ Mostra todos os usuários.
 
-        Retorna todos os usuários registrados se o login for valido.
+        Retorna todos os usuários registrados se o login for valido. Com formato=ndjson ou limite a
+        listagem é repassada do upstream conforme chega, sem ser montada em memória; cursor sem
+        limite é recusado (400).
      """
-    url = f"{api_usuario}/api/usuarios"
-    
-    headers = {
-            'Authorization': f'Bearer {create_access_token(identity=get_jwt_identity())}'  
-        }
-    
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        return response.json(), 200
-    elif response.status_code == 401:
-        return {"error": "Token inválido ou expirado"}, 401
-    elif response.status_code == 404:
-        return {"error": "Endpoint não encontrado"}, 404
-    elif response.status_code == 500:
-        return {"error": "Erro interno no servidor"}, 500
-    else:
-        return {"error": f"Erro inesperado: {response.status_code}"}, response.status_code
+    recusa = cursor_sem_limite(query)
+    if recusa is not None:
+        return recusa
+    return listar_upstream(upstream_usuario, '/api/usuarios', 'usuarios', 'Users', query)
 
-@app.get('/produtos', methods=['GET'], tags=[produto_tag], 
+@rotas.get('/produtos', methods=['GET'], tags=[produto_tag], 
         responses={
                     "200": ListagemProdutosApiSchema, 
                     "400": ErrorSchema, 
                     "401": ErrorAuthorizationSchema, 
-                    "500": ServerErrorSchema}, 
+                    "500": ServerErrorSchema,
+                    "503": ErrorSchema}, 
         security=[{"Bearer Token": []}])
 @jwt_required()
-def all_products():
+def all_products(query: ProdutoCatalogoQuery):
     """ Mostra todos os produtos.
 
-        Retorna todos os produtos cadastrados.
+        Retorna todos os produtos cadastrados. Com o catálogo local ativo (PRODUTOS_CATALOGO) aceita
+        filtros por prefixo do nome e da descrição e faixa de preço, ordenação e paginação por cursor.
+        Sem ele, formato=ndjson e limite repassam a listagem do upstream conforme chega e os filtros
+        são recusados (400, ou 503 até a primeira sincronização do catálogo).
      """
-    url = f"{api_produto}/api/produtos"
-    
-    headers = {
-            'Authorization': f'Bearer {create_access_token(identity=get_jwt_identity())}'  
-        }
-    
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        return response.json(), 200
-    elif response.status_code == 401:
-        return {"error": "Token inválido ou expirado"}, 401
-    elif response.status_code == 404:
-        return {"error": "Endpoint não encontrado"}, 404
-    elif response.status_code == 500:
-        return {"error": "Erro interno no servidor"}, 500
-    else:
-        return {"error": f"Erro inesperado: {response.status_code}"}, response.status_code
+    if catalogo_produtos.pronto:
+        return consultar_catalogo(query)
+    recusa = filtros_sem_catalogo(query)
+    if recusa is not None:
+        return recusa
+    return listar_upstream(upstream_produto, '/api/produtos', 'produtos', 'products', query)
+
+def filtros_sem_catalogo(query):
+    """ Filtros e ordenação só existem no catálogo local: sem ele a listagem do upstream viria sem
+        aplicá-los, então a requisição é recusada. O cursor do upstream só é lido junto com o limite.
+    """
+    filtros = query.model_dump(include=FILTROS_CATALOGO, exclude_defaults=True)
+    if not filtros and not (query.cursor and not query.limite):
+        return None
+    if catalogo_produtos.ativo:
+        return ({'error': 'Catálogo de produtos ainda não sincronizado; filtros e ordenação indisponíveis.'}, 503,
+                {'Retry-After': str(int(catalogo_produtos.sync))})
+    return {'error': 'Filtros, ordenação e cursor sem limite exigem o catálogo local (PRODUTOS_CATALOGO).'}, 400
+
+def cursor_sem_limite(query):
+    """ O cursor do upstream só é lido junto com o limite: sem ele a listagem viria inteira, desde o
+        início, então a requisição é recusada.
+    """
+    if query.cursor and not query.limite:
+        return {'error': 'O cursor exige o limite.'}, 400
+    return None
 
-@app.post('/login', tags=[auth_tag], responses={"200": LoginRepSchema, "400": ErrorSchema, "500":ServerErrorSchema})
+FILTROS_CATALOGO = {'nome', 'descricao', 'preco_min', 'preco_max', 'ordenar', 'ordem'}
+
+def consultar_catalogo(query):
+    try:
+        resultado = catalogo_produtos.consultar(**query.model_dump(exclude={'formato'}))
+    except CursorInvalido:
+        return {'error': 'Cursor inválido para esta ordenação.'}, 400
+    if query.formato == 'ndjson':
+        linhas = b''.join(current_app.json.serializar(produto) + b'\n' for produto in resultado['products'])
+        return Response(linhas, mimetype='application/x-ndjson')
+    return RespostaPreparada(current_app.json.serializar(resultado)).responder()
+
+@rotas.post('/login', tags=[auth_tag], responses={"200": LoginRepSchema, "400": ErrorSchema, "500":ServerErrorSchema})
 def login(body:LoginSchema):
     """ Autentificação para o usuário.
 
         Está sendo usado o JWT para a segurança dos endpoints, o retorno será um token e o login.
     """
-    atributos = reqparse.RequestParser()
-    atributos.add_argument('login', type=str, required=True)
-    atributos.add_argument('senha', type=str, required=True)
-    dados = atributos.parse_args()
+    senha_hash = hashlib.sha256(body.senha.encode()).hexdigest()
 
-    senha_hash = hashlib.sha256(dados['senha'].encode()).hexdigest()
-    url = f"{api_usuario}/api/verifica_senha"
+    identidade = espelho_usuarios.verificar(body.login, senha_hash)
+    if identidade is not None:
+        return emitir_login(identidade, body.login)
     
     body_envio= {
-                 'login':dados['login'],
+                 'login':body.login,
                  'senha': senha_hash
                  }
     
-    response = requests.post(url, json=body_envio)
+    response = upstream_usuario.post('/api/verifica_senha', json=body_envio)
+    espelho_usuarios.aprender(body.login, senha_hash, response)
+    return resposta_login(response, body.login)
 
+def resposta_login(response, login):
     if response.status_code == 201:
-        token_de_acesso = create_access_token(identity=response.json())  
-        data = response.json()  
-        nivel = data.get('nivel') 
-        return {
-            'login': dados['login'],
-            'access_token': token_de_acesso,
-            'nivel':nivel
-        }, 200
+        return emitir_login(ler_json(response), login)
     else:
         return {'message': 'Erro ao efetuar o login.'}, 400
+
+def emitir_login(identidade, login):
+    token_de_acesso = create_access_token(identity=identidade)
+    return {
+        'login': login,
+        'access_token': token_de_acesso,
+        'nivel': identidade.get('nivel')
+    }, 200
     
-@app.post('/register', tags=[usuario_tag], responses={"201": LoginRepSchema, "400": ErrorSchema, "500":ServerErrorSchema})
+@rotas.post('/register', tags=[usuario_tag], responses={"201": LoginRepSchema, "400": ErrorSchema, "500":ServerErrorSchema})
 def register(body:RegisterSchema):
     """ Cria um novo usuário.
 
         Cria um usuário caso tenha a chave de acesso.
     """
-    
-    atributos = reqparse.RequestParser()
-    atributos.add_argument('login', type=str, required=True)
-    atributos.add_argument('senha', type=str, required=True)
-    atributos.add_argument('nivel', type=int, required=True)
-    atributos.add_argument('email', type=str, required=True)
-    dados = atributos.parse_args()
-    
-    url = f"{api_usuario}/api/registrar"
-    
     envio = {
-        'login': dados['login'],
-        'senha': dados['senha'],
-        'nivel': dados['nivel'],
-        'email': dados['email']
+        'login': body.login,
+        'senha': body.senha,
+        'nivel': body.nivel,
+        'email': body.email
     }
    
-    response = requests.post(url, json=envio)
+    response = upstream_usuario.post('/api/registrar', json=envio)
+    return resposta_register(response)
+
+def resposta_register(response):
+    cache_listagens.invalidar('usuarios')
     
     if response.status_code == 201:
-        return response.json(), 201
+        espelho_usuarios.agendar()
+        return ler_json(response), 201
     else: 
-        return response.json(), 400
+        return ler_json(response), 400
     
-@app.post('/nota_url', tags=[nota_tag], responses={"201": ListagemNotaSchema, "400": ErrorSchema, "401": ErrorAuthorizationSchema, "500":ServerErrorSchema}, security=[{"Bearer Token": []}])
+@rotas.post('/nota_url', tags=[nota_tag], responses={"201": ListagemNotaSchema, "202": JobSchema, "400": ErrorSchema, "409": ErrorSchema, "401": ErrorAuthorizationSchema, "500":ServerErrorSchema}, security=[{"Bearer Token": []}])
 @jwt_required()
 def post_nota(body: NotaSchema):
     """ Busca os produtos da nota.
 
-        Recebe as informações da nota fiscal e cadastra os produtos.
+        Recebe as informações da nota fiscal e cadastra os produtos. Com 'assincrono' a importação
+        roda em segundo plano e o retorno 202 traz o id do job para consulta em /nota_jobs/<id>.
     """
-    atributos = reqparse.RequestParser()
-    atributos.add_argument('nota_url', type=str, required=True)
-    dados = atributos.parse_args()
-
-    if not dados['nota_url'] or dados['nota_url'] is None:
+    if not body.nota_url:
         return {"mesage": "O campo 'nota_url' precisa estar preenchido."}, 400
 
-    try:
-        nota_fiscal_extractor = NotaFiscalExtractor(url=dados['nota_url'])
-        nota_fiscal = nota_fiscal_extractor.extract()
-        
-        dados_t_list = []
-        empresa = nota_fiscal["Empresa"]["Nome da Empresa"]
-
-        for item in nota_fiscal["Itens"]:
-            dados_t = {
-                'nome': item["Produto"],
-                'descricao': empresa,
-                'preco': float(item["Vl. Total"].replace(",", ".")),
-                'quantidade': int(item["Qtde"])
-            }
-            dados_t_list.append(dados_t)
-
-        headers = {
-            'Authorization': f'Bearer {create_access_token(identity=get_jwt_identity())}'
-        }
+    headers = {
+        'Authorization': f'Bearer {token_servico()}'
+    }
+
+    if body.assincrono:
+        job = nota_jobs.submeter(importador_nota.importar, body.nota_url, headers, dono=get_jwt_identity())
+        return {'id': job['id'], 'status': job['status'], 'criado_em': job['criado_em']}, 202, \
+            {'Location': f"/nota_jobs/{job['id']}"}
 
-        for dados in dados_t_list:
-            body_env = {
-                'nome': dados['nome'],
-                'descricao': dados['descricao'],
-                'preco': dados['preco'],
-                'quantidade': dados['quantidade']
-            }
-            url = f"{api_produto}/api/registrar"
-            response = requests.post(url, json=body_env, headers=headers)
-
-        return jsonify({"Itens": dados_t_list}), 201
+    try:
+        return jsonify(importador_nota.importar(body.nota_url, headers)), 201
+    except NotaDuplicada as e:
+        return {'mesage': e.mensagem}, 409
+    except UpstreamIndisponivel:
+        raise
     except Exception as e:
         return {'mesage': 'Ocorreu um erro na leitura'}, 500
 
-@app.post('/logout', tags=[auth_tag], responses={"200": LogoutSchema,"500":ServerErrorSchema}, security=[{"Bearer Token": []}])
+@rotas.post('/nota_url/lote', tags=[nota_tag],
+          responses={
+                    "200": NotaLoteItemSchema,
+                    "400": ErrorSchema,
+                    "401": ErrorAuthorizationSchema,
+                    "500": ServerErrorSchema},
+          security=[{"Bearer Token": []}])
+@jwt_required()
+def post_nota_lote(body: NotaLoteSchema):
+    """ Importa várias notas de uma vez.
+
+        Lê as notas em paralelo e devolve em NDJSON uma linha por nota, na ordem em que cada uma termina.
+    """
+    if len(body.nota_urls) > NOTA_LOTE_MAX:
+        return {"mesage": f"Envie no máximo {NOTA_LOTE_MAX} notas por lote."}, 400
+    if not all(body.nota_urls):
+        return {"mesage": "O campo 'nota_urls' não pode ter links vazios."}, 400
+
+    headers = {
+        'Authorization': f'Bearer {token_servico()}'
+    }
+
+    def gerar():
+        for resultado in importador_lote.importar(body.nota_urls, headers):
+            yield current_app.json.dumps(resultado) + "\n"
+
+    return Response(stream_with_context(gerar()), mimetype='application/x-ndjson')
+
+@rotas.get('/nota_jobs/<string:id>', tags=[nota_tag],
+         responses={
+                    "200": JobSchema,
+                    "401": ErrorAuthorizationSchema,
+                    "404": NotFoundSchema,
+                    "500": ServerErrorSchema},
+        security=[{"Bearer Token": []}])
+@jwt_required()
+def get_nota_job(path: JobPath):
+    """ Consulta uma importação assíncrona.
+
+        Retorna o status do job e, quando concluído, os itens cadastrados da nota.
+    """
+    job = nota_jobs.buscar(path.id)
+    if job is None or job.pop('dono') != get_jwt_identity():
+        return {"error": "Job não encontrado."}, 404
+    return job, 200
+
+@rotas.post('/logout', tags=[auth_tag], responses={"200": LogoutSchema,"500":ServerErrorSchema}, security=[{"Bearer Token": []}])
 @jwt_required()
 def logout():
     """ Desconecta o usuário.
@@ -280,12 +460,12 @@ def logout():
         Adiciona na blacklist o token do usuário conectado e faz com que ele seja impossibilitado de usar novamente.
     """
     try:
-        jwt_id = get_jwt()['jti']
-        BLACKLIST.add(jwt_id)
+        token = get_jwt()
+        BLACKLIST.add(token['jti'], token.get('exp'))
         return {'mesage': 'Saiu com sucesso!'}, 200
     except: {'mesage': 'Server error'}, 500
     
-@app.delete('/produto/<int:id>', tags=[produto_tag], 
+@rotas.delete('/produto/<int:id>', tags=[produto_tag], 
             responses={
                     "200": DeleteSchema, 
                     "400": ErrorSchema, 
@@ -301,11 +481,16 @@ def delete_Product(path: ProductPath):
     """
 
     headers = {
-        'Authorization': f'Bearer {create_access_token(identity=get_jwt_identity())}'  
+        'Authorization': f'Bearer {token_servico()}'  
     }
 
-    url_delete = f"{api_produto}/api/produto/{path.id}"
-    response_delete = requests.delete(url_delete, headers=headers)
+    response_delete = upstream_produto.delete(f"/api/produto/{path.id}", headers=headers)
+    return resposta_delete(response_delete, path.id)
+
+def resposta_delete(response_delete, product_id):
+    cache_listagens.invalidar('produtos')
+    if response_delete.status_code in (200, 404):
+        catalogo_produtos.remover(product_id)
 
     if response_delete.status_code == 200:
         return {"message": "Produto deletado com sucesso."}, 200
@@ -314,7 +499,7 @@ def delete_Product(path: ProductPath):
     else:
         return {"error": "Erro ao deletar o produto."}, response_delete.status_code
     
-@app.put('/produto/<int:id>', tags=[produto_tag], 
+@rotas.put('/produto/<int:id>', tags=[produto_tag], 
         responses={
                     "200": ProductBody, 
                     "400": ErrorSchema, 
@@ -330,7 +515,7 @@ def edit_Product(path: ProductPath, body: ProductBody):
     """
 
     headers = {
-        'Authorization': f'Bearer {create_access_token(identity=get_jwt_identity())}'  
+        'Authorization': f'Bearer {token_servico()}'  
     }
 
     body_send = {
@@ -340,8 +525,15 @@ def edit_Product(path: ProductPath, body: ProductBody):
         'quantidade': body.quantidade,
     }
     
-    url_edit = f"{api_produto}/api/produto/{path.id}"
-    response_edit = requests.put(url_edit, json=body_send, headers=headers)
+    response_edit = upstream_produto.put(f"/api/produto/{path.id}", json=body_send, headers=headers)
+    return resposta_edit(response_edit, path.id, body_send)
+
+def resposta_edit(response_edit, product_id, campos):
+    cache_listagens.invalidar('produtos')
+    if response_edit.status_code == 200:
+        catalogo_produtos.atualizar(product_id, campos)
+    elif response_edit.status_code == 404:
+        catalogo_produtos.remover(product_id)
 
     if response_edit.status_code == 200:
         return {"message": "Produto editado com sucesso."}, 200
@@ -350,5 +542,82 @@ def edit_Product(path: ProductPath, body: ProductBody):
     else:
         return {"error": "Erro ao editar o produto."}, response_edit.status_code
 
+@rotas.get('/estatisticas', tags=[monitoramento_tag],
+         responses={
+                    "200": EstatisticasSchema,
+                    "401": ErrorAuthorizationSchema,
+                    "500": ServerErrorSchema},
+        security=[{"Bearer Token": []}])
+@jwt_required()
+def estatisticas():
+    """ Estatísticas do gateway.
+
+        Retorna o uso dos pools de conexão de cada upstream (hits, novas conexões e tempo de espera)
+        os acertos do cache de notas e do cache das listagens, as buscas agrupadas pelo single-flight
+        os tokens de serviço reaproveitados, as consultas à lista de tokens revogados e os espelhos
+        locais de usuários (login) e de produtos (catálogo).
+    """
+    return {
+        'upstream': upstream.estatisticas(),
+        'nota_cache': nota_cache.json(),
+        'cache_listagens': cache_listagens.json(),
+        'singleflight': listagens_em_voo.json(),
+        'tokens_servico': tokens_servico.json(),
+        'revogacao': BLACKLIST.json(),
+        'usuarios_espelho': espelho_usuarios.json(),
+        'catalogo_produtos': catalogo_produtos.json()
+    }, 200
+
+@rotas.get('/metrics', tags=[monitoramento_tag], responses={"200": None})
+def metrics():
+    """ Métricas no formato do Prometheus.
+
+        Duração, requisições em andamento e erros de cada rota e de cada upstream (usuários,
+        produtos e portais da SEFAZ) e a duração das etapas da leitura e importação das notas.
+    """
+    return Response(metricas.REGISTRO.exportar(), mimetype=metricas.CONTENT_TYPE)
+
+PERFIS_NEGADOS = {'message': 'Consulta dos perfis exige o header X-Profile-Token igual a PROFILER_TOKEN.'}, 403
+
+@rotas.get('/perfis', tags=[monitoramento_tag],
+         responses={
+                    "200": ListagemPerfisSchema,
+                    "401": ErrorAuthorizationSchema,
+                    "403": ErrorSchema,
+                    "500": ServerErrorSchema},
+        security=[{"Bearer Token": []}])
+@jwt_required()
+def listar_perfis():
+    """ Perfis das requisições recentes.
+
+        Lista os perfis guardados, do mais recente para o mais antigo. Uma requisição é perfilada
+        quando traz o header X-Profile-Token igual a PROFILER_TOKEN ou é sorteada por PROFILER_SAMPLE_RATE.
+        A consulta também exige o header X-Profile-Token: os perfis mostram rotas e código de todos os usuários.
+    """
+    if not perfilador.autorizado(request.headers.get(PROFILER_HEADER)):
+        return PERFIS_NEGADOS
+    return {'perfis': perfilador.listar()}, 200
+
+@rotas.get('/perfis/<string:id>', tags=[monitoramento_tag],
+         responses={
+                    "200": PerfilSchema,
+                    "401": ErrorAuthorizationSchema,
+                    "403": ErrorSchema,
+                    "404": NotFoundSchema,
+                    "500": ServerErrorSchema},
+        security=[{"Bearer Token": []}])
+@jwt_required()
+def get_perfil(path: PerfilPath):
+    """ Consulta um perfil.
+
+        Retorna as funções mais custosas (cProfile) ou as pilhas mais frequentes (amostragem) da requisição.
+    """
+    if not perfilador.autorizado(request.headers.get(PROFILER_HEADER)):
+        return PERFIS_NEGADOS
+    perfil = perfilador.buscar(path.id)
+    if perfil is None:
+        return {"error": "Perfil não encontrado."}, 404
+    return perfil, 200
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0')
\ No newline at end of file
+    create_app().run(debug=True, host='0.0.0.0')
\ No newline at end of file
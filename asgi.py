@@ -0,0 +1,347 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import io
+import os
+import sys
+from urllib.parse import parse_qs
+
+from flask import abort, current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from pydantic import ValidationError
+from werkzeug.exceptions import HTTPException
+
+import app as gateway
+from model.produto import ProductBody
+from schemas.listagem import ListagemQuery
+from schemas.nota import NotaSchema
+from schemas.produto import ProdutoCatalogoQuery
+from schemas.usuario import LoginSchema, RegisterSchema
+from services import nota_fiscal_eletronica
+from services.nota_cache import NotaDuplicada
+from services.resiliencia import UpstreamIndisponivel
+from services.upstream_async import AsyncSingleFlight, AsyncUpstreamClient
+
+# Modo ASGI: `uvicorn asgi:app`. As rotas que só repassam chamadas para SERVER1/SERVER2 e a
+# importação de notas rodam como corrotinas com httpx; as demais (documentação, jobs, lote,
+# monitoramento) continuam no app Flask, executado em um pool de ASGI_WSGI_THREADS threads.
+
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 32))
+
+upstream_usuario = AsyncUpstreamClient(gateway.upstream_usuario)
+upstream_produto = AsyncUpstreamClient(gateway.upstream_produto)
+listagens_em_voo = AsyncSingleFlight()
+
+
+def validar_corpo(modelo):
+    """ Valida o corpo como o flask_openapi3 faz, devolvendo o mesmo 422 em caso de erro.
+    """
+    obj = request.get_json(silent=True)
+    try:
+        if isinstance(obj, str):
+            return modelo.model_validate_json(json_data=obj)
+        return modelo.model_validate(obj=obj)
+    except ValidationError as e:
+        abort(current_app.validation_error_callback(e))
+
+
+def validar_query(modelo):
+    try:
+        return modelo.model_validate(obj=request.args.to_dict())
+    except ValidationError as e:
+        abort(current_app.validation_error_callback(e))
+
+
+def headers_servico():
+    return {
+        'Authorization': f'Bearer {gateway.token_servico()}'
+    }
+
+
+async def verificar_jwt():
+    # A verificação consulta a lista de tokens revogados (SQLite e filtro de Bloom): fora do event
+    # loop. O to_thread copia o contexto, e a identidade verificada fica no g da requisição.
+    await asyncio.to_thread(verify_jwt_in_request)
+
+
+async def buscar_listagem(cliente, path, chave):
+    preparada = gateway.cache_listagens.buscar(chave)
+    if preparada is not None:
+        return preparada.responder()
+
+    geracao = gateway.cache_listagens.geracao
+    return gateway.responder_listagem(await listagens_em_voo.executar(
+        f"{chave}:{geracao}", lambda: buscar_listagem_upstream(cliente, path, chave, geracao)))
+
+
+async def buscar_listagem_upstream(cliente, path, chave, geracao):
+    response = await cliente.get(path, headers=headers_servico())
+    return gateway.resposta_listagem(response, chave, geracao)
+
+
+async def all_users():
+    query = validar_query(ListagemQuery)
+    await verificar_jwt()
+    recusa = gateway.cursor_sem_limite(query)
+    if recusa is not None:
+        return recusa
+    return await buscar_listagem(upstream_usuario, '/api/usuarios', 'usuarios')
+
+
+async def all_products():
+    query = validar_query(ProdutoCatalogoQuery)
+    await verificar_jwt()
+    if gateway.catalogo_produtos.pronto:
+        return await asyncio.to_thread(gateway.consultar_catalogo, query)
+    recusa = gateway.filtros_sem_catalogo(query)
+    if recusa is not None:
+        return recusa
+    return await buscar_listagem(upstream_produto, '/api/produtos', 'produtos')
+
+
+async def login():
+    body = validar_corpo(LoginSchema)
+
+    senha_hash = hashlib.sha256(body.senha.encode()).hexdigest()
+    # O espelho consulta e grava no SQLite: fora do event loop.
+    identidade = await asyncio.to_thread(gateway.espelho_usuarios.verificar, body.login, senha_hash)
+    if identidade is not None:
+        return gateway.emitir_login(identidade, body.login)
+
+    body_envio = {
+        'login': body.login,
+        'senha': senha_hash
+    }
+
+    response = await upstream_usuario.post('/api/verifica_senha', json=body_envio)
+    await asyncio.to_thread(gateway.espelho_usuarios.aprender, body.login, senha_hash, response)
+    return gateway.resposta_login(response, body.login)
+
+
+async def register():
+    body = validar_corpo(RegisterSchema)
+
+    envio = {
+        'login': body.login,
+        'senha': body.senha,
+        'nivel': body.nivel,
+        'email': body.email
+    }
+
+    response = await upstream_usuario.post('/api/registrar', json=envio)
+    return gateway.resposta_register(response)
+
+
+async def post_nota():
+    body = validar_corpo(NotaSchema)
+    await verificar_jwt()
+
+    if not body.nota_url:
+        return {"mesage": "O campo 'nota_url' precisa estar preenchido."}, 400
+
+    headers = headers_servico()
+
+    if body.assincrono:
+        job = gateway.nota_jobs.submeter(gateway.importador_nota.importar, body.nota_url, headers,
+                                         dono=get_jwt_identity())
+        return {'id': job['id'], 'status': job['status'], 'criado_em': job['criado_em']}, 202, \
+            {'Location': f"/nota_jobs/{job['id']}"}
+
+    try:
+        return jsonify(await gateway.importador_nota.importar_async(body.nota_url, headers, upstream_produto)), 201
+    except NotaDuplicada as e:
+        return {'mesage': e.mensagem}, 409
+    except UpstreamIndisponivel:
+        raise
+    except Exception:
+        return {'mesage': 'Ocorreu um erro na leitura'}, 500
+
+
+async def delete_product(id):
+    await verificar_jwt()
+    response_delete = await upstream_produto.delete(f"/api/produto/{id}", headers=headers_servico())
+    return await asyncio.to_thread(gateway.resposta_delete, response_delete, id)
+
+
+async def edit_product(id):
+    body = validar_corpo(ProductBody)
+    await verificar_jwt()
+
+    body_send = {
+        'nome': body.nome,
+        'descricao': body.descricao,
+        'preco': body.preco,
+        'quantidade': body.quantidade,
+    }
+
+    response_edit = await upstream_produto.put(f"/api/produto/{id}", json=body_send, headers=headers_servico())
+    return await asyncio.to_thread(gateway.resposta_edit, response_edit, id, body_send)
+
+
+# Endpoint do Flask (nome da função da rota em app.py) -> versão assíncrona.
+# As listagens repassadas em partes (NDJSON, página ou LISTAGEM_STREAMING) ficam no Flask, que envia
+# cada parte assim que sai.
+ROTAS_ASYNC = {
+    'all_users': all_users,
+    'all_products': all_products,
+    'login': login,
+    'register': register,
+    'post_nota': post_nota,
+    'delete_Product': delete_product,
+    'edit_Product': edit_product
+}
+LISTAGENS = {'all_users', 'all_products'}
+
+
+def _environ(scope, corpo):
+    servidor = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': servidor[0],
+        'SERVER_PORT': str(servidor[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'CONTENT_LENGTH': str(len(corpo)),
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(corpo),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for nome, valor in scope['headers']:
+        nome = nome.decode('latin1').upper().replace('-', '_')
+        valor = valor.decode('latin1')
+        if nome == 'CONTENT_LENGTH':
+            continue
+        chave = nome if nome == 'CONTENT_TYPE' else f'HTTP_{nome}'
+        environ[chave] = f"{environ[chave]},{valor}" if chave in environ else valor
+    return environ
+
+
+async def _ler_corpo(receive):
+    partes = []
+    while True:
+        mensagem = await receive()
+        partes.append(mensagem.get('body', b''))
+        if not mensagem.get('more_body'):
+            return b''.join(partes)
+
+
+class GatewayASGI:
+    """ Aplicação ASGI do gateway: as rotas de ROTAS_ASYNC rodam no event loop, o resto no Flask.
+
+        Cada requisição assíncrona passa pelo mesmo ciclo do Flask (before_request, tratadores de
+        erro do JWT, after_request do CORS, métricas e teardown), então os retornos, os erros e a
+        documentação OpenAPI são os mesmos do modo WSGI.
+    """
+    def __init__(self, app, rotas, threads=ASGI_WSGI_THREADS):
+        self.app = app
+        self.rotas = rotas
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+        self.rotas_flask = app.url_map.bind('localhost')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+
+        if scope['type'] == 'http':
+            try:
+                endpoint, argumentos = self.rotas_flask.match(scope['path'], scope['method'])
+            except HTTPException:
+                endpoint, argumentos = None, None
+            view = self.rotas.get(endpoint)
+            if endpoint in LISTAGENS:
+                consulta = parse_qs(scope.get('query_string', b'').decode('latin1'))
+                if gateway.listagem_em_partes(consulta.get('formato', [None])[-1], consulta.get('limite', [None])[-1]):
+                    view = None
+            if view is not None:
+                return await self._despachar(scope, receive, send, view, argumentos)
+
+        await self._wsgi(scope, receive, send)
+
+    async def _wsgi(self, scope, receive, send):
+        """ Executa o app Flask em uma thread, repassando cada parte da resposta (NDJSON do lote) assim que sai.
+        """
+        environ = _environ(scope, await _ler_corpo(receive))
+        loop = asyncio.get_running_loop()
+
+        def enviar(mensagem):
+            asyncio.run_coroutine_threadsafe(send(mensagem), loop).result()
+
+        def executar():
+            inicio = {}
+
+            def start_response(status, headers, exc_info=None):
+                inicio['status'] = int(status.split(' ', 1)[0])
+                inicio['headers'] = [(nome.lower().encode('latin1'), valor.encode('latin1')) for nome, valor in headers]
+
+            resultado = self.app(environ, start_response)
+            try:
+                iniciada = False
+                for parte in resultado:
+                    if not iniciada:
+                        enviar({'type': 'http.response.start', **inicio})
+                        iniciada = True
+                    if parte:
+                        enviar({'type': 'http.response.body', 'body': parte, 'more_body': True})
+                if not iniciada:
+                    enviar({'type': 'http.response.start', **inicio})
+                enviar({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(resultado, 'close'):
+                    resultado.close()
+
+        await loop.run_in_executor(self.executor, executar)
+
+    async def _despachar(self, scope, receive, send, view, argumentos):
+        corpo = await _ler_corpo(receive)
+        ctx = self.app.request_context(_environ(scope, corpo))
+        erro = None
+        ctx.push()
+        try:
+            try:
+                try:
+                    rv = self.app.preprocess_request()
+                    if rv is None:
+                        rv = await view(**argumentos)
+                except Exception as e:
+                    rv = self.app.handle_user_exception(e)
+                response = self.app.finalize_request(rv)
+            except Exception as e:
+                erro = e
+                response = self.app.handle_exception(e)
+
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': [(nome.lower().encode('latin1'), valor.encode('latin1'))
+                            for nome, valor in response.headers.items()]
+            })
+            await send({
+                'type': 'http.response.body',
+                'body': b'' if scope['method'] == 'HEAD' else response.get_data()
+            })
+        finally:
+            ctx.pop(erro)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                await upstream_usuario.aclose()
+                await upstream_produto.aclose()
+                if nota_fiscal_eletronica._sefaz_async is not None:
+                    await nota_fiscal_eletronica._sefaz_async.aclose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = GatewayASGI(gateway.create_app(), ROTAS_ASYNC)
@@ -0,0 +1,66 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executado em um interpretador novo a cada rodada: importa o gateway, cria o app e atende a
+# primeira requisição (a documentação, que é a rota mais cara de preparar).
+FILHO = """
+import json, time
+inicio = time.perf_counter()
+import app
+importado = time.perf_counter()
+gateway = app.create_app()
+criado = time.perf_counter()
+response = gateway.test_client().get('/openapi/openapi.json')
+assert response.status_code == 200
+pronto = time.perf_counter()
+print(json.dumps({'import_ms': (importado - inicio) * 1000, 'create_app_ms': (criado - importado) * 1000,
+                  'primeira_requisicao_ms': (pronto - criado) * 1000}))
+"""
+
+ETAPAS = ['import_ms', 'create_app_ms', 'primeira_requisicao_ms', 'processo_ms']
+
+
+def rodar(env, rodadas):
+    medicoes = {etapa: [] for etapa in ETAPAS}
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        saida = subprocess.run([sys.executable, '-c', FILHO], cwd=RAIZ, env=env, check=True,
+                               capture_output=True, text=True).stdout
+        medicoes['processo_ms'].append((time.perf_counter() - inicio) * 1000)
+        for etapa, valor in json.loads(saida.splitlines()[-1]).items():
+            medicoes[etapa].append(valor)
+    return {etapa: round(statistics.median(valores), 2) for etapa, valores in medicoes.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de inicialização do gateway, com e sem OpenAPI pré-gerado.")
+    parser.add_argument('--rodadas', type=int, default=10, help="processos iniciados por modo")
+    args = parser.parse_args()
+
+    env = dict(os.environ, JWT_SECRET_KEY=os.getenv('JWT_SECRET_KEY', 'benchmark'), PYTHONWARNINGS='ignore')
+    env.pop('OPENAPI_SPEC', None)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        spec = os.path.join(pasta, 'openapi.json')
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app:create_app', 'openapi', '-o', spec],
+                       cwd=RAIZ, env=env, check=True, capture_output=True)
+        resultados = {
+            'completo': rodar(env, args.rodadas),
+            'spec': rodar(dict(env, OPENAPI_SPEC=spec), args.rodadas)
+        }
+
+    print(f"{'modo':<12}" + ''.join(f"{etapa[:-3]:>24}" for etapa in ETAPAS) + "   (mediana, ms)")
+    for modo, resultado in resultados.items():
+        print(f"{modo:<12}" + ''.join(f"{resultado[etapa]:>24.2f}" for etapa in ETAPAS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from stubs import gerar_nota  # noqa: E402
+
+from services.importacao import ImportadorNota  # noqa: E402
+from services.nota_fiscal_eletronica import NotaFiscalExtractor  # noqa: E402
+
+
+def produtos_dicts(extractor, pagina):
+    """ Como a importação era antes dos registros: o parse, com um dict por linha da nota, e depois a lista dos produtos.
+    """
+    nota = extractor.parse(pagina)
+    empresa = nota["Empresa"]["Nome da Empresa"]
+    return [{'nome': item["Produto"], 'descricao': empresa,
+             'preco': float(item["Vl. Total"].replace(",", ".")), 'quantidade': int(item["Qtde"])}
+            for item in nota["Itens"]]
+
+
+def produtos_lista(importador, extractor, pagina):
+    """ A nota inteira com a lista dos ItemRecord e depois a lista dos produtos.
+    """
+    nota, itens = extractor.parse_stream(pagina)
+    return importador.itens(nota, list(itens))
+
+
+def produtos_em_partes(importador, extractor, pagina):
+    """ O caminho da importação: os ItemRecord do parse_stream viram produtos conforme são lidos.
+    """
+    return importador.itens(*extractor.parse_stream(pagina))
+
+
+def medir(funcao, repeticoes):
+    """ Tempo médio (ms) e pico de memória alocada durante a chamada (KiB).
+    """
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    tempo = (time.perf_counter() - inicio) / repeticoes * 1000
+
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tempo, pico / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memória e tempo da página da nota até a lista de produtos a registrar.")
+    parser.add_argument('--itens', default='100,5000', help="itens por nota, separados por vírgula")
+    parser.add_argument('--engines', default='padrao,rapido')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    # Sem a junção dos itens repetidos (NOTA_AGREGAR=false) e cada item um produto diferente: a
+    # lista de produtos tem o tamanho da nota e a diferença fica só na forma de ler os itens.
+    importador = ImportadorNota(registrador=None, agregar=False)
+    print(f"{'itens':>6} {'engine':<8} {'leitura':<12} {'ms':>10} {'pico_kib':>10}")
+    for itens in (int(n) for n in args.itens.split(',')):
+        pagina = gerar_nota(itens, produtos=itens)
+        for engine in args.engines.split(','):
+            extractor = NotaFiscalExtractor(url='', engine=engine)
+            casos = [
+                ('dicts', lambda: produtos_dicts(extractor, pagina)),
+                ('lista', lambda: produtos_lista(importador, extractor, pagina)),
+                ('em partes', lambda: produtos_em_partes(importador, extractor, pagina)),
+            ]
+            for nome, funcao in casos:
+                tempo, pico = medir(funcao, args.repeticoes)
+                print(f"{itens:>6} {engine:<8} {nome:<12} {tempo:>10.2f} {pico:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from services import repasse  # noqa: E402
+
+
+class RespostaEmPartes:
+    """ Imita a resposta do requests com stream=True sobre um corpo já em memória.
+    """
+    def __init__(self, corpo):
+        self.corpo = corpo
+
+    def iter_content(self, tamanho):
+        for inicio in range(0, len(self.corpo), tamanho):
+            yield self.corpo[inicio:inicio + tamanho]
+
+    def json(self):
+        return json.loads(self.corpo)
+
+    def close(self):
+        pass
+
+
+def catalogo(produtos):
+    return json.dumps({'products': [
+        {'descricao': f'MERCADO TESTE LTDA {i % 50}', 'nome': f'PRODUTO {i}', 'preco': round(i * 0.37, 2),
+         'product_id': i, 'quantidade': i % 10} for i in range(1, produtos + 1)]}).encode()
+
+
+def montado(resposta):
+    return [json.dumps(resposta.json()).encode()]
+
+
+MODOS = {
+    'montado': montado,
+    'repasse': lambda resposta: repasse.repassar(resposta),
+    'ndjson': lambda resposta: repasse.gerar_ndjson(repasse.lotes(resposta, 'products')),
+    'pagina': lambda resposta: repasse.gerar_pagina(repasse.lotes(resposta, 'products'), 'products', 0, 100),
+}
+
+
+def medir(corpo, modo):
+    """ Pico de memória alocada (além do corpo de entrada) e tempo para produzir a resposta inteira.
+    """
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    enviados = sum(len(parte) for parte in MODOS[modo](RespostaEmPartes(corpo)))
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'pico_kib': round(pico / 1024, 1), 'ms': round(duracao * 1000, 2), 'bytes': enviados}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memória por requisição das listagens montadas e repassadas em partes.")
+    parser.add_argument('--produtos', default='1000,10000,100000', help="tamanhos do catálogo, separados por vírgula")
+    args = parser.parse_args()
+
+    print(f"{'produtos':>10} {'modo':<10} {'pico_kib':>12} {'ms':>10} {'bytes':>12}")
+    for produtos in (int(valor) for valor in args.produtos.split(',')):
+        corpo = catalogo(produtos)
+        for modo in MODOS:
+            resultado = medir(corpo, modo)
+            print(f"{produtos:>10} {modo:<10} {resultado['pico_kib']:>12} {resultado['ms']:>10} {resultado['bytes']:>12}")
+
+
+if __name__ == '__main__':
+    main()
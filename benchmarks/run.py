@@ -0,0 +1,222 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks import stubs  # noqa: E402
+
+CENARIOS = ['protected', 'login', 'logout', 'register', 'usuarios', 'produtos', 'editar', 'deletar', 'nota_url',
+            'nota_lote', 'extrator']
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def resumir(latencias, erros, duracao, concorrencia):
+    total = len(latencias)
+    return {
+        'requisicoes': total,
+        'concorrencia': concorrencia,
+        'erros': erros,
+        'rps': round(total / duracao, 2) if duracao else 0.0,
+        'media_ms': round(sum(latencias) / total * 1000, 3) if total else 0.0,
+        'p50_ms': round(percentil(latencias, 50) * 1000, 3),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 3),
+        'p99_ms': round(percentil(latencias, 99) * 1000, 3),
+        'max_ms': round(max(latencias) * 1000, 3) if total else 0.0
+    }
+
+
+def medir(executar, total, concorrencia):
+    """ Executa executar(i) total vezes com concorrencia threads; executar devolve True em caso de sucesso.
+    """
+    def cronometrar(i):
+        inicio = time.perf_counter()
+        try:
+            ok = executar(i)
+        except Exception:
+            ok = False
+        return time.perf_counter() - inicio, ok
+
+    latencias = []
+    erros = 0
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        for duracao, ok in executor.map(cronometrar, range(total)):
+            latencias.append(duracao)
+            erros += 0 if ok else 1
+    return resumir(latencias, erros, time.perf_counter() - inicio, concorrencia)
+
+
+def iniciar_gateway(servicos, env):
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark')
+    os.environ['SERVER1'] = servicos['usuario']
+    os.environ['SERVER2'] = servicos['produto']
+    os.environ.update(env)
+
+    from werkzeug.serving import make_server
+    import app as gateway
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    servidor = make_server('127.0.0.1', 0, gateway.create_app(), threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{servidor.server_port}"
+
+
+def cenarios_http(base, servicos, args, sessao):
+    resposta = sessao.post(f"{base}/login", json={"login": "benchmark", "senha": "1234"})
+    headers = {'Authorization': f"Bearer {resposta.json()['access_token']}"}
+    prefixo = f"{time.time_ns() % 10 ** 20:020d}"
+
+    def nota_url(i, itens=args.itens):
+        # Chave de acesso única por requisição: a mesma nota não é importada duas vezes.
+        return f"{servicos['nfce']}/nfce/qrcode?p={prefixo}{i:024d}|2|1|1|ABC&itens={itens}"
+
+    def logout(i):
+        # Um token novo a cada iteração: o logout revoga o token e a revogação é conferida no /protected.
+        resposta = sessao.post(f"{base}/login", json={"login": f"sair{i}", "senha": "1234"})
+        revogado = {'Authorization': f"Bearer {resposta.json()['access_token']}"}
+        return (sessao.post(f"{base}/logout", headers=revogado).ok
+                and sessao.get(f"{base}/protected", headers=revogado).status_code == 401)
+
+    return {
+        'protected': lambda i: sessao.get(f"{base}/protected", headers=headers).ok,
+        'login': lambda i: sessao.post(f"{base}/login", json={"login": f"usuario{i}", "senha": "1234"}).ok,
+        'logout': logout,
+        'register': lambda i: sessao.post(f"{base}/register", json={"login": f"novo{i}", "senha": "1234", "nivel": 1,
+                                                                    "email": f"novo{i}@teste.com"}).ok,
+        'usuarios': lambda i: sessao.get(f"{base}/usuarios", headers=headers).ok,
+        'produtos': lambda i: sessao.get(f"{base}/produtos", headers=headers).ok,
+        'editar': lambda i: sessao.put(f"{base}/produto/{1 + i % args.produtos}", headers=headers,
+                                       json={"nome": "editado", "descricao": "benchmark", "preco": 1.0,
+                                             "quantidade": 1}).ok,
+        'deletar': lambda i: sessao.delete(f"{base}/produto/{1 + i % args.produtos}", headers=headers).ok,
+        'nota_url': lambda i: sessao.post(f"{base}/nota_url", headers=headers,
+                                          json={"nota_url": nota_url(i)}).status_code == 201,
+        'nota_lote': lambda i: sessao.post(f"{base}/nota_url/lote", headers=headers,
+                                           json={"nota_urls": [nota_url(10 ** 6 + i * 10 + j) for j in range(5)]}).ok,
+    }
+
+
+def cenarios_extrator(args):
+    from services.nota_fiscal_eletronica import NotaFiscalExtractor
+
+    cenarios = {}
+    for itens in args.tamanhos:
+        pagina = stubs.gerar_nota(itens)
+        for engine in ('padrao', 'rapido'):
+            extractor = NotaFiscalExtractor(url=None, engine=engine)
+            cenarios[f"extrator_{engine}_{itens}"] = lambda i, e=extractor, p=pagina: len(e.parse(p)['Itens']) > 0
+    return cenarios
+
+
+def comparar(atual, base, tolerancia):
+    """ Mostra a variação em relação a base e devolve os cenários que pioraram além da tolerância.
+    """
+    regressoes = []
+    print(f"\n{'cenário':<28}{'p95 base':>12}{'p95 atual':>12}{'Δ p95':>9}{'rps base':>12}{'rps atual':>12}{'Δ rps':>9}")
+    for nome, resultado in atual['resultados'].items():
+        anterior = base['resultados'].get(nome)
+        if not anterior:
+            continue
+        delta_p95 = (resultado['p95_ms'] - anterior['p95_ms']) / anterior['p95_ms'] if anterior['p95_ms'] else 0.0
+        delta_rps = (resultado['rps'] - anterior['rps']) / anterior['rps'] if anterior['rps'] else 0.0
+        print(f"{nome:<28}{anterior['p95_ms']:>12.2f}{resultado['p95_ms']:>12.2f}{delta_p95:>+9.1%}"
+              f"{anterior['rps']:>12.1f}{resultado['rps']:>12.1f}{delta_rps:>+9.1%}")
+        if delta_p95 > tolerancia or delta_rps < -tolerancia:
+            regressoes.append(nome)
+    return regressoes
+
+
+def commit_atual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do gateway com serviços e portal da NFC-e simulados.")
+    parser.add_argument('--cenarios', default=','.join(CENARIOS),
+                        help=f"cenários separados por vírgula ({', '.join(CENARIOS)})")
+    parser.add_argument('--requisicoes', type=int, default=200, help="requisições por cenário")
+    parser.add_argument('--concorrencia', type=int, default=8, help="requisições simultâneas")
+    parser.add_argument('--latencia-upstream', type=float, default=0.0, help="latência simulada dos stubs (ms)")
+    parser.add_argument('--produtos', type=int, default=200, help="tamanho do catálogo do stub de produtos")
+    parser.add_argument('--itens', type=int, default=60, help="itens por nota nos cenários nota_url e nota_lote")
+    parser.add_argument('--tamanhos', default='10,60,500', help="quantidade de itens das notas do cenário extrator")
+    parser.add_argument('--env', action='append', default=[], metavar='CHAVE=VALOR',
+                        help="variável de ambiente aplicada antes de carregar o gateway (pode repetir)")
+    parser.add_argument('--saida', help="arquivo JSON de resultados (padrão benchmarks/resultados/<data>.json)")
+    parser.add_argument('--comparar', metavar='ARQUIVO', help="resultado anterior para comparação")
+    parser.add_argument('--tolerancia', type=float, default=0.10, help="piora aceita no p95/rps ao comparar")
+    args = parser.parse_args()
+    args.tamanhos = [int(tamanho) for tamanho in args.tamanhos.split(',')]
+    escolhidos = [cenario.strip() for cenario in args.cenarios.split(',') if cenario.strip()]
+    env = dict(item.split('=', 1) for item in args.env)
+
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    servicos = stubs.iniciar_todos(args.latencia_upstream / 1000, args.produtos)
+    base = iniciar_gateway(servicos, env)
+    sessao = requests.Session()
+    sessao.mount('http://', HTTPAdapter(pool_maxsize=args.concorrencia))
+
+    cenarios = cenarios_http(base, servicos, args, sessao)
+    if 'extrator' in escolhidos:
+        cenarios.update(cenarios_extrator(args))
+
+    resultados = {}
+    print(f"{'cenário':<28}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'erros':>8}")
+    for nome, executar in cenarios.items():
+        if nome not in escolhidos and not (nome.startswith('extrator_') and 'extrator' in escolhidos):
+            continue
+        resultado = medir(executar, args.requisicoes, args.concorrencia)
+        resultados[nome] = resultado
+        print(f"{nome:<28}{resultado['rps']:>10.1f}{resultado['p50_ms']:>10.2f}{resultado['p95_ms']:>10.2f}"
+              f"{resultado['p99_ms']:>10.2f}{resultado['erros']:>8}")
+
+    atual = {
+        'meta': {
+            'data': datetime.now().isoformat(),
+            'commit': commit_atual(),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'parametros': {chave: valor for chave, valor in vars(args).items() if chave not in ('saida', 'comparar')}
+        },
+        'resultados': resultados
+    }
+
+    saida = args.saida or os.path.join(RAIZ, 'benchmarks', 'resultados',
+                                       f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(atual, arquivo, indent=2, ensure_ascii=False)
+    print(f"\nResultados salvos em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            regressoes = comparar(atual, json.load(arquivo), args.tolerancia)
+        if regressoes:
+            print(f"\nRegressões acima de {args.tolerancia:.0%}: {', '.join(regressoes)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from services.json_rapido import JSONRapidoProvider, orjson  # noqa: E402
+
+
+def catalogo(produtos):
+    return {'products': [
+        {'descricao': f'MERCADO SÃO JOÃO LTDA {i % 50}', 'nome': f'PÃO FRANCÊS {i}', 'preco': round(i * 0.37, 2),
+         'product_id': i, 'quantidade': i % 10} for i in range(1, produtos + 1)]}
+
+
+def nota(itens):
+    """ Retorno de /nota_url (schemas/nota.py) com `itens` produtos.
+    """
+    return {
+        'Itens': [{'nome': f'AÇÚCAR CRISTAL {i}', 'quantidade': i % 7 + 1, 'preco': round(i * 1.19, 2),
+                   'descricao': 'MERCADO SÃO JOÃO LTDA'} for i in range(itens)],
+        'Resultados': [{'nome': f'AÇÚCAR CRISTAL {i}', 'status': 'registrado', 'codigo': 201} for i in range(itens)],
+    }
+
+
+def medir(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialização e decodificação com o provider padrão e o orjson.")
+    parser.add_argument('--produtos', default='100,10000', help="tamanhos do catálogo, separados por vírgula")
+    parser.add_argument('--itens', type=int, default=50, help="itens da nota")
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    if orjson is None:
+        sys.exit("O pacote opcional orjson não está instalado (pip install orjson).")
+
+    app = Flask(__name__)
+    padrao = DefaultJSONProvider(app)
+    rapido = JSONRapidoProvider(app)
+
+    casos = [(f'nota {args.itens}', nota(args.itens))]
+    casos += [(f'produtos {n}', catalogo(int(n))) for n in args.produtos.split(',')]
+
+    print(f"{'payload':<16} {'bytes':>10} {'dumps_ms':>10} {'orjson_ms':>10} {'loads_ms':>10} {'orjson_ms':>10}")
+    for nome, obj in casos:
+        corpo = padrao.dumps(obj, separators=(',', ':')).encode()
+        if rapido.serializar(obj) != corpo:
+            sys.exit(f"{nome}: saída diferente do provider padrão")
+        resultado = [
+            medir(lambda: padrao.dumps(obj, separators=(',', ':')).encode(), args.repeticoes),
+            medir(lambda: rapido.serializar(obj), args.repeticoes),
+            medir(lambda: padrao.loads(corpo), args.repeticoes),
+            medir(lambda: rapido.loads(corpo), args.repeticoes),
+        ]
+        print(f"{nome:<16} {len(corpo):>10} " + ' '.join(f"{valor:>10.3f}" for valor in resultado))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def carregar_fixture(nome):
+    with open(os.path.join(FIXTURES, nome), encoding='utf-8') as arquivo:
+        return arquivo.read()
+
+
+def gerar_nota(quantidade_itens, produtos=97):
+    """ Monta a página da NFC-e gravada em fixtures/ com quantidade_itens itens de até `produtos`
+        produtos distintos.
+    """
+    pagina = carregar_fixture('nfce_pr.html')
+    modelo_item = carregar_fixture('nfce_pr_item.html')
+    itens = []
+    for numero in range(1, quantidade_itens + 1):
+        itens.append(modelo_item
+                     .replace('%NUMERO%', str(numero))
+                     .replace('%PRODUTO%', f'PRODUTO BENCHMARK {numero % produtos}')
+                     .replace('%CODIGO%', str(7890000 + numero))
+                     .replace('%QTDE%', str(1 + numero % 3))
+                     .replace('%VL_UNIT%', '4,99')
+                     .replace('%VL_TOTAL%', f'{4.99 * (1 + numero % 3):.2f}'.replace('.', ',')))
+    return (pagina
+            .replace('<!--ITENS-->', ''.join(itens))
+            .replace('%QTD_ITENS%', str(quantidade_itens))
+            .replace('%VALOR_TOTAL%', '100,00')
+            .encode('utf-8'))
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Cabeçalho e corpo saem em writes separados; com Nagle ligado o ACK atrasado soma ~40ms por resposta.
+    disable_nagle_algorithm = True
+    latencia = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, corpo, content_type='application/json'):
+        if not isinstance(corpo, bytes):
+            corpo = json.dumps(corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _corpo(self):
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(tamanho) or b'null')
+
+    def _esperar(self):
+        if self.latencia:
+            time.sleep(self.latencia)
+
+
+class UsuarioStub(_StubHandler):
+    usuarios = [{"ativado": "S", "email": f"usuario{i}@teste.com", "login": f"usuario{i}", "nivel": 1, "user_id": i}
+                for i in range(1, 51)]
+
+    def do_GET(self):
+        self._esperar()
+        if self.path == '/api/usuarios':
+            return self._responder(200, {"Users": self.usuarios})
+        self._responder(404, {"message": "Endpoint não encontrado"})
+
+    def do_POST(self):
+        corpo = self._corpo()
+        self._esperar()
+        if self.path == '/api/verifica_senha':
+            return self._responder(201, {"login": corpo['login'], "nivel": 1, "user_id": 1})
+        if self.path == '/api/registrar':
+            return self._responder(201, {"message": "Usuário criado com sucesso."})
+        self._responder(404, {"message": "Endpoint não encontrado"})
+
+
+class ProdutoStub(_StubHandler):
+    produtos = []
+    _lock = threading.Lock()
+
+    def do_GET(self):
+        self._esperar()
+        if self.path == '/api/produtos':
+            with self._lock:
+                produtos = list(self.produtos)
+            return self._responder(200, {"products": produtos})
+        self._responder(404, {"message": "Endpoint não encontrado"})
+
+    def do_POST(self):
+        corpo = self._corpo()
+        self._esperar()
+        if self.path == '/api/registrar':
+            return self._responder(201, {"message": "Produto criado com sucesso."})
+        self._responder(404, {"message": "Endpoint não encontrado"})
+
+    def do_PUT(self):
+        self._corpo()
+        self._esperar()
+        encontrado = re.fullmatch(r'/api/produto/(\d+)', self.path)
+        if encontrado and int(encontrado.group(1)) <= len(self.produtos):
+            return self._responder(200, {"message": "Produto editado com sucesso."})
+        self._responder(404, {"error": "Produto não encontrado."})
+
+    def do_DELETE(self):
+        self._esperar()
+        encontrado = re.fullmatch(r'/api/produto/(\d+)', self.path)
+        if encontrado and int(encontrado.group(1)) <= len(self.produtos):
+            return self._responder(200, {"message": "Produto deletado com sucesso."})
+        self._responder(404, {"error": "Produto não encontrado."})
+
+
+class NfceStub(_StubHandler):
+    paginas = {}
+
+    def do_GET(self):
+        self._esperar()
+        consulta = parse_qs(urlparse(self.path).query)
+        quantidade_itens = int(consulta.get('itens', ['10'])[0])
+        if quantidade_itens not in self.paginas:
+            self.paginas[quantidade_itens] = gerar_nota(quantidade_itens)
+        self._responder(200, self.paginas[quantidade_itens], 'text/html; charset=utf-8')
+
+
+class _StubServer(ThreadingHTTPServer):
+    # O padrão (5) recusa conexões quando o gateway dispara centenas de chamadas de uma vez.
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def iniciar(handler, latencia=0.0, **atributos):
+    """ Sobe o stub em uma porta livre e devolve (servidor, url base).
+    """
+    classe = type(handler.__name__, (handler,), {'latencia': latencia, **atributos})
+    servidor = _StubServer(('127.0.0.1', 0), classe)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_port}"
+
+
+def iniciar_todos(latencia=0.0, produtos=200):
+    """ Sobe os stubs de usuários (SERVER1), produtos (SERVER2) e do portal da NFC-e.
+
+        Cada stub roda em uma thread do próprio processo, com HTTP/1.1 keep-alive, e
+        simula a latência do serviço real com latencia (segundos).
+    """
+    catalogo = [{"product_id": i, "nome": f"PRODUTO BENCHMARK {i}", "descricao": "MERCADO BENCHMARK LTDA",
+                 "preco": round(4.99 * i, 2), "quantidade": i % 10} for i in range(1, produtos + 1)]
+    _, usuario = iniciar(UsuarioStub, latencia)
+    _, produto = iniciar(ProdutoStub, latencia, produtos=catalogo)
+    _, nfce = iniciar(NfceStub, latencia, paginas={})
+    return {'usuario': usuario, 'produto': produto, 'nfce': nfce}
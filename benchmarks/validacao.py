@@ -0,0 +1,89 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from flask import Flask, request  # noqa: E402
+
+from schemas.nota import NOTA_URL_EXEMPLO, NotaSchema  # noqa: E402
+from schemas.usuario import LoginSchema, RegisterSchema  # noqa: E402
+
+try:
+    from flask_restful import reqparse
+except ImportError:
+    reqparse = None
+
+# Rota: (schema do corpo, argumentos que o reqparse lia de novo, corpo de exemplo).
+ROTAS = {
+    'login': (LoginSchema, (('login', str), ('senha', str)), {'login': 'teste', 'senha': '1234'}),
+    'register': (RegisterSchema, (('login', str), ('senha', str), ('nivel', int), ('email', str)),
+                 {'login': 'teste', 'senha': '1234', 'nivel': 1, 'email': 'teste@teste.com'}),
+    'nota_url': (NotaSchema, (('nota_url', str),), {'nota_url': NOTA_URL_EXEMPLO}),
+}
+
+
+def validar(schema, argumentos):
+    """ O que a rota faz com o corpo hoje: uma validação pelo pydantic (como no flask_openapi3).
+    """
+    return schema.model_validate(request.get_json(silent=True))
+
+
+def validar_reqparse(schema, argumentos):
+    """ O que a rota fazia antes: a validação do pydantic e um RequestParser lendo o corpo de novo.
+    """
+    schema.model_validate(request.get_json(silent=True))
+    atributos = reqparse.RequestParser()
+    for nome, tipo in argumentos:
+        atributos.add_argument(nome, type=tipo, required=True)
+    return atributos.parse_args()
+
+
+def medir(app, rota, modo, repeticoes):
+    """ CPU por requisição (µs) e pico de memória alocada em uma requisição (KiB), só da leitura do
+        corpo: a montagem do contexto da requisição fica de fora.
+    """
+    schema, argumentos, corpo = ROTAS[rota]
+    funcao = MODOS[modo]
+
+    cpu = 0
+    for _ in range(repeticoes):
+        with app.test_request_context(method='POST', json=corpo):
+            inicio = time.process_time_ns()
+            funcao(schema, argumentos)
+            cpu += time.process_time_ns() - inicio
+
+    with app.test_request_context(method='POST', json=corpo):
+        request.get_data()
+        tracemalloc.start()
+        funcao(schema, argumentos)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {'cpu_us': round(cpu / repeticoes / 1000, 1), 'pico_kib': round(pico / 1024, 2)}
+
+
+MODOS = {'pydantic': validar}
+if reqparse is not None:
+    MODOS['reqparse'] = validar_reqparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo da leitura do corpo de /login, /register e /nota_url.")
+    parser.add_argument('--repeticoes', type=int, default=5000)
+    args = parser.parse_args()
+
+    if reqparse is None:
+        print("flask_restful não está instalado: medindo só a validação atual.")
+    app = Flask(__name__)
+    print(f"{'rota':<10} {'modo':<10} {'cpu_us':>10} {'pico_kib':>10}")
+    for rota in ROTAS:
+        for modo in MODOS:
+            resultado = medir(app, rota, modo, args.repeticoes)
+            print(f"{rota:<10} {modo:<10} {resultado['cpu_us']:>10} {resultado['pico_kib']:>10}")
+
+
+if __name__ == '__main__':
+    main()
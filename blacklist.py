@@ -1 +1,3 @@
-BLACKLIST = set()
\ No newline at end of file
+from services.revogacao import carregar_revogacao
+
+BLACKLIST = carregar_revogacao()
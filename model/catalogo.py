@@ -0,0 +1,39 @@
+from sql_alchemy import banco
+
+class ProdutoCatalogoModel(banco.Model):
+    __tablename__ = 'catalogo_produtos'
+    # Índices compostos com o id: servem ao filtro por prefixo e à paginação por cursor na mesma ordem.
+    __table_args__ = (
+        banco.Index('ix_catalogo_nome', 'nome', 'product_id'),
+        banco.Index('ix_catalogo_descricao', 'descricao', 'product_id'),
+        banco.Index('ix_catalogo_preco', 'preco', 'product_id'),
+    )
+
+    product_id = banco.Column(banco.Integer, primary_key=True, autoincrement=False)
+    # NOCASE: o LIKE do SQLite não diferencia maiúsculas e só usa o índice com esta collation.
+    nome = banco.Column(banco.String(120, collation='NOCASE'), nullable=False, default='')
+    descricao = banco.Column(banco.String(255, collation='NOCASE'), nullable=False, default='')
+    preco = banco.Column(banco.Float, nullable=False, default=0.0)
+    quantidade = banco.Column(banco.Integer, nullable=False, default=0)
+
+    def __init__(self, nome, descricao, preco, quantidade):
+        self.nome = nome
+        self.descricao = descricao
+        self.preco = preco
+        self.quantidade = quantidade
+
+    def json(self):
+        return {
+            'descricao': self.descricao,
+            'nome': self.nome,
+            'preco': self.preco,
+            'product_id': self.product_id,
+            'quantidade': self.quantidade
+            }
+
+    @classmethod
+    def find_product(cls, product_id):
+        produto = cls.query.filter_by(product_id=product_id).first()
+        if produto:
+            return produto
+        return None
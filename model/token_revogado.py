@@ -0,0 +1,37 @@
+from sql_alchemy import banco
+
+class TokenRevogadoModel(banco.Model):
+    __tablename__ = 'tokens_revogados'
+
+    jti = banco.Column(banco.String(64), primary_key=True)
+    exp = banco.Column(banco.Float, nullable=False, index=True)
+    revogado_em = banco.Column(banco.Float, nullable=False, index=True)
+
+    def __init__(self, jti, exp, revogado_em):
+        self.jti = jti
+        self.exp = exp
+        self.revogado_em = revogado_em
+
+    @classmethod
+    def find_by_jti(cls, jti):
+        token = cls.query.filter_by(jti=jti).first()
+        if token:
+            return token
+        return None
+
+    @classmethod
+    def find_ativos_desde(cls, revogado_em, agora):
+        return cls.query.filter(cls.revogado_em > revogado_em, cls.exp > agora).all()
+
+    @classmethod
+    def delete_expirados(cls, agora):
+        try:
+            cls.query.filter(cls.exp <= agora).delete()
+            banco.session.commit()
+        except Exception as e:
+            banco.session.rollback()
+            print(f"Erro ao remover tokens expirados: {e}")
+
+    def save_token(self):
+        banco.session.merge(self)
+        banco.session.commit()
@@ -9,6 +9,8 @@ class UserModel(banco.Model):
     email = banco.Column(banco.String(80), nullable=False)
     nivel = banco.Column(banco.Integer, nullable=False)
     ativado = banco.Column(banco.String(1), default='N')
+    senha_verificada_em = banco.Column(banco.Float)
+    identidade = banco.Column(banco.Text)
 
     def __init__(self, login, senha, email, nivel, ativado):
         self.login = login
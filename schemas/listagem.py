@@ -0,0 +1,10 @@
+from typing import Literal, Optional
+from pydantic import BaseModel, Field
+
+
+class ListagemQuery(BaseModel):
+    """ Formato e paginação das listagens.
+    """
+    formato: Literal['json', 'ndjson'] = Field('json', description='ndjson: um item por linha, enviado conforme chega')
+    limite: Optional[int] = Field(None, ge=1, le=1000, description='itens por página (sem limite retorna todos)')
+    cursor: Optional[str] = Field(None, description="valor de 'proximo' da página anterior")
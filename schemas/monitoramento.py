@@ -0,0 +1,171 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class ReplicaUpstreamSchema(BaseModel):
+    """ Define como são retornadas as estatísticas de uma réplica de um upstream.
+    """
+    base_url: str
+    em_andamento: int
+    requisicoes: int
+    erros: int
+    latencia_media_ms: Optional[float] = None
+    ejetada: bool
+    ejecoes: int
+
+class CircuitoUpstreamSchema(BaseModel):
+    """ Define como é retornado o estado do circuit breaker de um upstream.
+    """
+    host: str
+    estado: str
+    falhas_seguidas: int
+    aberturas: int
+    rejeitadas: int
+
+class PoolUpstreamSchema(BaseModel):
+    """ Define como são retornadas as estatísticas do pool de um upstream.
+    """
+    nome: str
+    base_url: Optional[str] = None
+    pool_size: int
+    connect_timeout: float
+    read_timeout: float
+    requisicoes: int
+    hits: int
+    novas_conexoes: int
+    espera_total_ms: float
+    espera_media_ms: float
+    espera_max_ms: float
+    replicas: List[ReplicaUpstreamSchema] = []
+    circuitos: List[CircuitoUpstreamSchema] = []
+    hedges: int = 0
+
+class NotaCacheSchema(BaseModel):
+    """ Define como são retornadas as estatísticas do cache de notas.
+    """
+    itens_memoria: int
+    max_itens: int
+    disco: bool
+    hits_memoria: int
+    hits_disco: int
+    misses: int
+    duplicadas: int
+    pendentes: int = 0
+
+class CacheListagensSchema(BaseModel):
+    """ Define como são retornadas as estatísticas do cache das listagens.
+    """
+    ttl: float
+    max_itens: int
+    itens: int
+    hits: int
+    misses: int
+    expirados: int
+    evicoes: int
+    invalidacoes: int
+
+class SingleFlightSchema(BaseModel):
+    """ Define como são retornadas as estatísticas do single-flight das listagens.
+    """
+    em_voo: int
+    execucoes: int
+    compartilhadas: int
+
+class TokensServicoSchema(BaseModel):
+    """ Define como são retornadas as estatísticas do cache de tokens de serviço.
+    """
+    itens: int
+    max_itens: int
+    hits: int
+    emissoes: int
+    evicoes: int
+    emissao_media_ms: float
+    economia_ms: float
+
+class RevogacaoSchema(BaseModel):
+    """ Define como são retornadas as estatísticas da lista de tokens revogados.
+    """
+    backend: str
+    bloom: bool
+    bloom_itens: int
+    revogados: int
+    consultas: int
+    negativos_bloom: int
+    consultas_backend: int
+
+class EspelhoSchema(BaseModel):
+    """ Define como são retornadas as estatísticas de um espelho local.
+    """
+    ativo: bool
+    sincronizacoes: int
+    erros: int
+    alteracoes: int
+    atraso_s: Optional[float] = None
+
+class CatalogoProdutosSchema(EspelhoSchema):
+    """ Define como são retornadas as estatísticas do catálogo local de produtos.
+    """
+    consultas: int
+
+class EspelhoUsuariosSchema(EspelhoSchema):
+    """ Define como são retornadas as estatísticas do espelho local de usuários.
+    """
+    acertos: int
+    faltas: int
+    taxa_acerto: float
+
+class EstatisticasSchema(BaseModel):
+    """ Define como as estatísticas do gateway serão retornadas.
+    """
+    upstream: List[PoolUpstreamSchema]
+    nota_cache: NotaCacheSchema
+    cache_listagens: CacheListagensSchema
+    singleflight: SingleFlightSchema
+    tokens_servico: TokensServicoSchema
+    revogacao: RevogacaoSchema
+    usuarios_espelho: EspelhoUsuariosSchema
+    catalogo_produtos: CatalogoProdutosSchema
+
+class PerfilPath(BaseModel):
+    """ Campo id obrigatorio.
+    """
+    id: str = Field(..., description='id do perfil')
+
+class PerfilResumoSchema(BaseModel):
+    """ Define como é retornado o resumo de um perfil de requisição.
+    """
+    id: str
+    data: str
+    metodo: str
+    caminho: str
+    status: int
+    duracao_ms: float
+    modo: str
+    motivo: str
+
+class ListagemPerfisSchema(BaseModel):
+    """ Define como os perfis recentes serão retornados.
+    """
+    perfis: List[PerfilResumoSchema]
+
+class FuncaoPerfilSchema(BaseModel):
+    """ Define como é retornada uma função do perfil do cProfile.
+    """
+    funcao: str
+    chamadas: int
+    tempo_proprio_ms: float
+    tempo_acumulado_ms: float
+
+class PilhaPerfilSchema(BaseModel):
+    """ Define como é retornada uma pilha do perfil por amostragem.
+    """
+    pilha: str
+    amostras: int
+    percentual: float
+
+class PerfilSchema(PerfilResumoSchema):
+    """ Define como um perfil de requisição será retornado.
+    """
+    funcoes: Optional[List[FuncaoPerfilSchema]] = None
+    amostras: Optional[int] = None
+    pilhas: Optional[List[PilhaPerfilSchema]] = None
@@ -1,11 +1,14 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
 
+NOTA_URL_EXEMPLO = "http://www.fazenda.pr.gov.br/nfce/qrcode?p=41240411517841002211650050003017141734260606|2|1|2|6E4A8B1F83EAE8EEC741FF1A8AEBB913FD6D9688"
+
 
 class NotaSchema(BaseModel):
     """ Exemplo de nota url
     """
-    nota_url: str = "http://www.fazenda.pr.gov.br/nfce/qrcode?p=41240411517841002211650050003017141734260606|2|1|2|6E4A8B1F83EAE8EEC741FF1A8AEBB913FD6D9688" 
+    nota_url: str = Field(..., json_schema_extra={"example": NOTA_URL_EXEMPLO})
+    assincrono: bool = False
     
 class InformacoesPagamento(BaseModel):
     """ Montagem do modo de pagamento.
@@ -28,11 +31,33 @@ class Item(BaseModel):
     preco: float
     descricao: str
     
+class ResultadoItem(BaseModel):
+    """ Resultado do registro de um item no serviço de produtos.
+    """
+    nome: str
+    status: str = "registrado"
+    codigo: Optional[int] = 201
+
 class ListagemNotaSchema(BaseModel):
     """ Define como uma listagem de produtos será retornada.
     """
     
     Itens: List[Item]
+    Resultados: List[ResultadoItem] = []
+
+class NotaLoteSchema(BaseModel):
+    """ Lista de notas para importação em lote.
+    """
+    nota_urls: List[str] = Field(..., min_length=1, json_schema_extra={"example": [NOTA_URL_EXEMPLO]})
+
+class NotaLoteItemSchema(BaseModel):
+    """ Linha do NDJSON retornado pela importação em lote.
+    """
+    nota_url: str
+    status: int = 201
+    Itens: List[Item] = []
+    Resultados: List[ResultadoItem] = []
+    mesage: Optional[str] = None
 
 class NotaPath(BaseModel):
     """ Campo id obrigatorio.
@@ -42,4 +67,19 @@ class NotaPath(BaseModel):
 class NotaQuery(BaseModel):
     """ Campos opcionais para update
     """
-    link: Optional[str] = Field(None, description='link', example='link')
\ No newline at end of file
+    link: Optional[str] = Field(None, description='link', example='link')
+
+class JobPath(BaseModel):
+    """ Campo id obrigatorio.
+    """
+    id: str = Field(..., description='id do job')
+
+class JobSchema(BaseModel):
+    """ Define como o status de uma importação assíncrona será retornado.
+    """
+    id: str
+    status: str = "pendente"
+    criado_em: str
+    concluido_em: Optional[str] = None
+    resultado: Optional[ListagemNotaSchema] = None
+    erro: Optional[str] = None
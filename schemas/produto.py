@@ -1,6 +1,8 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel, Field
 
+from schemas.listagem import ListagemQuery
+
 class RegisterSchema(BaseModel):
     """ Define como um novo produto será criado.
     """
@@ -53,4 +55,15 @@ class ProductRepApiSchema(BaseModel):
 class ListagemProdutosApiSchema(BaseModel):
     """ Define como uma listagem de usuários será retornada.
     """
-    products:List[ProductRepApiSchema]
\ No newline at end of file
+    products:List[ProductRepApiSchema]
+    proximo: Optional[str] = None
+
+class ProdutoCatalogoQuery(ListagemQuery):
+    """ Filtros e ordenação da listagem (aplicados com o catálogo local ativo).
+    """
+    nome: Optional[str] = Field(None, description='prefixo do nome')
+    descricao: Optional[str] = Field(None, description='prefixo da descrição')
+    preco_min: Optional[float] = Field(None, description='preço mínimo')
+    preco_max: Optional[float] = Field(None, description='preço máximo')
+    ordenar: Literal['product_id', 'nome', 'descricao', 'preco'] = 'product_id'
+    ordem: Literal['asc', 'desc'] = 'asc'
\ No newline at end of file
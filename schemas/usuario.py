@@ -5,8 +5,8 @@ from pydantic import BaseModel, Field
 class LoginSchema(BaseModel):
     """ Define como é a conexão de exemplo de usuário.
     """
-    login: str = "teste"
-    senha: str = "1234"
+    login: str = Field(..., json_schema_extra={"example": "teste"})
+    senha: str = Field(..., json_schema_extra={"example": "1234"})
 
 class LoginRepSchema(BaseModel):
     """ Define como é a conexão de exemplo de usuário.
@@ -29,14 +29,15 @@ class ListagemUsuariosApiSchema(BaseModel):
     """ Define como uma listagem de usuários será retornada.
     """
     Users:List[LoginRepApiSchema]
+    proximo: Optional[str] = None
 
 class RegisterSchema(BaseModel):
     """ Define como um novo usuário será criado.
     """
-    login: str = "teste"
-    senha: str = "1234"
-    nivel: int = 1
-    email: str =  "teste@teste.com"
+    login: str = Field(..., json_schema_extra={"example": "teste"})
+    senha: str = Field(..., json_schema_extra={"example": "1234"})
+    nivel: int = Field(..., json_schema_extra={"example": 1})
+    email: str = Field(..., json_schema_extra={"example": "teste@teste.com"})
     
 class LinkSchema(BaseModel):
     """ Define o modelo de link.
@@ -0,0 +1,66 @@
+import json
+import os
+
+from flask_openapi3 import OpenAPI
+
+from services.json_rapido import JSONRapidoProvider
+
+OPENAPI_SPEC = os.getenv('OPENAPI_SPEC')
+
+
+def carregar_spec(caminho=OPENAPI_SPEC):
+    """ Documento OpenAPI pré-gerado (`flask --app app:create_app openapi -o <caminho>`), se existir.
+    """
+    if not caminho or not os.path.isfile(caminho):
+        return None
+    with open(caminho, encoding='utf8') as arquivo:
+        return json.load(arquivo)
+
+
+class GatewayOpenAPI(OpenAPI):
+    """ OpenAPI que pode servir um documento pré-gerado em vez de montá-lo a partir das rotas.
+
+        Com o documento carregado, o registro das rotas pula a geração dos JSON Schemas de
+        parâmetros e respostas (a parte mais cara da inicialização); a validação dos corpos e
+        parâmetros continua igual.
+    """
+    json_provider_class = JSONRapidoProvider
+
+    def __init__(self, *args, spec=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spec_json = spec or {}
+        self.spec_pre_gerada = bool(spec)
+
+    def _collect_openapi_info(self, rule, func, **kwargs):
+        if self.spec_pre_gerada:
+            kwargs['doc_ui'] = False
+        return super()._collect_openapi_info(rule, func, **kwargs)
+
+
+class Rotas:
+    """ Guarda as rotas declaradas no módulo para registrá-las em cada app criado pelo create_app.
+    """
+    def __init__(self):
+        self.rotas = []
+
+    def _rota(self, metodo, rule, **kwargs):
+        def decorator(func):
+            self.rotas.append((metodo, rule, kwargs, func))
+            return func
+        return decorator
+
+    def get(self, rule, **kwargs):
+        return self._rota('get', rule, **kwargs)
+
+    def post(self, rule, **kwargs):
+        return self._rota('post', rule, **kwargs)
+
+    def put(self, rule, **kwargs):
+        return self._rota('put', rule, **kwargs)
+
+    def delete(self, rule, **kwargs):
+        return self._rota('delete', rule, **kwargs)
+
+    def registrar(self, app):
+        for metodo, rule, kwargs, func in self.rotas:
+            getattr(app, metodo)(rule, **kwargs)(func)
@@ -0,0 +1,129 @@
+import random
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from services import metricas
+
+# Peso da última resposta na latência média móvel (EWMA) de cada réplica.
+ALFA_LATENCIA = 0.2
+# Respostas necessárias desde a última ejeção antes de comparar a latência da réplica com as demais.
+AMOSTRAS_MIN = 20
+
+
+class Replica:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.host = urlsplit(base_url).netloc
+        self.em_andamento = 0
+        self.latencia = None
+        self.amostras = 0
+        self.requisicoes = 0
+        self.erros = 0
+        self.falhas_seguidas = 0
+        self.ejecoes = 0
+        self.ejetada_ate = 0.0
+
+    def disponivel(self, agora):
+        return agora >= self.ejetada_ate
+
+    def carga(self):
+        return self.em_andamento, self.latencia or 0.0
+
+    def json(self, agora):
+        return {
+            'base_url': self.base_url,
+            'em_andamento': self.em_andamento,
+            'requisicoes': self.requisicoes,
+            'erros': self.erros,
+            'latencia_media_ms': round(self.latencia * 1000, 3) if self.latencia is not None else None,
+            'ejetada': not self.disponivel(agora),
+            'ejecoes': self.ejecoes
+        }
+
+
+class Balanceador:
+    """ Distribui as chamadas de um upstream entre as réplicas listadas em SERVER1/SERVER2.
+
+        Política 'p2c' (padrão): sorteia duas réplicas e usa a com menos chamadas em andamento,
+        desempatando pela latência média. 'menos_pendentes' compara todas as réplicas.
+
+        A checagem de saúde é passiva: uma réplica com `falhas` erros seguidos (falha de conexão,
+        timeout ou 5xx), ou com latência média acima de `lentidao` vezes a mediana das outras, fica
+        fora do rodízio por `ejecao` segundos. A última réplica disponível nunca é ejetada.
+    """
+    def __init__(self, nome, urls, politica='p2c', falhas=5, ejecao=30.0, lentidao=3.0):
+        self.nome = nome
+        self.replicas = [Replica(url) for url in urls]
+        self.politica = politica
+        self.falhas = falhas
+        self.ejecao = ejecao
+        self.lentidao = lentidao
+        self._lock = threading.Lock()
+
+    def escolher(self):
+        with self._lock:
+            agora = time.monotonic()
+            candidatas = [replica for replica in self.replicas if replica.disponivel(agora)] or self.replicas
+            if len(candidatas) == 1:
+                escolhida = candidatas[0]
+            elif self.politica == 'menos_pendentes':
+                escolhida = min(random.sample(candidatas, len(candidatas)), key=Replica.carga)
+            else:
+                a, b = random.sample(candidatas, 2)
+                escolhida = a if a.carga() <= b.carga() else b
+            escolhida.em_andamento += 1
+            return escolhida
+
+    def concluir(self, replica, duracao, falhou):
+        with self._lock:
+            agora = time.monotonic()
+            replica.em_andamento -= 1
+            replica.requisicoes += 1
+            if falhou:
+                replica.erros += 1
+                replica.falhas_seguidas += 1
+                if replica.falhas_seguidas >= self.falhas:
+                    self._ejetar(replica, agora, 'falhas')
+                return
+
+            replica.falhas_seguidas = 0
+            replica.amostras += 1
+            if replica.latencia is None:
+                replica.latencia = duracao
+            else:
+                replica.latencia += ALFA_LATENCIA * (duracao - replica.latencia)
+
+            if self.lentidao and replica.amostras >= AMOSTRAS_MIN:
+                outras = [r.latencia for r in self.replicas
+                          if r is not replica and r.latencia is not None and r.disponivel(agora)]
+                if outras and replica.latencia > self.lentidao * statistics.median(outras):
+                    self._ejetar(replica, agora, 'lentidao')
+
+    def liberar(self, replica, duracao):
+        """ Chamada cancelada (a que perdeu um hedge, por exemplo): não conta como sucesso nem
+            como falha, mas o tempo que ela já esperava é um piso para a latência da réplica.
+        """
+        with self._lock:
+            replica.em_andamento -= 1
+            if replica.latencia is None:
+                replica.latencia = duracao
+            elif duracao > replica.latencia:
+                replica.latencia += ALFA_LATENCIA * (duracao - replica.latencia)
+
+    def _ejetar(self, replica, agora, motivo):
+        if not any(r is not replica and r.disponivel(agora) for r in self.replicas):
+            return
+        replica.ejetada_ate = agora + self.ejecao
+        replica.ejecoes += 1
+        # Volta ao rodízio sem o histórico: a latência é medida de novo antes de outra comparação.
+        replica.falhas_seguidas = 0
+        replica.latencia = None
+        replica.amostras = 0
+        metricas.UPSTREAM_EJECOES.inc(self.nome, replica.host, motivo)
+
+    def json(self):
+        with self._lock:
+            agora = time.monotonic()
+            return [replica.json(agora) for replica in self.replicas]
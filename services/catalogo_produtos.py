@@ -0,0 +1,177 @@
+import base64
+import binascii
+import json
+import os
+import unicodedata
+
+from services.espelho import Espelho
+from services.repasse import CursorInvalido
+
+PRODUTOS_CATALOGO = os.getenv('PRODUTOS_CATALOGO', 'false').lower() in ('1', 'true', 'sim')
+PRODUTOS_CATALOGO_SYNC = float(os.getenv('PRODUTOS_CATALOGO_SYNC', 60))
+
+
+def normalizar(texto):
+    """ Texto sem acentos, em minúsculas e com os espaços colapsados, para comparar nomes de produto.
+    """
+    texto = unicodedata.normalize('NFKD', texto)
+    return ' '.join(''.join(c for c in texto if not unicodedata.combining(c)).casefold().split())
+
+
+def chave_produto(nome, descricao):
+    """ Mesmo produto da mesma empresa (descricao), como a importação de notas agrupa os itens.
+    """
+    return normalizar(nome), normalizar(descricao)
+
+
+def _prefixo(valor):
+    return valor.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _cursor(ordenar, ordem, produto):
+    posicao = [ordenar, ordem, getattr(produto, ordenar), produto.product_id]
+    return base64.urlsafe_b64encode(json.dumps(posicao).encode()).decode().rstrip('=')
+
+
+def _ler_cursor(cursor, ordenar, ordem):
+    try:
+        posicao = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        campo, sentido, valor, product_id = posicao
+    except (binascii.Error, ValueError, TypeError):
+        raise CursorInvalido()
+    if campo != ordenar or sentido != ordem:
+        raise CursorInvalido()
+    return valor, product_id
+
+
+class CatalogoProdutos(Espelho):
+    """ Cópia local do catálogo do SERVER2 para filtrar, ordenar e paginar /produtos no gateway.
+
+        Além da sincronização periódica, a edição e a exclusão feitas pelo gateway são aplicadas
+        na hora; a importação de notas antecipa a próxima sincronização, porque o serviço não
+        devolve o id dos produtos cadastrados.
+
+        A paginação é por cursor (keyset): o cursor guarda o valor da ordenação e o id do último
+        produto da página, e a próxima página começa logo depois dele no índice, sem OFFSET.
+    """
+    nome = 'produtos'
+    path = '/api/produtos'
+    chave = 'products'
+    id_campo = 'product_id'
+    campos = ('nome', 'descricao', 'preco', 'quantidade')
+
+    def __init__(self, cliente, token, ativo=PRODUTOS_CATALOGO, sync=PRODUTOS_CATALOGO_SYNC, **kwargs):
+        super().__init__(cliente, token, ativo=ativo, sync=sync, **kwargs)
+        self.consultas = 0
+
+    def modelo(self):
+        from model.catalogo import ProdutoCatalogoModel
+        return ProdutoCatalogoModel
+
+    def consultar(self, nome=None, descricao=None, preco_min=None, preco_max=None, ordenar='product_id',
+                  ordem='asc', limite=None, cursor=None):
+        from sqlalchemy import tuple_
+
+        modelo = self.modelo()
+        consulta = modelo.query
+        if nome:
+            consulta = consulta.filter(modelo.nome.like(_prefixo(nome), escape='\\'))
+        if descricao:
+            consulta = consulta.filter(modelo.descricao.like(_prefixo(descricao), escape='\\'))
+        if preco_min is not None:
+            consulta = consulta.filter(modelo.preco >= preco_min)
+        if preco_max is not None:
+            consulta = consulta.filter(modelo.preco <= preco_max)
+
+        colunas = [modelo.product_id] if ordenar == 'product_id' else [getattr(modelo, ordenar), modelo.product_id]
+        if cursor:
+            valor, product_id = _ler_cursor(cursor, ordenar, ordem)
+            valores = [product_id] if ordenar == 'product_id' else [valor, product_id]
+            chave = tuple_(*colunas)
+            consulta = consulta.filter(chave > tuple_(*valores) if ordem == 'asc' else chave < tuple_(*valores))
+        consulta = consulta.order_by(*(coluna.asc() if ordem == 'asc' else coluna.desc() for coluna in colunas))
+
+        if limite:
+            # Um a mais só para saber se existe próxima página.
+            consulta = consulta.limit(limite + 1)
+        produtos = consulta.all()
+        self.consultas += 1
+
+        proximo = None
+        if limite and len(produtos) > limite:
+            produtos = produtos[:limite]
+            proximo = _cursor(ordenar, ordem, produtos[-1])
+        return {'products': [produto.json() for produto in produtos], 'proximo': proximo}
+
+    def existentes(self, itens):
+        """ product_id do produto do catálogo com o mesmo nome e descrição de cada item (ou None).
+
+            Os produtos da descrição de cada item (igual sem diferenciar maiúsculas, pela collation
+            NOCASE) são comparados a ele por chave_produto; entre produtos repetidos no serviço vale
+            o de menor id.
+        """
+        if not self.pronto:
+            return [None] * len(itens)
+        from sql_alchemy import banco
+
+        modelo = self.modelo()
+        por_chave = {}
+        # Contexto próprio, como nas escritas abaixo: a importação roda também nas threads do pool
+        # de registro e dos jobs, que não podem usar a sessão do banco da requisição.
+        with self.app.app_context():
+            try:
+                for descricao in {item['descricao'] for item in itens}:
+                    produtos = modelo.query.filter(modelo.descricao == descricao).order_by(modelo.product_id)
+                    for produto in produtos:
+                        por_chave.setdefault(chave_produto(produto.nome, produto.descricao), produto.product_id)
+            except Exception as e:
+                banco.session.rollback()
+                print(f"Erro ao consultar o catálogo de produtos: {e}")
+                return [None] * len(itens)
+        return [por_chave.get(chave_produto(item['nome'], item['descricao'])) for item in itens]
+
+    def produto(self, product_id):
+        """ Produto atual do catálogo (json do modelo), ou None se foi removido.
+        """
+        with self.app.app_context():
+            produto = self.modelo().find_product(product_id)
+            return produto.json() if produto is not None else None
+
+    def atualizar(self, product_id, campos):
+        """ Aplica uma edição aceita pelo upstream; os campos None não foram alterados.
+        """
+        if not self.ativo:
+            return
+        from sql_alchemy import banco
+
+        self.escrito(product_id)
+        with self.app.app_context():
+            try:
+                produto = self.modelo().find_product(product_id)
+                if produto is None:
+                    self.agendar()
+                    return
+                for campo, valor in campos.items():
+                    if valor is not None:
+                        setattr(produto, campo, valor)
+                banco.session.commit()
+            except Exception as e:
+                banco.session.rollback()
+                print(f"Erro ao atualizar o catálogo de produtos: {e}")
+
+    def remover(self, product_id):
+        if not self.ativo:
+            return
+        from sql_alchemy import banco
+
+        self.escrito(product_id)
+        with self.app.app_context():
+            try:
+                self.modelo().query.filter_by(product_id=product_id).delete()
+                banco.session.commit()
+            except Exception as e:
+                banco.session.rollback()
+                print(f"Erro ao remover do catálogo de produtos: {e}")
+
+    def json(self):
+        return dict(super().json(), consultas=self.consultas)
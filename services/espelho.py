@@ -0,0 +1,169 @@
+from abc import ABC, abstractmethod
+import threading
+import time
+
+from services import metricas
+from services.json_rapido import ler_json
+from sql_alchemy import DATABASE_URI
+
+# Identidade do token que o gateway assina para si mesmo ao buscar as listagens dos upstreams.
+IDENTIDADE_SINCRONIZACAO = {'login': 'gateway', 'nivel': 1, 'user_id': 0}
+
+
+class ErroSincronizacao(Exception):
+    pass
+
+
+class Espelho(ABC):
+    """ Tabela local (sql_alchemy.banco) mantida a partir da listagem completa de um upstream.
+
+        A cada `sync` segundos uma thread busca `path` e aplica só a diferença: linhas novas,
+        alteradas e removidas. As subclasses definem o modelo, a chave da lista no JSON, o campo
+        de id e os campos copiados. Uma linha escrita pelo próprio gateway depois do início de
+        uma busca não é sobrescrita por ela: a listagem lida pode ser anterior à escrita.
+    """
+    nome = None
+    path = None
+    chave = None
+    id_campo = None
+    campos = ()
+
+    def __init__(self, cliente, token, ativo=False, sync=30.0, uri=DATABASE_URI):
+        self.cliente = cliente
+        self.token = token
+        self.ativo = ativo
+        self.sync = sync
+        self.uri = uri
+        self.app = None
+        self.ultima_sincronizacao = None
+        self.sincronizacoes = 0
+        self.erros = 0
+        self.alteracoes = 0
+        self._escritas = {}
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+        metricas.ESPELHO_ATRASO.funcao(self.atraso, self.nome)
+
+    @abstractmethod
+    def modelo(self):
+        pass
+
+    def init_app(self, app):
+        if not self.ativo:
+            return
+        from sql_alchemy import banco
+
+        app.config.setdefault('SQLALCHEMY_DATABASE_URI', self.uri)
+        if 'sqlalchemy' not in app.extensions:
+            banco.init_app(app)
+        with app.app_context():
+            self.modelo().__table__.create(banco.engine, checkfirst=True)
+
+        if self._thread is None:
+            self.app = app
+            self._thread = threading.Thread(target=self._executar, name=f'espelho-{self.nome}', daemon=True)
+            self._thread.start()
+
+    @property
+    def pronto(self):
+        return self.ativo and self.ultima_sincronizacao is not None
+
+    def agendar(self):
+        """ Antecipa a próxima sincronização (depois de um cadastro, por exemplo).
+        """
+        self._acordar.set()
+
+    def _executar(self):
+        while True:
+            self._acordar.clear()
+            with self.app.app_context():
+                self.sincronizar()
+            self._acordar.wait(self.sync)
+
+    def sincronizar(self):
+        from sql_alchemy import banco
+
+        inicio = time.monotonic()
+        try:
+            response = self.cliente.get(self.path, headers={'Authorization': f'Bearer {self.token()}'})
+            if response.status_code != 200:
+                raise ErroSincronizacao(f"status {response.status_code}")
+            alteracoes = self._aplicar(ler_json(response)[self.chave], inicio)
+        except Exception as e:
+            banco.session.rollback()
+            self.erros += 1
+            metricas.ESPELHO_SYNCS.inc(self.nome, 'erro')
+            print(f"Erro ao sincronizar o espelho de {self.nome}: {e}")
+            return False
+
+        self.ultima_sincronizacao = time.time()
+        self.sincronizacoes += 1
+        self.alteracoes += alteracoes
+        metricas.ESPELHO_SYNCS.inc(self.nome, 'ok')
+        return True
+
+    def _aplicar(self, itens, inicio):
+        """ Grava na tabela local só o que mudou desde a última sincronização.
+        """
+        from sql_alchemy import banco
+
+        modelo = self.modelo()
+        with self._lock:
+            recentes = {id_ for id_, escrito_em in self._escritas.items() if escrito_em >= inicio}
+            self._escritas = {id_: self._escritas[id_] for id_ in recentes}
+        remotos = {item[self.id_campo]: item for item in itens if item[self.id_campo] not in recentes}
+        locais = {getattr(linha, self.id_campo): linha for linha in modelo.query.all()}
+        alteracoes = 0
+
+        for id_, local in locais.items():
+            if id_ not in remotos and id_ not in recentes:
+                banco.session.delete(local)
+                alteracoes += 1
+        # Remoções antes das outras escritas: um valor único liberado pode ter ido para outra linha.
+        banco.session.flush()
+
+        for id_, remoto in remotos.items():
+            local = locais.get(id_)
+            if local is None:
+                banco.session.add(self._novo(remoto))
+                alteracoes += 1
+            else:
+                alteracoes += self._alterar(local, remoto)
+
+        banco.session.commit()
+        return alteracoes
+
+    def _novo(self, remoto):
+        linha = self.modelo()(**{campo: remoto[campo] for campo in self.campos})
+        setattr(linha, self.id_campo, remoto[self.id_campo])
+        return linha
+
+    def _alterar(self, local, remoto):
+        mudou = False
+        for campo in self.campos:
+            if getattr(local, campo) != remoto[campo]:
+                setattr(local, campo, remoto[campo])
+                mudou = True
+        return mudou
+
+    def escrito(self, id_):
+        """ Marca uma linha escrita pelo gateway, para a sincronização em andamento não desfazer a escrita.
+        """
+        with self._lock:
+            self._escritas[id_] = time.monotonic()
+
+    def atraso(self):
+        if not self.pronto:
+            return None
+        return time.time() - self.ultima_sincronizacao
+
+    def json(self):
+        atraso = self.atraso()
+        return {
+            'ativo': self.ativo,
+            'sincronizacoes': self.sincronizacoes,
+            'erros': self.erros,
+            'alteracoes': self.alteracoes,
+            'atraso_s': round(atraso, 3) if atraso is not None else None
+        }
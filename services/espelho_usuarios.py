@@ -0,0 +1,137 @@
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from services import metricas
+from services.espelho import Espelho
+from services.json_rapido import ler_json
+
+USUARIOS_ESPELHO = os.getenv('USUARIOS_ESPELHO', 'false').lower() in ('1', 'true', 'sim')
+USUARIOS_ESPELHO_SYNC = float(os.getenv('USUARIOS_ESPELHO_SYNC', 30))
+USUARIOS_ESPELHO_ATRASO_MAX = float(os.getenv('USUARIOS_ESPELHO_ATRASO_MAX', 300))
+# Por quanto tempo uma senha trocada no serviço ainda entra pelo espelho.
+USUARIOS_ESPELHO_CREDENCIAL_TTL = float(os.getenv('USUARIOS_ESPELHO_CREDENCIAL_TTL', 300))
+USUARIOS_ESPELHO_CHAVE = os.getenv('USUARIOS_ESPELHO_CHAVE')
+
+
+class EspelhoUsuarios(Espelho):
+    """ Cópia local da tabela de usuários (model/usuario.py) para o /login não depender do SERVER1.
+
+        O serviço não expõe as senhas, então a credencial de cada usuário é aprendida no primeiro
+        login aceito pelo upstream e guardada como um hash com chave (BLAKE2b de 20 bytes, que
+        cabe na coluna `senha`), junto com a identidade devolvida pelo upstream, que é a mesma
+        usada no token de um login verificado localmente.
+
+        O login é verificado localmente só quando a credencial tem menos de `credencial_ttl`
+        segundos e a última sincronização menos de `atraso_max`; nos outros casos (e quando a
+        senha não confere) a verificação segue para o upstream como antes. Um login com outra
+        senha aceito pelo upstream troca a credencial guardada na hora: a senha antiga deixa de
+        entrar pelo espelho.
+    """
+    nome = 'usuarios'
+    path = '/api/usuarios'
+    chave = 'Users'
+    id_campo = 'user_id'
+    campos = ('login', 'email', 'nivel', 'ativado')
+
+    def __init__(self, cliente, token, ativo=USUARIOS_ESPELHO, sync=USUARIOS_ESPELHO_SYNC,
+                 atraso_max=USUARIOS_ESPELHO_ATRASO_MAX, credencial_ttl=USUARIOS_ESPELHO_CREDENCIAL_TTL,
+                 chave=USUARIOS_ESPELHO_CHAVE, **kwargs):
+        super().__init__(cliente, token, ativo=ativo, sync=sync, **kwargs)
+        self.atraso_max = atraso_max
+        self.credencial_ttl = credencial_ttl
+        self.chave_credencial = chave
+        self.acertos = 0
+        self.faltas = 0
+        self._chave = None
+
+    def modelo(self):
+        from model.usuario import UserModel
+        return UserModel
+
+    def init_app(self, app):
+        if self.ativo and self._chave is None:
+            self._chave = hashlib.sha256((self.chave_credencial or app.config['JWT_SECRET_KEY']).encode()).digest()
+        super().init_app(app)
+
+    def _novo(self, remoto):
+        usuario = self.modelo()(remoto['login'], '', remoto['email'], remoto['nivel'], remoto['ativado'])
+        usuario.user_id = remoto['user_id']
+        return usuario
+
+    def _alterar(self, local, remoto):
+        mudou = super()._alterar(local, remoto)
+        if mudou:
+            # A credencial aprendida era do login antigo e a identidade guardada pode trazer o nível antigo.
+            local.senha = ''
+            local.senha_verificada_em = None
+            local.identidade = None
+        return mudou
+
+    def _credencial(self, senha_hash):
+        return hashlib.blake2b(senha_hash.encode(), key=self._chave, digest_size=20).hexdigest()
+
+    def verificar(self, login, senha_hash):
+        """ Identidade do usuário quando o login pode ser resolvido localmente, senão None.
+        """
+        if not self.ativo:
+            return None
+        agora = time.time()
+        if self.ultima_sincronizacao is None or agora - self.ultima_sincronizacao > self.atraso_max:
+            return self._falta('desatualizado')
+
+        from sql_alchemy import banco
+        from model.usuario import UserModel
+        try:
+            usuario = UserModel.find_by_login(login)
+        except Exception as e:
+            banco.session.rollback()
+            print(f"Erro ao consultar o espelho de usuários: {e}")
+            return self._falta('erro')
+        if usuario is None:
+            return self._falta('ausente')
+        if usuario.ativado != 'S':
+            return self._falta('inativo')
+        if not usuario.senha or not usuario.identidade or usuario.senha_verificada_em is None \
+                or agora - usuario.senha_verificada_em > self.credencial_ttl:
+            return self._falta('sem_credencial')
+        if not hmac.compare_digest(usuario.senha, self._credencial(senha_hash)):
+            return self._falta('senha_divergente')
+
+        self.acertos += 1
+        metricas.USUARIOS_ESPELHO_LOGINS.inc('acerto')
+        return json.loads(usuario.identidade)
+
+    def _falta(self, motivo):
+        self.faltas += 1
+        metricas.USUARIOS_ESPELHO_LOGINS.inc(motivo)
+        return None
+
+    def aprender(self, login, senha_hash, response):
+        """ Guarda a credencial de um login aceito pelo upstream para as próximas verificações
+            locais, no lugar da que estava guardada.
+        """
+        if not self.ativo or response.status_code != 201:
+            return
+        from sql_alchemy import banco
+        from model.usuario import UserModel
+
+        try:
+            identidade = ler_json(response)
+            usuario = UserModel.find_by_login(login)
+            if usuario is None or usuario.user_id != identidade.get('user_id'):
+                return
+            usuario.senha = self._credencial(senha_hash)
+            usuario.senha_verificada_em = time.time()
+            usuario.identidade = json.dumps(identidade)
+            banco.session.commit()
+        except Exception as e:
+            banco.session.rollback()
+            print(f"Erro ao guardar a credencial do usuário: {e}")
+
+    def json(self):
+        verificacoes = self.acertos + self.faltas
+        return dict(super().json(), acertos=self.acertos, faltas=self.faltas,
+                    taxa_acerto=round(self.acertos / verificacoes, 4) if verificacoes else 0.0)
@@ -0,0 +1,471 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager, nullcontext
+import contextvars
+import os
+import threading
+from urllib.parse import urlparse
+
+import requests
+from urllib3.exceptions import ConnectTimeoutError
+
+from services.catalogo_produtos import chave_produto
+from services.json_rapido import ler_json
+from services.metricas import ETAPA_DURACAO
+from services.nota_cache import NotaDuplicada, chave_acesso
+from services.resiliencia import UpstreamIndisponivel
+
+REGISTRO_WORKERS = int(os.getenv('NOTA_IMPORT_WORKERS', 8))
+PRODUTO_LOTE_PATH = os.getenv('PRODUTO_LOTE_PATH')
+LOTE_WORKERS = int(os.getenv('NOTA_LOTE_WORKERS', 8))
+LOTE_POR_HOST = int(os.getenv('NOTA_LOTE_POR_HOST', 2))
+NOTA_AGREGAR = os.getenv('NOTA_AGREGAR', 'true').lower() in ('1', 'true', 'sim')
+TRAVAS_PRODUTO = 64
+
+executor = ThreadPoolExecutor(max_workers=REGISTRO_WORKERS, thread_name_prefix='registro')
+
+
+def _resultado(item, codigo, status='registrado'):
+    return {
+        'nome': item['nome'],
+        'status': status if codigo is not None and 200 <= codigo < 300 else 'erro',
+        'codigo': codigo
+    }
+
+
+def agregar_itens(itens):
+    """ Junta as linhas do mesmo produto da mesma empresa (chave_produto), somando quantidade e preço.
+
+        O preço de cada linha já é o valor total dela, então a soma é o total do produto na nota.
+        Fica o nome da primeira linha, na ordem em que o produto apareceu. Aceita um gerador e
+        acumula na própria linha que chegou primeiro, que não deve ser usada depois.
+    """
+    agregados = {}
+    for item in itens:
+        agregado = agregados.setdefault(chave_produto(item['nome'], item['descricao']), item)
+        if agregado is not item:
+            agregado['quantidade'] += item['quantidade']
+            agregado['preco'] = round(agregado['preco'] + item['preco'], 2)
+    return list(agregados.values())
+
+
+def _campos_edicao(atual, item):
+    """ O produto somado ao item da nota, como agregar_itens soma as linhas repetidas.
+    """
+    return {
+        'nome': atual['nome'],
+        'descricao': atual['descricao'],
+        'preco': round(atual['preco'] + item['preco'], 2),
+        'quantidade': atual['quantidade'] + item['quantidade']
+    }
+
+
+def _nao_enviado(erro, sem_conexao):
+    """ A chamada certamente não chegou ao upstream: recusada pelo gateway antes de sair (circuito
+        aberto ou prazo esgotado antes do envio) ou sem conexão (sem_conexao). Um timeout de leitura
+        ou uma conexão caída no meio da resposta podem vir depois de o upstream aceitar a escrita.
+    """
+    if isinstance(erro, UpstreamIndisponivel):
+        erro = erro.__cause__
+        if erro is None:
+            return True
+    return sem_conexao(erro)
+
+
+def _sem_conexao(erro):
+    if isinstance(erro, requests.ConnectTimeout):
+        return True
+    motivo = getattr(erro.args[0], 'reason', None) if isinstance(erro, requests.ConnectionError) and erro.args else None
+    return isinstance(motivo, ConnectTimeoutError)
+
+
+def _sem_conexao_httpx(erro):
+    import httpx
+
+    return isinstance(erro, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+
+def _falhas(itens, resultados):
+    """ Os itens que não foram cadastrados nem atualizados: ficam pendentes na nota.
+    """
+    return [item for item, resultado in zip(itens, resultados) if resultado['status'] == 'erro']
+
+
+class RegistradorProdutos:
+    """ Registra os itens de uma nota no serviço de produtos.
+
+        Usa um único POST em lote quando PRODUTO_LOTE_PATH está configurado e o serviço
+        responde a ele; caso contrário envia os registros em paralelo pelo pool compartilhado
+        de NOTA_IMPORT_WORKERS threads.
+
+        Com o catalogo (CatalogoProdutos) pronto, o item de um produto que já existe no serviço
+        vira uma edição (upsert) que soma a quantidade e o valor da nota aos do produto, em vez de
+        um cadastro repetido; sem ele os itens são só cadastrados, sem ler a listagem inteira do
+        serviço a cada importação. A leitura do produto atual e a edição acontecem sob a trava do
+        produto, para duas notas com o mesmo produto não perderem uma das somas.
+    """
+    def __init__(self, cliente, lote_path=PRODUTO_LOTE_PATH, catalogo=None):
+        self.cliente = cliente
+        self.lote_path = lote_path
+        self.catalogo = catalogo
+        self._travas = [threading.Lock() for _ in range(TRAVAS_PRODUTO)]
+        self._travas_async = None
+
+    def trava(self, product_id):
+        """ Serializa leitura e edição de um produto entre importações simultâneas.
+        """
+        return self._travas[product_id % TRAVAS_PRODUTO]
+
+    @asynccontextmanager
+    async def travado(self, product_id):
+        """ A trava do produto no event loop: as corrotinas esperam umas pelas outras em um asyncio.Lock
+            e só a que está com ele espera, em uma thread, pelas importações que rodam nas threads.
+        """
+        loop = asyncio.get_running_loop()
+        if self._travas_async is None or self._travas_async[0] is not loop:
+            self._travas_async = (loop, [asyncio.Lock() for _ in range(TRAVAS_PRODUTO)])
+        trava = self.trava(product_id)
+        async with self._travas_async[1][product_id % TRAVAS_PRODUTO]:
+            if not trava.acquire(blocking=False):
+                aquisicao = asyncio.ensure_future(asyncio.to_thread(trava.acquire))
+                try:
+                    await asyncio.shield(aquisicao)
+                except asyncio.CancelledError:
+                    # A thread continua esperando a trava: é liberada assim que for adquirida.
+                    aquisicao.add_done_callback(lambda _: trava.release())
+                    raise
+            try:
+                yield
+            finally:
+                trava.release()
+
+    def _existentes(self, itens):
+        """ product_id de cada item que já existe no catálogo (ou None); sem o catálogo pronto, todos None.
+        """
+        if self.catalogo is None or not self.catalogo.pronto:
+            return [None] * len(itens)
+        return self.catalogo.existentes(itens)
+
+    def registrar(self, itens, headers):
+        if not itens:
+            return []
+        existentes = self._existentes(itens)
+        novos = [item for item, product_id in zip(itens, existentes) if product_id is None]
+        edicoes = [(item, product_id) for item, product_id in zip(itens, existentes) if product_id is not None]
+
+        registrados = iter(self._registrar_novos(novos, headers))
+        atualizados = iter(self._paralelo(self._atualizar_item, edicoes, headers))
+        return [next(registrados) if product_id is None else next(atualizados) for product_id in existentes]
+
+    def _registrar_novos(self, itens, headers):
+        if not itens:
+            return []
+        if self.lote_path:
+            resultados = self._registrar_lote(itens, headers)
+            if resultados is not None:
+                return resultados
+        return self._paralelo(self._registrar_item, [(item,) for item in itens], headers)
+
+    def _paralelo(self, funcao, argumentos, headers):
+        # Cada envio roda com uma cópia do contexto da requisição, que carrega o prazo da rota.
+        contextos = [contextvars.copy_context() for _ in argumentos]
+        return list(executor.map(lambda args, contexto: contexto.run(funcao, *args, headers),
+                                 argumentos, contextos))
+
+    async def registrar_async(self, itens, headers, cliente):
+        """ Igual a registrar, com um AsyncUpstreamClient: os envios em paralelo viram corrotinas.
+        """
+        if not itens:
+            return []
+        # O catálogo é lido no SQLite: fora do event loop.
+        existentes = await asyncio.to_thread(self._existentes, itens)
+        novos = [item for item, product_id in zip(itens, existentes) if product_id is None]
+        edicoes = [(item, product_id) for item, product_id in zip(itens, existentes) if product_id is not None]
+
+        limite = asyncio.Semaphore(REGISTRO_WORKERS)
+        registrados = iter(await self._registrar_novos_async(novos, headers, cliente, limite))
+        atualizados = iter(await asyncio.gather(*(self._atualizar_item_async(item, product_id, headers, cliente, limite)
+                                                  for item, product_id in edicoes)))
+        return [next(registrados) if product_id is None else next(atualizados) for product_id in existentes]
+
+    async def _registrar_novos_async(self, itens, headers, cliente, limite):
+        if not itens:
+            return []
+        if self.lote_path:
+            resultados = await self._registrar_lote_async(itens, headers, cliente)
+            if resultados is not None:
+                return resultados
+        return list(await asyncio.gather(*(self._registrar_item_async(item, headers, cliente, limite)
+                                           for item in itens)))
+
+    def _registrar_item(self, item, headers):
+        try:
+            response = self.cliente.post('/api/registrar', json=item, headers=headers)
+            return _resultado(item, response.status_code)
+        except (requests.RequestException, UpstreamIndisponivel):
+            return _resultado(item, None)
+
+    async def _registrar_item_async(self, item, headers, cliente, limite):
+        import httpx
+
+        async with limite:
+            try:
+                response = await cliente.post('/api/registrar', json=item, headers=headers)
+                return _resultado(item, response.status_code)
+            except (httpx.HTTPError, UpstreamIndisponivel):
+                return _resultado(item, None)
+
+    def _atualizar_item(self, item, product_id, headers):
+        with self.trava(product_id):
+            atual = self.catalogo.produto(product_id)
+            if atual is not None:
+                campos = _campos_edicao(atual, item)
+                try:
+                    response = self.cliente.put(f'/api/produto/{product_id}', json=campos, headers=headers)
+                except (requests.RequestException, UpstreamIndisponivel):
+                    return _resultado(item, None)
+                resultado = self._resultado_edicao(item, product_id, campos, response)
+                if resultado is not None:
+                    return resultado
+            # Removido depois da consulta ao catálogo: vira um cadastro novo.
+            return self._registrar_item(item, headers)
+
+    async def _atualizar_item_async(self, item, product_id, headers, cliente, limite):
+        import httpx
+
+        async with self.travado(product_id):
+            # O catálogo é lido e gravado no SQLite: fora do event loop.
+            atual = await asyncio.to_thread(self.catalogo.produto, product_id)
+            if atual is not None:
+                campos = _campos_edicao(atual, item)
+                async with limite:
+                    try:
+                        response = await cliente.put(f'/api/produto/{product_id}', json=campos, headers=headers)
+                    except (httpx.HTTPError, UpstreamIndisponivel):
+                        return _resultado(item, None)
+                resultado = await asyncio.to_thread(self._resultado_edicao, item, product_id, campos, response)
+                if resultado is not None:
+                    return resultado
+            return await self._registrar_item_async(item, headers, cliente, limite)
+
+    def _resultado_edicao(self, item, product_id, campos, response):
+        if response.status_code == 404:
+            self.catalogo.remover(product_id)
+            return None
+        if 200 <= response.status_code < 300:
+            self.catalogo.atualizar(product_id, campos)
+        return _resultado(item, response.status_code, 'atualizado')
+
+    def _registrar_lote(self, itens, headers):
+        try:
+            response = self.cliente.post(self.lote_path, json={'produtos': itens}, headers=headers)
+        except (requests.RequestException, UpstreamIndisponivel) as e:
+            return self._lote_falhou(itens, _nao_enviado(e, _sem_conexao))
+        return self._resultados_lote(itens, response)
+
+    async def _registrar_lote_async(self, itens, headers, cliente):
+        import httpx
+
+        try:
+            response = await cliente.post(self.lote_path, json={'produtos': itens}, headers=headers)
+        except (httpx.HTTPError, UpstreamIndisponivel) as e:
+            return self._lote_falhou(itens, _nao_enviado(e, _sem_conexao_httpx))
+        return self._resultados_lote(itens, response)
+
+    def _lote_falhou(self, itens, nao_enviado):
+        """ Sem resposta do lote: os itens vão um a um só se o lote não saiu do gateway. Se ele
+            pode ter sido aceito, os cadastros não são repetidos e os itens ficam com erro (a nota
+            fica pendente).
+        """
+        if nao_enviado:
+            return None
+        return [_resultado(item, None) for item in itens]
+
+    def _resultados_lote(self, itens, response):
+        if response.status_code in (404, 405, 501):
+            # O serviço de produtos não conhece a rota de lote: não tenta de novo.
+            self.lote_path = None
+            return None
+
+        try:
+            codigos = [r.get('status_code', response.status_code) for r in ler_json(response)['resultados']]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            codigos = None
+        if codigos is None or len(codigos) != len(itens):
+            codigos = [response.status_code] * len(itens)
+        return [_resultado(item, codigo) for item, codigo in zip(itens, codigos)]
+
+
+class ImportadorNota:
+    """ Lê uma nota fiscal eletrônica e cadastra os seus itens no serviço de produtos.
+
+        Com um NotaCache, a nota lida é reaproveitada pela chave de acesso e uma nota já
+        importada (ou em importação) gera NotaDuplicada em vez de ser cadastrada de novo. Uma
+        nota com itens que falharam fica pendente: enviada de novo, só esses itens são cadastrados.
+        Com listagens (TTLCache), a listagem de produtos é invalidada após o cadastro; com catalogo
+        (CatalogoProdutos), a próxima sincronização do catálogo local é antecipada. Com agregar, as
+        linhas repetidas do mesmo produto são juntadas antes do registro (agregar_itens).
+    """
+    def __init__(self, registrador, cache=None, listagens=None, catalogo=None, agregar=NOTA_AGREGAR):
+        self.registrador = registrador
+        self.cache = cache
+        self.listagens = listagens
+        self.catalogo = catalogo
+        self.agregar = agregar
+
+    def importar(self, nota_url, headers, limite=None):
+        chave = chave_acesso(nota_url) if self.cache else None
+        pendentes = self.cache.reservar(chave) if chave else None
+
+        importada, falhas = False, None
+        try:
+            if pendentes is None:
+                with limite or nullcontext():
+                    dados_t_list = self.extrair(nota_url)
+            else:
+                dados_t_list = pendentes
+            with ETAPA_DURACAO.cronometrar('nota_registro'):
+                resultados = self.registrador.registrar(dados_t_list, headers)
+            if self.listagens is not None:
+                self.listagens.invalidar('produtos')
+            if self.catalogo is not None:
+                self.catalogo.agendar()
+            falhas = _falhas(dados_t_list, resultados)
+            importada = not falhas
+        finally:
+            if chave:
+                self.cache.concluir(chave, importada, falhas)
+
+        return {"Itens": dados_t_list, "Resultados": resultados}
+
+    async def importar_async(self, nota_url, headers, cliente):
+        """ Igual a importar, no event loop do modo ASGI; cliente é o AsyncUpstreamClient de produtos.
+        """
+        chave = chave_acesso(nota_url) if self.cache else None
+        # O NotaCache lê e grava em disco com NOTA_CACHE_DIR: fora do event loop.
+        pendentes = await asyncio.to_thread(self.cache.reservar, chave) if chave else None
+
+        importada, falhas = False, None
+        try:
+            dados_t_list = await self.extrair_async(nota_url) if pendentes is None else pendentes
+            with ETAPA_DURACAO.cronometrar('nota_registro'):
+                resultados = await self.registrador.registrar_async(dados_t_list, headers, cliente)
+            if self.listagens is not None:
+                self.listagens.invalidar('produtos')
+            if self.catalogo is not None:
+                self.catalogo.agendar()
+            falhas = _falhas(dados_t_list, resultados)
+            importada = not falhas
+        finally:
+            if chave:
+                await asyncio.to_thread(self.cache.concluir, chave, importada, falhas)
+
+        return {"Itens": dados_t_list, "Resultados": resultados}
+
+    def ler(self, nota_url):
+        """ (nota, itens): a nota em cache com a lista dos seus itens ou, lida do portal, a nota do
+            parse em partes (NotaFiscalExtractor.parse_stream) com o gerador dos itens.
+        """
+        chave = chave_acesso(nota_url) if self.cache else None
+        nota_fiscal = self.cache.buscar(chave) if chave else None
+        if nota_fiscal is not None:
+            return nota_fiscal, nota_fiscal["Itens"]
+        # Importado só na primeira leitura: o BeautifulSoup não pesa na inicialização do gateway.
+        from services.nota_fiscal_eletronica import NotaFiscalExtractor
+        nota_fiscal_extractor = NotaFiscalExtractor(url=nota_url)
+        return self._ler_pagina(nota_fiscal_extractor, nota_fiscal_extractor.download(), chave)
+
+    async def ler_async(self, nota_url):
+        chave = chave_acesso(nota_url) if self.cache else None
+        nota_fiscal = await asyncio.to_thread(self.cache.buscar, chave) if chave else None
+        if nota_fiscal is not None:
+            return nota_fiscal, nota_fiscal["Itens"]
+        from services.nota_fiscal_eletronica import NotaFiscalExtractor
+        nota_fiscal_extractor = NotaFiscalExtractor(url=nota_url)
+        content = await nota_fiscal_extractor.download_async()
+        # A árvore do BeautifulSoup é montada já no parse_stream: fora do event loop.
+        return await asyncio.to_thread(self._ler_pagina, nota_fiscal_extractor, content, chave)
+
+    def _ler_pagina(self, nota_fiscal_extractor, content, chave):
+        if content is None:
+            return None, None
+        nota_fiscal, registros = nota_fiscal_extractor.parse_stream(content)
+        if chave:
+            registros = self._guardar(chave, nota_fiscal, registros)
+        return nota_fiscal, registros
+
+    def _guardar(self, chave, nota_fiscal, registros):
+        """ Repassa os itens guardando-os na nota, que vai para o cache quando a leitura termina.
+        """
+        itens = nota_fiscal["Itens"]
+        for registro in registros:
+            itens.append(registro)
+            yield registro
+        self.cache.salvar(chave, nota_fiscal)
+
+    def extrair(self, nota_url):
+        return self.itens(*self.ler(nota_url))
+
+    async def extrair_async(self, nota_url):
+        nota_fiscal, registros = await self.ler_async(nota_url)
+        # Os itens de uma nota lida do portal são extraídos conforme são consumidos: em uma thread.
+        return await asyncio.to_thread(self.itens, nota_fiscal, registros)
+
+    def itens(self, nota_fiscal, registros=None):
+        """ Os produtos a registrar, montados conforme os ItemRecord chegam (de registros ou, sem
+            ele, da lista da nota), sem listas intermediárias.
+
+            O nome da empresa é lido da nota a cada item: no parse em partes ele só é gravado na
+            nota pouco antes do primeiro item.
+        """
+        if registros is None:
+            registros = nota_fiscal["Itens"]
+        dados_t = ({
+            'nome': produto,
+            'descricao': nota_fiscal["Empresa"]["Nome da Empresa"],
+            'preco': float(vl_total.replace(",", ".")),
+            'quantidade': int(qtde)
+        } for produto, qtde, _, _, vl_total in registros)
+
+        return agregar_itens(dados_t) if self.agregar else list(dados_t)
+
+
+class ImportadorLote:
+    """ Importa várias notas em paralelo, entregando cada resultado assim que fica pronto.
+
+        A leitura no portal da SEFAZ é limitada a NOTA_LOTE_POR_HOST downloads simultâneos
+        por host, para não sobrecarregar o portal de um mesmo estado.
+    """
+    def __init__(self, importador, max_workers=LOTE_WORKERS, por_host=LOTE_POR_HOST):
+        self.importador = importador
+        self.por_host = por_host
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='nota-lote')
+        self._semaforos = {}
+        self._lock = threading.Lock()
+
+    def _semaforo(self, nota_url):
+        host = urlparse(nota_url).hostname or ''
+        with self._lock:
+            if host not in self._semaforos:
+                self._semaforos[host] = threading.BoundedSemaphore(self.por_host)
+            return self._semaforos[host]
+
+    def _importar(self, nota_url, headers):
+        try:
+            resultado = self.importador.importar(nota_url, headers, limite=self._semaforo(nota_url))
+            return {"nota_url": nota_url, "status": 201, **resultado}
+        except NotaDuplicada as e:
+            return {"nota_url": nota_url, "status": 409, "mesage": e.mensagem}
+        except UpstreamIndisponivel as e:
+            return {"nota_url": nota_url, "status": e.status, "mesage": e.mensagem}
+        except Exception:
+            return {"nota_url": nota_url, "status": 500, "mesage": "Ocorreu um erro na leitura"}
+
+    def importar(self, nota_urls, headers):
+        futures = [self.executor.submit(self._importar, nota_url, headers) for nota_url in nota_urls]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
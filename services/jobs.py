@@ -0,0 +1,92 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import importlib
+import os
+import threading
+import uuid
+
+JOBS_WORKERS = int(os.getenv('NOTA_JOBS_WORKERS', 4))
+JOBS_MAX = int(os.getenv('NOTA_JOBS_MAX', 1000))
+
+
+class JobStore(ABC):
+    """ Interface dos backends de armazenamento de jobs.
+
+        Os jobs são dicts serializáveis em JSON, então um backend externo (Redis, banco)
+        só precisa implementar salvar e buscar.
+    """
+    @abstractmethod
+    def salvar(self, job):
+        pass
+
+    @abstractmethod
+    def buscar(self, job_id):
+        pass
+
+
+class MemoryJobStore(JobStore):
+    """ Guarda os jobs no processo, descartando os mais antigos acima de max_jobs.
+    """
+    def __init__(self, max_jobs=JOBS_MAX):
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def salvar(self, job):
+        with self._lock:
+            self._jobs[job['id']] = dict(job)
+            self._jobs.move_to_end(job['id'])
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+    def buscar(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+
+def carregar_store(caminho=None):
+    """ Instancia o backend configurado em NOTA_JOBS_STORE ('modulo:Classe').
+    """
+    caminho = caminho or os.getenv('NOTA_JOBS_STORE')
+    if not caminho:
+        return MemoryJobStore()
+    modulo, classe = caminho.split(':')
+    return getattr(importlib.import_module(modulo), classe)()
+
+
+class JobRunner:
+    def __init__(self, store, max_workers=JOBS_WORKERS):
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='nota-job')
+
+    def submeter(self, func, *args, dono=None):
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'pendente',
+            'dono': dono,
+            'criado_em': datetime.now().isoformat(),
+            'concluido_em': None,
+            'resultado': None,
+            'erro': None
+        }
+        self.store.salvar(job)
+        self.executor.submit(self._executar, dict(job), func, args)
+        return job
+
+    def _executar(self, job, func, args):
+        job['status'] = 'executando'
+        self.store.salvar(job)
+        try:
+            job['resultado'] = func(*args)
+            job['status'] = 'concluido'
+        except Exception as e:
+            job['status'] = 'erro'
+            job['erro'] = getattr(e, 'mensagem', 'Ocorreu um erro na leitura')
+        job['concluido_em'] = datetime.now().isoformat()
+        self.store.salvar(job)
+
+    def buscar(self, job_id):
+        return self.store.buscar(job_id)
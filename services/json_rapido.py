@@ -0,0 +1,117 @@
+import json
+import math
+import os
+import re
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_RAPIDO = os.getenv('JSON_RAPIDO', 'true').lower() in ('1', 'true', 'sim') and orjson is not None
+
+_ASCII = bytes(range(0x7f))
+# Fora do ASCII imprimível, como o ensure_ascii do json (que também escapa o DEL).
+_NAO_ASCII = re.compile('[^\x00-\x7e]')
+# Até quantos caracteres distintos compensa um replace por caractere em vez da regex.
+_ESCAPE_REPLACES = 32
+
+
+def _escape(caractere):
+    codigo = ord(caractere)
+    if codigo < 0x10000:
+        return '\\u%04x' % codigo
+    codigo -= 0x10000
+    return '\\u%04x\\u%04x' % (0xd800 | (codigo >> 10), 0xdc00 | (codigo & 0x3ff))
+
+
+def _escapar(corpo):
+    """ Escapa como \\uXXXX os caracteres fora do ASCII de um JSON em UTF-8.
+
+        Tirando os bytes ASCII sobra um UTF-8 válido só com esses caracteres; quando são poucos os
+        distintos (acentos, em geral), um str.replace para cada um sai mais barato que a regex.
+    """
+    texto = corpo.decode()
+    distintos = set(corpo.translate(None, _ASCII).decode())
+    if len(distintos) > _ESCAPE_REPLACES:
+        return _NAO_ASCII.sub(lambda encontrado: _escape(encontrado.group()), texto).encode()
+    for caractere in distintos:
+        texto = texto.replace(caractere, _escape(caractere))
+    return texto.encode()
+
+
+def _nao_finito(obj):
+    """ Se obj tem algum float NaN ou infinito, que o orjson escreve como null.
+    """
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_nao_finito(valor) for valor in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_nao_finito(valor) for valor in obj)
+    return False
+
+
+def loads(dados):
+    """ Decodifica um corpo JSON (bytes ou str), com o orjson quando instalado.
+    """
+    if JSON_RAPIDO:
+        return orjson.loads(dados)
+    return json.loads(dados)
+
+
+def ler_json(response):
+    """ Equivalente ao response.json() do requests e do httpx.
+    """
+    return loads(response.content)
+
+
+class JSONRapidoProvider(DefaultJSONProvider):
+    """ Provider JSON do Flask que usa o orjson (pacote opcional) quando instalado.
+
+        A saída é a mesma do provider padrão no modo compacto: chaves ordenadas, sem espaços e
+        com os caracteres fora do ASCII escapados como \\uXXXX. Datas, Decimal e os demais tipos
+        que o orjson não conhece passam pelo `default` do Flask. O que o orjson não serializa
+        igual (chaves que não são str, inteiros acima de 64 bits, NaN e infinito, que ele escreve
+        como null) e as chamadas com outras opções, como a indentação do modo debug, seguem pelo
+        json da biblioteca padrão. A única diferença nos bytes fica nos floats em notação
+        exponencial (1e20 em vez de 1e+20), que representam o mesmo número; preços e quantidades
+        dos schemas nunca chegam a ela.
+    """
+    rapido = JSON_RAPIDO
+
+    def serializar(self, obj):
+        """ JSON compacto em bytes, como o corpo do jsonify sem a quebra de linha final.
+        """
+        if self.rapido:
+            opcoes = orjson.OPT_PASSTHROUGH_DATETIME | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+            try:
+                corpo = orjson.dumps(obj, default=self.default, option=opcoes)
+            except orjson.JSONEncodeError:
+                pass
+            else:
+                # Só um corpo com null pode ter vindo de um float não finito.
+                if b'null' in corpo and _nao_finito(obj):
+                    return super().dumps(obj, separators=(',', ':')).encode()
+                if self.ensure_ascii and (not corpo.isascii() or b'\x7f' in corpo):
+                    corpo = _escapar(corpo)
+                return corpo
+        return super().dumps(obj, separators=(',', ':')).encode()
+
+    def dumps(self, obj, **kwargs):
+        if self.rapido and kwargs == {'separators': (',', ':')}:
+            return self.serializar(obj).decode()
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.rapido and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if not self.rapido or (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.serializar(obj) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,217 @@
+import bisect
+from contextlib import contextmanager
+import os
+import threading
+import time
+
+METRICAS_BUCKETS = tuple(float(limite) for limite in os.getenv(
+    'METRICAS_BUCKETS', '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30').split(','))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _rotulos(nomes, valores, extra=None):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Registro:
+    def __init__(self):
+        self.metricas = []
+
+    def registrar(self, metrica):
+        self.metricas.append(metrica)
+        return metrica
+
+    def exportar(self):
+        """ Todas as métricas no formato texto do Prometheus.
+        """
+        linhas = []
+        for metrica in self.metricas:
+            linhas.extend(metrica.exportar())
+        return '\n'.join(linhas) + '\n'
+
+
+REGISTRO = Registro()
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, descricao, rotulos=(), registro=REGISTRO):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+        registro.registrar(self)
+
+    def _series(self):
+        with self._lock:
+            return list(self._valores.items())
+
+    def exportar(self):
+        linhas = [f'# HELP {self.nome} {self.descricao}', f'# TYPE {self.nome} {self.tipo}']
+        for valores, valor in self._series():
+            linhas.append(f'{self.nome}{_rotulos(self.rotulos, valores)} {_numero(valor)}')
+        return linhas
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, *rotulos, valor=1):
+        with self._lock:
+            self._valores[rotulos] = self._valores.get(rotulos, 0) + valor
+
+
+class Gauge(_Metrica):
+    tipo = 'gauge'
+
+    def __init__(self, nome, descricao, rotulos=(), registro=REGISTRO):
+        super().__init__(nome, descricao, rotulos, registro)
+        self._funcoes = {}
+
+    def funcao(self, func, *rotulos):
+        """ Série calculada na hora da coleta (a idade de uma sincronização, por exemplo); None omite a série.
+        """
+        with self._lock:
+            self._funcoes[rotulos] = func
+
+    def _series(self):
+        with self._lock:
+            series = list(self._valores.items())
+            funcoes = list(self._funcoes.items())
+        for rotulos, func in funcoes:
+            valor = func()
+            if valor is not None:
+                series.append((rotulos, valor))
+        return series
+
+    def inc(self, *rotulos, valor=1):
+        with self._lock:
+            self._valores[rotulos] = self._valores.get(rotulos, 0) + valor
+
+    def dec(self, *rotulos, valor=1):
+        self.inc(*rotulos, valor=-valor)
+
+
+class Histograma(_Metrica):
+    """ Histograma com buckets fixos: cada observação é um bisect e duas somas sob o lock.
+    """
+    tipo = 'histogram'
+
+    def __init__(self, nome, descricao, rotulos=(), buckets=METRICAS_BUCKETS, registro=REGISTRO):
+        super().__init__(nome, descricao, rotulos, registro)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor, *rotulos):
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._valores.get(rotulos)
+            if serie is None:
+                serie = self._valores[rotulos] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    @contextmanager
+    def cronometrar(self, *rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, *rotulos)
+
+    def _series(self):
+        with self._lock:
+            return [(valores, (list(contagens), soma)) for valores, (contagens, soma) in self._valores.items()]
+
+    def exportar(self):
+        linhas = [f'# HELP {self.nome} {self.descricao}', f'# TYPE {self.nome} {self.tipo}']
+        for valores, (contagens, soma) in self._series():
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float('inf'),), contagens):
+                acumulado += contagem
+                le = 'le="+Inf"' if limite == float('inf') else f'le="{_numero(limite)}"'
+                linhas.append(f'{self.nome}_bucket{_rotulos(self.rotulos, valores, le)} {acumulado}')
+            linhas.append(f'{self.nome}_sum{_rotulos(self.rotulos, valores)} {_numero(soma)}')
+            linhas.append(f'{self.nome}_count{_rotulos(self.rotulos, valores)} {acumulado}')
+        return linhas
+
+
+ROTA_DURACAO = Histograma('gateway_http_request_duration_seconds', 'Duração das requisições ao gateway.',
+                          ('metodo', 'rota', 'status'))
+ROTA_EM_ANDAMENTO = Gauge('gateway_http_requests_in_flight', 'Requisições ao gateway em andamento.', ('rota',))
+ROTA_ERROS = Contador('gateway_http_errors_total', 'Respostas 5xx e exceções não tratadas por rota.', ('rota', 'tipo'))
+
+UPSTREAM_DURACAO = Histograma('gateway_upstream_request_duration_seconds', 'Duração das chamadas aos upstreams.',
+                              ('upstream', 'host', 'metodo', 'status'))
+UPSTREAM_EM_ANDAMENTO = Gauge('gateway_upstream_requests_in_flight', 'Chamadas aos upstreams em andamento.',
+                              ('upstream',))
+UPSTREAM_ERROS = Contador('gateway_upstream_errors_total', 'Respostas 5xx e falhas de conexão dos upstreams.',
+                          ('upstream', 'host', 'tipo'))
+UPSTREAM_EJECOES = Contador('gateway_upstream_ejections_total', 'Réplicas retiradas do balanceamento por falhas ou lentidão.',
+                            ('upstream', 'host', 'motivo'))
+UPSTREAM_CIRCUITO = Gauge('gateway_upstream_circuit_open', 'Circuit breakers abertos (1) por upstream e host.',
+                          ('upstream', 'host'))
+UPSTREAM_REJEITADAS = Contador('gateway_upstream_rejected_total',
+                               'Chamadas recusadas antes de sair (circuito aberto ou prazo esgotado).',
+                               ('upstream', 'motivo'))
+UPSTREAM_HEDGES = Contador('gateway_upstream_hedged_total',
+                           'Chamadas GET duplicadas por hedge, por chamada que respondeu primeiro.',
+                           ('upstream', 'vencedora'))
+
+USUARIOS_ESPELHO_LOGINS = Contador('gateway_user_mirror_logins_total',
+                                   'Logins verificados no espelho local de usuários (acerto) ou repassados ao serviço.',
+                                   ('resultado',))
+ESPELHO_SYNCS = Contador('gateway_mirror_syncs_total', 'Sincronizações dos espelhos locais (usuários, produtos).',
+                         ('espelho', 'resultado'))
+ESPELHO_ATRASO = Gauge('gateway_mirror_sync_lag_seconds',
+                       'Segundos desde a última sincronização bem-sucedida de cada espelho local.', ('espelho',))
+
+ETAPA_DURACAO = Histograma('gateway_stage_duration_seconds',
+                           'Duração das etapas internas (leitura da nota, parse, registro, emissão de JWT).',
+                           ('etapa',))
+
+
+def instrumentar(app):
+    """ Mede todas as rotas do app: duração por método/rota/status, requisições em andamento e erros.
+
+        A rota é o padrão registrado no Flask (/produto/<int:id>), não o caminho recebido, para
+        manter a quantidade de séries fixa.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _iniciar_medicao():
+        g.metricas_rota = request.url_rule.rule if request.url_rule is not None else 'nao_encontrada'
+        g.metricas_inicio = time.perf_counter()
+        ROTA_EM_ANDAMENTO.inc(g.metricas_rota)
+
+    @app.after_request
+    def _registrar_status(response):
+        g.metricas_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _concluir_medicao(exc):
+        rota = g.pop('metricas_rota', None)
+        if rota is None:
+            return
+        status = g.pop('metricas_status', 500)
+        ROTA_EM_ANDAMENTO.dec(rota)
+        ROTA_DURACAO.observar(time.perf_counter() - g.pop('metricas_inicio'), request.method, rota, str(status))
+        if exc is not None:
+            ROTA_ERROS.inc(rota, type(exc).__name__)
+        elif status >= 500:
+            ROTA_ERROS.inc(rota, str(status))
@@ -0,0 +1,164 @@
+from collections import OrderedDict
+import json
+import os
+import re
+import threading
+
+from services.nota_itens import ItemRecord
+
+CACHE_MAX = int(os.getenv('NOTA_CACHE_MAX', 256))
+CACHE_DIR = os.getenv('NOTA_CACHE_DIR')
+IMPORTADAS_MAX = int(os.getenv('NOTA_IMPORTADAS_MAX', 100000))
+
+_CHAVE_ACESSO = re.compile(r'[?&]p=(\d{44})')
+
+
+def chave_acesso(nota_url):
+    """ Extrai a chave de acesso de 44 dígitos do parâmetro p= da URL do QR Code.
+    """
+    encontrado = _CHAVE_ACESSO.search(nota_url or '')
+    return encontrado.group(1) if encontrado else None
+
+
+class NotaDuplicada(Exception):
+    mensagem = 'Nota já importada.'
+
+
+class NotaCache:
+    """ Cache das notas extraídas, indexado pela chave de acesso.
+
+        A chave de acesso identifica a nota de forma única e o conteúdo nunca muda, então as
+        entradas não expiram: a memória guarda as max_itens mais recentes (LRU) e, com
+        NOTA_CACHE_DIR, o disco guarda todas. O cache também registra as notas já importadas
+        para que a mesma nota não seja cadastrada duas vezes e, de uma nota importada em parte,
+        os produtos que falharam, que são os únicos cadastrados quando ela é enviada de novo.
+    """
+    def __init__(self, max_itens=CACHE_MAX, diretorio=CACHE_DIR, max_importadas=IMPORTADAS_MAX):
+        self.max_itens = max_itens
+        self.diretorio = diretorio
+        self.max_importadas = max_importadas
+        self._memoria = OrderedDict()
+        self._importadas = OrderedDict()
+        self._pendentes = OrderedDict()
+        self._em_andamento = set()
+        self._lock = threading.Lock()
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self.duplicadas = 0
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+    def _arquivo(self, chave, extensao):
+        return os.path.join(self.diretorio, f"{chave}.{extensao}")
+
+    def _guardar_memoria(self, chave, nota):
+        self._memoria[chave] = nota
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.max_itens:
+            self._memoria.popitem(last=False)
+
+    def buscar(self, chave):
+        with self._lock:
+            nota = self._memoria.get(chave)
+            if nota is not None:
+                self._memoria.move_to_end(chave)
+                self.hits_memoria += 1
+                return nota
+
+        if self.diretorio:
+            try:
+                with open(self._arquivo(chave, 'json'), encoding='utf-8') as arquivo:
+                    nota = json.load(arquivo)
+            except (OSError, ValueError):
+                nota = None
+            if nota is not None:
+                nota['Itens'] = [ItemRecord.carregar(item) for item in nota['Itens']]
+                with self._lock:
+                    self.hits_disco += 1
+                    self._guardar_memoria(chave, nota)
+                return nota
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def salvar(self, chave, nota):
+        with self._lock:
+            self._guardar_memoria(chave, nota)
+        if self.diretorio:
+            temporario = self._arquivo(chave, f'{threading.get_ident()}.tmp')
+            with open(temporario, 'w', encoding='utf-8') as arquivo:
+                json.dump(nota, arquivo, ensure_ascii=False)
+            os.replace(temporario, self._arquivo(chave, 'json'))
+
+    def _ja_importada(self, chave):
+        if chave in self._importadas:
+            return True
+        return bool(self.diretorio) and os.path.exists(self._arquivo(chave, 'importada'))
+
+    def _pendentes_de(self, chave):
+        pendentes = self._pendentes.get(chave)
+        if pendentes is not None or not self.diretorio:
+            return pendentes
+        try:
+            with open(self._arquivo(chave, 'pendentes'), encoding='utf-8') as arquivo:
+                return json.load(arquivo)
+        except (OSError, ValueError):
+            return None
+
+    def reservar(self, chave):
+        """ Marca a nota como em importação; falha se ela já foi ou está sendo importada.
+
+            Devolve os produtos que falharam na importação anterior da nota, ou None se ela
+            ainda não foi importada.
+        """
+        with self._lock:
+            if chave in self._em_andamento or self._ja_importada(chave):
+                self.duplicadas += 1
+                raise NotaDuplicada(NotaDuplicada.mensagem)
+            self._em_andamento.add(chave)
+            return self._pendentes_de(chave)
+
+    def concluir(self, chave, importada=True, pendentes=None):
+        """ Libera a nota. importada marca a nota inteira como cadastrada; pendentes guarda os
+            produtos que falharam, para a próxima importação da nota cadastrar só eles.
+        """
+        with self._lock:
+            self._em_andamento.discard(chave)
+            if importada:
+                self._pendentes.pop(chave, None)
+                self._importadas[chave] = True
+                while len(self._importadas) > self.max_importadas:
+                    self._importadas.popitem(last=False)
+            elif pendentes:
+                self._pendentes[chave] = pendentes
+                self._pendentes.move_to_end(chave)
+                while len(self._pendentes) > self.max_importadas:
+                    self._pendentes.popitem(last=False)
+        if not self.diretorio:
+            return
+        if importada:
+            open(self._arquivo(chave, 'importada'), 'a').close()
+            try:
+                os.remove(self._arquivo(chave, 'pendentes'))
+            except FileNotFoundError:
+                pass
+        elif pendentes:
+            temporario = self._arquivo(chave, f'{threading.get_ident()}.tmp')
+            with open(temporario, 'w', encoding='utf-8') as arquivo:
+                json.dump(pendentes, arquivo, ensure_ascii=False)
+            os.replace(temporario, self._arquivo(chave, 'pendentes'))
+
+    def json(self):
+        with self._lock:
+            return {
+                'itens_memoria': len(self._memoria),
+                'max_itens': self.max_itens,
+                'disco': bool(self.diretorio),
+                'hits_memoria': self.hits_memoria,
+                'hits_disco': self.hits_disco,
+                'misses': self.misses,
+                'duplicadas': self.duplicadas,
+                'pendentes': len(self._pendentes)
+            }
@@ -1,21 +1,87 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import os
+import time
+
+from bs4 import BeautifulSoup, Tag
+
+from services.metricas import ETAPA_DURACAO
+from services.nota_itens import parse_item
+from services.upstream import UpstreamClient
+
+ENGINE = os.getenv('NOTA_EXTRACTOR_ENGINE', 'padrao')
+
+sefaz = UpstreamClient('sefaz')
+_sefaz_async = None
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+
+
+def _cronometrar_itens(itens, gasto, etapa=None):
+    """ Repassa os itens de um parse em partes e, ao fim, registra em ETAPA_DURACAO o tempo gasto
+        produzindo-os (em etapa) e o do parse inteiro (gasto antes do primeiro item mais o dos itens).
+    """
+    gasto_itens = 0.0
+    itens = iter(itens)
+    while True:
+        inicio = time.perf_counter()
+        try:
+            item = next(itens)
+        except StopIteration:
+            break
+        finally:
+            gasto_itens += time.perf_counter() - inicio
+        yield item
+    if etapa:
+        ETAPA_DURACAO.observar(gasto_itens, etapa)
+    ETAPA_DURACAO.observar(gasto + gasto_itens, 'nota_parse')
+
+
+def sefaz_async():
+    """ Cliente httpx do portal da SEFAZ, criado só quando o gateway roda em modo ASGI.
+    """
+    global _sefaz_async
+    if _sefaz_async is None:
+        from services.upstream_async import AsyncUpstreamClient
+        _sefaz_async = AsyncUpstreamClient(sefaz)
+    return _sefaz_async
+
+
+def build_company_name(company_name):
+    return company_name.replace('\n', '').replace('\t', '')
+
+
+def build_company_data(company_name, cnpj_text, address_texts):
+    company_name = build_company_name(company_name)
+    address = ", ".join(address_texts).replace('\n', '').replace('\t', '')
+
+    return {
+        "Nome da Empresa": company_name,
+        "CNPJ": cnpj_text.split(":")[-1].strip(),
+        "Endereço": address
+    }
 
 class ResponseGetter:
     def __init__(self, url):
         self.url = url
 
     def get_response(self):
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-        response = requests.get(self.url, headers=headers)
+        response = sefaz.get(self.url, headers=HEADERS)
         
         if response.status_code == 200:
             return response
         else:
             return None
 
+    async def get_response_async(self):
+        response = await sefaz_async().get(self.url, headers=HEADERS)
+
+        if response.status_code == 200:
+            return response
+        else:
+            return None
+
 class CompanyInfoExtractor:
     def __init__(self, soup):
         self.soup = soup
@@ -25,18 +91,11 @@ class CompanyInfoExtractor:
         if company_element:
             company_name = company_element.get_text(strip=True)
             cnpj_element = company_element.find_next("div", class_="text")
-            cnpj = cnpj_element.get_text(strip=True).split(":")[-1].strip()
+            cnpj = cnpj_element.get_text(strip=True)
             address_elements = company_element.find_all_next("div", class_="text")
-            address = ", ".join([element.get_text(strip=True) for element in address_elements[1:]])
+            address = [element.get_text(strip=True) for element in address_elements[1:]]
 
-            company_name = company_name.replace('\n', '').replace('\t', '')
-            address = address.replace('\n', '').replace('\t', '')
-
-            return {
-                "Nome da Empresa": company_name,
-                "CNPJ": cnpj,
-                "Endereço": address
-            }
+            return build_company_data(company_name, cnpj, address)
         else:
             return {}
 
@@ -62,48 +121,117 @@ class ItemsInfoExtractor:
     def __init__(self, soup):
         self.soup = soup
 
+    def iter_items(self):
+        """ Um ItemRecord (services/nota_itens.py) por linha de item, na ordem da página.
+
+            Percorre a árvore conforme os itens são pedidos, sem montar antes a lista das linhas.
+        """
+        for element in self.soup.descendants:
+            if isinstance(element, Tag) and element.name == "tr" and (element.get("id") or "").startswith("Item"):
+                columns = element.find_all("td", limit=2)
+                yield parse_item(columns[0].get_text(strip=True), columns[1].get_text(strip=True))
+
     def extract(self):
-        data = []
-        item_elements = self.soup.find_all("tr", id=lambda value: value and value.startswith("Item"))
-        for item_element in item_elements:
-            item_data = {}
-            columns = item_element.find_all("td")
-            product_info = columns[0].get_text(strip=True)
-            product_name = product_info.split("(")[0].strip()
-            item_data["Produto"] = product_name
-            item_data["Qtde"] = product_info.split("Qtde.:")[1].split("UN:")[0]
-            item_data["UN"] = product_info.split("UN:")[1].split("Vl. Unit.:")[0]
-            item_data["Vl. Unit."] = product_info.split("Vl. Unit.:")[1]
-            total_value = columns[1].get_text(strip=True)
-            item_data["Vl. Total"] = total_value.replace("Vl. Total", "")
-            data.append(item_data)
-
-        return data
+        return [item.json() for item in self.iter_items()]
 
 class NotaFiscalExtractor:
-    def __init__(self, url):
+    """ Lê a nota pela URL do QR Code.
+
+        engine 'padrao' monta a árvore completa da página com BeautifulSoup; engine 'rapido'
+        usa o FastNotaParser (services/nota_fiscal_rapida.py), que lê a página em uma única
+        passada sem montar a árvore e devolve o mesmo resultado.
+    """
+    def __init__(self, url, engine=None):
         self.url = url
+        self.engine = engine or ENGINE
 
-    def extract(self):
-        response_getter = ResponseGetter(self.url)
-        response = response_getter.get_response()
-        if response:
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
+    def parse(self, content):
+        with ETAPA_DURACAO.cronometrar('nota_parse'):
+            return self._parse(content)
+
+    def _parse(self, content):
+        if self.engine == 'rapido':
+            from services.nota_fiscal_rapida import FastNotaParser
+            return FastNotaParser().parse(content)
+
+        with ETAPA_DURACAO.cronometrar('nota_html'):
+            soup = BeautifulSoup(content, 'html.parser')
+
+        with ETAPA_DURACAO.cronometrar('nota_empresa'):
             company_info_extractor = CompanyInfoExtractor(soup)
             company_data = company_info_extractor.extract()
-            
+        
+        with ETAPA_DURACAO.cronometrar('nota_pagamento'):
             payment_info_extractor = PaymentInfoExtractor(soup)
             payment_data = payment_info_extractor.extract()
-            
+        
+        with ETAPA_DURACAO.cronometrar('nota_itens'):
             items_info_extractor = ItemsInfoExtractor(soup)
             items_data = items_info_extractor.extract()
 
-            combined_data = {
-                "Empresa": company_data,
-                "Itens": items_data,
-                "Informações de Pagamento": payment_data
-            }
-            return combined_data
-        else:
-            print("Não foi possível obter o conteúdo da página.")
+        combined_data = {
+            "Empresa": company_data,
+            "Itens": items_data,
+            "Informações de Pagamento": payment_data
+        }
+        return combined_data
+
+    def parse_stream(self, content):
+        """ Como parse, mas devolve (nota, itens): itens é um gerador dos ItemRecord (parse e extract
+            continuam devolvendo os itens como dicts) e "Itens" fica vazio na nota.
+
+            Os itens são lidos conforme o gerador é consumido. Com o engine 'rapido' a nota é
+            preenchida durante a leitura: o nome da empresa antes do primeiro item e o restante da
+            empresa e o pagamento quando o gerador termina.
+        """
+        inicio = time.perf_counter()
+        if self.engine == 'rapido':
+            from services.nota_fiscal_rapida import FastNotaParser
+            nota, itens = FastNotaParser().parse_stream(content)
+            return nota, _cronometrar_itens(itens, time.perf_counter() - inicio)
+
+        with ETAPA_DURACAO.cronometrar('nota_html'):
+            soup = BeautifulSoup(content, 'html.parser')
+
+        with ETAPA_DURACAO.cronometrar('nota_empresa'):
+            company_data = CompanyInfoExtractor(soup).extract()
+
+        with ETAPA_DURACAO.cronometrar('nota_pagamento'):
+            payment_data = PaymentInfoExtractor(soup).extract()
+
+        nota = {
+            "Empresa": company_data,
+            "Itens": [],
+            "Informações de Pagamento": payment_data
+        }
+        itens = ItemsInfoExtractor(soup).iter_items()
+        return nota, _cronometrar_itens(itens, time.perf_counter() - inicio, 'nota_itens')
+
+    def download(self):
+        """ Conteúdo da página da nota, ou None se o portal não respondeu com 200.
+        """
+        with ETAPA_DURACAO.cronometrar('nota_download'):
+            response_getter = ResponseGetter(self.url)
+            response = response_getter.get_response()
+        if response:
+            return response.content
+        print("Não foi possível obter o conteúdo da página.")
+
+    async def download_async(self):
+        with ETAPA_DURACAO.cronometrar('nota_download'):
+            response_getter = ResponseGetter(self.url)
+            response = await response_getter.get_response_async()
+        if response:
+            return response.content
+        print("Não foi possível obter o conteúdo da página.")
+
+    def extract(self):
+        content = self.download()
+        if content is not None:
+            return self.parse(content)
+
+    async def extract_async(self):
+        content = await self.download_async()
+        if content is not None:
+            # O parse usa só CPU: roda em uma thread para não travar o event loop.
+            return await asyncio.to_thread(self.parse, content)
@@ -0,0 +1,276 @@
+from html.parser import HTMLParser
+import os
+
+from bs4.dammit import UnicodeDammit
+
+from services.nota_fiscal_eletronica import build_company_data, build_company_name
+from services.nota_itens import ItemRecord, parse_item
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# O html.parser tokeniza como o BeautifulSoup do engine 'padrao', inclusive em páginas malformadas;
+# o lxml (opcional) é mais rápido, mas fecha sozinho as tags deixadas abertas, como os navegadores.
+PARSER = 'lxml' if os.getenv('NOTA_EXTRACTOR_PARSER', 'html.parser') == 'lxml' and etree is not None else 'html.parser'
+
+VOID_TAGS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                       'link', 'meta', 'param', 'source', 'track', 'wbr'])
+IGNORED_TAGS = frozenset(['script', 'style', 'template'])
+# Caracteres entregues ao parser por vez em iter_items.
+BLOCO_ITENS = 64 * 1024
+
+
+def _text(partes):
+    """ Equivalente ao get_text(strip=True) do BeautifulSoup.
+    """
+    return "".join(parte.strip() for parte in partes if parte.strip())
+
+
+class _NotaCollector:
+    """ Recebe os eventos do parser e guarda só o texto dos blocos usados na nota.
+
+        Reproduz as buscas dos extractors de nota_fiscal_eletronica.py (find, find_next e
+        find_all_next seguem a ordem do documento), mas sem montar a árvore: cada bloco
+        relevante aberto vira uma captura que acumula o texto até o bloco ser fechado. Cada
+        linha de item vira um ItemRecord assim que a linha é fechada, liberando os buffers.
+    """
+    def __init__(self, so_itens=False):
+        self.so_itens = so_itens
+        self.pilha = []
+        self.abertos = []
+        self.texto = []
+        self.ignorar = 0
+
+        self.empresa = None
+        self.nome_empresa = None
+        self.textos_div = []
+
+        self.forma_vista = False
+        self.em_forma = False
+        self.txtmax2_visto = False
+        self.label_forma = None
+        self.total_visto = False
+        self.em_total = False
+        self.valor = None
+
+        self.itens = []
+
+    def _abrir(self, tipo, dado=None):
+        self.abertos.append((len(self.pilha), tipo, dado))
+        return dado
+
+    def _flush(self):
+        if self.texto:
+            texto = "".join(self.texto)
+            self.texto = []
+            for _, tipo, buffer in self.abertos:
+                if tipo == 'texto':
+                    buffer.append(texto)
+
+    def start(self, tag, attrs):
+        self._flush()
+        self.pilha.append(tag)
+
+        if tag in IGNORED_TAGS:
+            self.ignorar += 1
+            self._abrir('ignorar')
+        elif tag == 'div':
+            id_ = attrs.get('id')
+            classes = (attrs.get('class') or '').split()
+            if id_ == 'u20' and self.empresa is None:
+                self.empresa = self._abrir('texto', [])
+            elif self.empresa is not None and 'text' in classes:
+                self.textos_div.append(self._abrir('texto', []))
+            if id_ == 'linhaForma' and not self.forma_vista:
+                self.forma_vista = self.em_forma = True
+                self._abrir('linhaForma')
+            elif id_ == 'linhaTotal' and self.forma_vista and not self.total_visto:
+                self.total_visto = self.em_total = True
+                self._abrir('linhaTotal')
+        elif tag == 'label':
+            if self.txtmax2_visto:
+                if self.label_forma is None:
+                    self.label_forma = self._abrir('texto', [])
+            elif self.em_forma and 'txtMax2' in (attrs.get('class') or '').split():
+                self.txtmax2_visto = True
+        elif tag == 'span':
+            if self.em_total and self.valor is None and 'totalNumb' in (attrs.get('class') or '').split():
+                self.valor = self._abrir('texto', [])
+        elif tag == 'tr':
+            if (attrs.get('id') or '').startswith('Item'):
+                self.itens.append(self._abrir('item', []))
+        elif tag == 'td':
+            colunas = [dado for _, tipo, dado in self.abertos if tipo == 'item' and len(dado) < 2]
+            if colunas:
+                buffer = self._abrir('texto', [])
+                for coluna in colunas:
+                    coluna.append(buffer)
+
+    def end(self, tag):
+        self._flush()
+        if tag not in self.pilha:
+            return
+        while self.pilha.pop() != tag:
+            pass
+
+        profundidade = len(self.pilha)
+        while self.abertos and self.abertos[-1][0] > profundidade:
+            _, tipo, dado = self.abertos.pop()
+            if tipo == 'item':
+                self._registrar_item(dado)
+            elif tipo == 'texto' and dado is self.empresa:
+                self.nome_empresa = build_company_name(_text(dado))
+            elif tipo == 'linhaForma':
+                self.em_forma = False
+            elif tipo == 'linhaTotal':
+                self.em_total = False
+            elif tipo == 'ignorar':
+                self.ignorar -= 1
+
+    def _registrar_item(self, colunas):
+        if len(colunas) < 2:
+            return
+        for indice in range(len(self.itens) - 1, -1, -1):
+            if self.itens[indice] is colunas:
+                self.itens[indice] = parse_item(_text(colunas[0]), _text(colunas[1]))
+                return
+
+    def fechar_itens(self):
+        """ Converte as linhas que ficaram abertas no fim do documento e devolve os registros.
+        """
+        self._flush()
+        self.itens = [item if isinstance(item, ItemRecord) else parse_item(_text(item[0]), _text(item[1]))
+                      for item in self.itens]
+        return self.itens
+
+    def data(self, data):
+        if not self.ignorar:
+            self.texto.append(data)
+
+    def close(self):
+        items_data = self.fechar_itens()
+        if self.so_itens:
+            return items_data
+
+        company_data = {}
+        if self.empresa is not None:
+            if not self.textos_div:
+                raise AttributeError("CNPJ da empresa não encontrado.")
+            company_data = build_company_data(_text(self.empresa), _text(self.textos_div[0]),
+                                              [_text(buffer) for buffer in self.textos_div[1:]])
+
+        payment_data = {}
+        if self.forma_vista:
+            if self.label_forma is None or self.valor is None:
+                raise AttributeError("Informações de pagamento incompletas.")
+            payment_data["Forma de pagamento"] = _text(self.label_forma)
+            payment_data["Valor total pago"] = _text(self.valor)
+
+        return {
+            "Empresa": company_data,
+            "Itens": items_data,
+            "Informações de Pagamento": payment_data
+        }
+
+
+class _HTMLParserAdapter(HTMLParser):
+    def __init__(self, collector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag, dict(attrs))
+        if tag in VOID_TAGS:
+            self.collector.end(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.collector.start(tag, dict(attrs))
+        self.collector.end(tag)
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+
+class FastNotaParser:
+    """ Extrai a nota em uma única passada, sem montar a árvore do BeautifulSoup.
+
+        Usa o html.parser da biblioteca padrão ou, com NOTA_EXTRACTOR_PARSER=lxml e o pacote
+        instalado, o parser do lxml. O retorno é o mesmo dict de NotaFiscalExtractor com engine
+        'padrao'; com o lxml, só enquanto a página for bem formada (veja PARSER).
+    """
+    def __init__(self, parser=None):
+        self.parser = parser or PARSER
+
+    def _iniciar(self, collector):
+        if self.parser == 'lxml':
+            return etree.HTMLParser(target=collector)
+        return _HTMLParserAdapter(collector)
+
+    @staticmethod
+    def _fechar(parser, collector):
+        if isinstance(parser, _HTMLParserAdapter):
+            parser.close()
+            return collector.close()
+        return parser.close()
+
+    def parse(self, content):
+        if isinstance(content, bytes):
+            content = UnicodeDammit(content, is_html=True).unicode_markup
+
+        collector = _NotaCollector()
+        parser = self._iniciar(collector)
+        parser.feed(content)
+        nota = self._fechar(parser, collector)
+        nota["Itens"] = [item.json() for item in nota["Itens"]]
+        return nota
+
+    def iter_items(self, content, bloco=BLOCO_ITENS):
+        """ Os ItemRecord da nota, entregues conforme as linhas são lidas.
+
+            O documento passa pelo parser em blocos de `bloco` caracteres e cada item sai assim
+            que a linha dele é fechada, sem esperar o fim da página nem montar o dict da nota; o
+            parser não guarda os itens já entregues.
+        """
+        return self._ler_em_blocos(content, bloco)
+
+    def parse_stream(self, content, bloco=BLOCO_ITENS):
+        """ Como parse, mas devolve (nota, itens), com os itens entregues como em iter_items.
+
+            "Itens" fica vazio na nota. O nome da empresa é gravado nela antes do primeiro item
+            (os itens lidos antes dele esperam) e o restante da empresa e o pagamento quando o
+            gerador termina, com os mesmos erros de parse.
+        """
+        nota = {"Empresa": {}, "Itens": [], "Informações de Pagamento": {}}
+        return nota, self._ler_em_blocos(content, bloco, nota)
+
+    def _ler_em_blocos(self, content, bloco, nota=None):
+        if isinstance(content, bytes):
+            content = UnicodeDammit(content, is_html=True).unicode_markup
+
+        collector = _NotaCollector(so_itens=nota is None)
+        parser = self._iniciar(collector)
+        for inicio in range(0, len(content), bloco):
+            parser.feed(content[inicio:inicio + bloco])
+            if nota is not None:
+                if collector.nome_empresa is None:
+                    continue
+                nota["Empresa"]["Nome da Empresa"] = collector.nome_empresa
+            prontos = 0
+            for item in collector.itens:
+                if not isinstance(item, ItemRecord):
+                    break
+                prontos += 1
+            yield from collector.itens[:prontos]
+            del collector.itens[:prontos]
+
+        resultado = self._fechar(parser, collector)
+        if nota is not None:
+            nota["Empresa"].update(resultado["Empresa"])
+            nota["Informações de Pagamento"].update(resultado["Informações de Pagamento"])
+            resultado = resultado["Itens"]
+        yield from resultado
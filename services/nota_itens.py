@@ -0,0 +1,45 @@
+import re
+from typing import NamedTuple
+
+# Coluna do produto com get_text(strip=True): "NOME(Código: 123 )Qtde.:2UN:UNVl. Unit.:4,99". O código
+# é opcional e o valor unitário termina no próximo rótulo ("Vl. Total" ou "Texto:") que vier na linha.
+_PRODUTO = re.compile(r'([^(]*?)(?:\(.*?)?Qtde\.:(.*?)UN:(.*?)Vl\. Unit\.:(.*?)(?=Vl\. Total|[^\W\d_][^:]*:|$)', re.S)
+
+
+class ItemRecord(NamedTuple):
+    """ Linha de item da nota, com os textos como aparecem na página.
+
+        Uma tupla em vez de um dict por linha: as notas de atacado chegam a milhares de itens e
+        ficam inteiras no NotaCache. No disco (json) a linha vira uma lista, lida de volta por
+        carregar, que também aceita o dict das notas gravadas antes dos registros.
+    """
+    produto: str
+    qtde: str
+    un: str
+    vl_unit: str
+    vl_total: str
+
+    @classmethod
+    def carregar(cls, item):
+        if isinstance(item, dict):
+            return cls(item["Produto"], item["Qtde"], item["UN"], item["Vl. Unit."], item["Vl. Total"])
+        return cls._make(item)
+
+    def json(self):
+        return {
+            "Produto": self.produto,
+            "Qtde": self.qtde,
+            "UN": self.un,
+            "Vl. Unit.": self.vl_unit,
+            "Vl. Total": self.vl_total
+        }
+
+
+def parse_item(product_info, total_value):
+    """ ItemRecord a partir do texto das duas colunas da linha, lido de uma vez pela regex.
+    """
+    encontrado = _PRODUTO.match(product_info)
+    if encontrado is None:
+        raise ValueError(f"Linha de item fora do formato esperado: {product_info!r}")
+    produto, qtde, un, vl_unit = encontrado.groups()
+    return ItemRecord(produto.strip(), qtde, un, vl_unit, total_value.replace("Vl. Total", ""))
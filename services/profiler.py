@@ -0,0 +1,189 @@
+from collections import Counter, deque
+import cProfile
+from datetime import datetime
+import hmac
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+
+PROFILER_TOKEN = os.getenv('PROFILER_TOKEN')
+PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 0))
+PROFILER_MODO = os.getenv('PROFILER_MODO', 'cprofile')
+PROFILER_INTERVALO = float(os.getenv('PROFILER_INTERVALO', 0.005))
+PROFILER_MAX = int(os.getenv('PROFILER_MAX', 50))
+PROFILER_LINHAS = int(os.getenv('PROFILER_LINHAS', 40))
+PROFILER_HEADER = 'X-Profile-Token'
+
+
+def _funcao(arquivo, linha, nome):
+    return f"{nome} ({os.path.basename(arquivo)}:{linha})" if linha else nome
+
+
+class _Deterministico:
+    """ cProfile na thread da requisição: conta todas as chamadas e o tempo de cada função.
+    """
+    modo = 'cprofile'
+    # Só um cProfile pode estar ativo por vez (no Python 3.12+ ele é global ao interpretador).
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.perfil = cProfile.Profile()
+
+    def iniciar(self):
+        if not self._lock.acquire(blocking=False):
+            return False
+        self.perfil.enable()
+        return True
+
+    def parar(self, limite):
+        self.perfil.disable()
+        self._lock.release()
+        estatisticas = pstats.Stats(self.perfil).stats
+        ordenadas = sorted(estatisticas.items(), key=lambda item: item[1][3], reverse=True)[:limite]
+        return {'funcoes': [{
+            'funcao': _funcao(*chave),
+            'chamadas': chamadas,
+            'tempo_proprio_ms': round(proprio * 1000, 3),
+            'tempo_acumulado_ms': round(acumulado * 1000, 3)
+        } for chave, (_, chamadas, proprio, acumulado, _) in ordenadas]}
+
+
+class _Amostragem:
+    """ Perfil estatístico: uma thread lê a pilha da requisição a cada intervalo segundos.
+
+        Custa bem menos que o cProfile em requisições com muitas chamadas curtas e pode rodar
+        em várias requisições ao mesmo tempo; o resultado são as pilhas mais frequentes.
+    """
+    modo = 'amostragem'
+
+    def __init__(self, intervalo=PROFILER_INTERVALO):
+        self.intervalo = intervalo
+        self.alvo = threading.get_ident()
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, name='profiler', daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+        return True
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.alvo)
+            pilha = []
+            while frame is not None:
+                codigo = frame.f_code
+                pilha.append(_funcao(codigo.co_filename, codigo.co_firstlineno, codigo.co_name))
+                frame = frame.f_back
+            if pilha:
+                self.pilhas[';'.join(reversed(pilha))] += 1
+
+    def parar(self, limite):
+        self._parar.set()
+        self._thread.join()
+        total = sum(self.pilhas.values())
+        return {'amostras': total, 'pilhas': [{
+            'pilha': pilha,
+            'amostras': amostras,
+            'percentual': round(amostras / total * 100, 2)
+        } for pilha, amostras in self.pilhas.most_common(limite)]}
+
+
+class RequestProfiler:
+    """ Perfila requisições isoladas e guarda os PROFILER_MAX perfis mais recentes.
+
+        Uma requisição é perfilada quando traz o header X-Profile-Token igual a PROFILER_TOKEN
+        ou quando é sorteada pela taxa PROFILER_SAMPLE_RATE. Sem nenhum dos dois configurado os
+        hooks nem são registrados no app. Só a thread da requisição é perfilada: o trabalho
+        entregue a pools de threads (registro dos itens da nota, por exemplo) aparece como espera.
+    """
+    def __init__(self, token=PROFILER_TOKEN, taxa=PROFILER_SAMPLE_RATE, modo=PROFILER_MODO,
+                 max_perfis=PROFILER_MAX, linhas=PROFILER_LINHAS):
+        self.token = token
+        self.taxa = taxa
+        self.modo = modo
+        self.linhas = linhas
+        self.perfis = deque(maxlen=max_perfis)
+        self._lock = threading.Lock()
+        self.ignorados = 0
+
+    @property
+    def habilitado(self):
+        return bool(self.token) or self.taxa > 0
+
+    def init_app(self, app):
+        if not self.habilitado:
+            return
+
+        from flask import g, request
+
+        @app.before_request
+        def _iniciar_perfil():
+            # A consulta dos perfis também leva o header; perfilá-la só empurraria os outros para fora.
+            if request.path.startswith('/perfis'):
+                return
+            motivo = self._motivo(request.headers.get(PROFILER_HEADER))
+            if motivo is None:
+                return
+            perfilador = _Amostragem() if self.modo == 'amostragem' else _Deterministico()
+            if not perfilador.iniciar():
+                self.ignorados += 1
+                return
+            g.perfil = (perfilador, motivo, time.perf_counter())
+
+        @app.after_request
+        def _registrar_status_perfil(response):
+            if 'perfil' in g:
+                g.perfil_status = response.status_code
+            return response
+
+        @app.teardown_request
+        def _concluir_perfil(exc):
+            perfil = g.pop('perfil', None)
+            if perfil is not None:
+                self._salvar(*perfil, request.method, request.full_path.rstrip('?'), g.pop('perfil_status', 500))
+
+    def autorizado(self, token):
+        """ O token do header confere com PROFILER_TOKEN. Sem PROFILER_TOKEN ninguém consulta os perfis.
+        """
+        return bool(token and self.token and hmac.compare_digest(token, self.token))
+
+    def _motivo(self, token):
+        if self.autorizado(token):
+            return 'header'
+        if self.taxa > 0 and random.random() < self.taxa:
+            return 'amostragem'
+        return None
+
+    def _salvar(self, perfilador, motivo, inicio, metodo, caminho, status):
+        duracao = time.perf_counter() - inicio
+        perfil = {
+            'id': uuid.uuid4().hex,
+            'data': datetime.now().isoformat(),
+            'metodo': metodo,
+            'caminho': caminho,
+            'status': status,
+            'duracao_ms': round(duracao * 1000, 3),
+            'modo': perfilador.modo,
+            'motivo': motivo,
+            **perfilador.parar(self.linhas)
+        }
+        with self._lock:
+            self.perfis.append(perfil)
+
+    def listar(self):
+        with self._lock:
+            perfis = list(self.perfis)
+        return [{chave: perfil[chave] for chave in ('id', 'data', 'metodo', 'caminho', 'status', 'duracao_ms',
+                                                    'modo', 'motivo')} for perfil in reversed(perfis)]
+
+    def buscar(self, id):
+        with self._lock:
+            for perfil in self.perfis:
+                if perfil['id'] == id:
+                    return perfil
+        return None
@@ -0,0 +1,148 @@
+import base64
+import binascii
+import codecs
+import json
+import os
+import re
+
+LISTAGEM_STREAMING = os.getenv('LISTAGEM_STREAMING', 'false').lower() in ('1', 'true', 'sim')
+LISTAGEM_PARTE = int(os.getenv('LISTAGEM_PARTE', 65536))
+
+_ESPACOS = re.compile(r'[\s,]*')
+_FIM_ESCALAR = frozenset(',] \t\r\n')
+
+
+class CursorInvalido(Exception):
+    pass
+
+
+def cursor_posicao(posicao):
+    return base64.urlsafe_b64encode(json.dumps(['posicao', posicao]).encode()).decode().rstrip('=')
+
+
+def ler_cursor_posicao(cursor):
+    try:
+        tipo, posicao = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, TypeError):
+        raise CursorInvalido()
+    if tipo != 'posicao' or not isinstance(posicao, int) or posicao < 0:
+        raise CursorInvalido()
+    return posicao
+
+
+class DivisorJSON:
+    """ Separa os itens da lista `chave` de um JSON {"chave": [...]} que chega em partes.
+
+        Cada item sai como o trecho de texto original, sem ser montado de novo: o raw_decode só
+        serve para achar onde o item termina. Em memória fica apenas a parte ainda não dividida,
+        então o consumo não depende do tamanho da listagem.
+    """
+    def __init__(self, chave):
+        self._inicio = re.compile(r'"%s"\s*:\s*\[' % re.escape(chave))
+        self._decoder = json.JSONDecoder()
+        self._texto = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self.na_lista = False
+        self.concluida = False
+
+    def alimentar(self, parte):
+        if self.concluida:
+            return []
+        self._buffer += self._texto.decode(parte)
+        if not self.na_lista:
+            encontrado = self._inicio.search(self._buffer)
+            if encontrado is None:
+                return []
+            self._buffer = self._buffer[encontrado.end():]
+            self.na_lista = True
+
+        buffer = self._buffer
+        itens = []
+        posicao = 0
+        while True:
+            posicao = _ESPACOS.match(buffer, posicao).end()
+            if posicao >= len(buffer):
+                break
+            if buffer[posicao] == ']':
+                self.concluida = True
+                break
+            try:
+                _, fim = self._decoder.raw_decode(buffer, posicao)
+            except json.JSONDecodeError:
+                break
+            if buffer[posicao] not in '{["' and (fim == len(buffer) or buffer[fim] not in _FIM_ESCALAR):
+                # Um número ou literal cortado no fim da parte ("4500." de "4500.0") continua na próxima.
+                break
+            itens.append(buffer[posicao:fim])
+            posicao = fim
+        self._buffer = buffer[posicao:]
+        return itens
+
+    def concluir(self):
+        if not self.concluida:
+            raise ValueError("Listagem do upstream incompleta ou sem a lista esperada.")
+
+
+def repassar(response, tamanho=LISTAGEM_PARTE):
+    """ Corpo do upstream repassado em partes, sem decodificar o JSON.
+    """
+    try:
+        yield from response.iter_content(tamanho)
+    finally:
+        response.close()
+
+
+def lotes(response, chave, tamanho=LISTAGEM_PARTE):
+    """ Itens da listagem, em lotes de uma parte do corpo do upstream por vez.
+    """
+    divisor = DivisorJSON(chave)
+    try:
+        for parte in response.iter_content(tamanho):
+            itens = divisor.alimentar(parte)
+            if itens:
+                yield itens
+        divisor.concluir()
+    finally:
+        response.close()
+
+
+def gerar_ndjson(lotes_itens):
+    try:
+        for itens in lotes_itens:
+            # Dentro de strings JSON a quebra de linha é sempre escapada; as que aparecem aqui são
+            # só a indentação de um upstream que formata a resposta.
+            yield ''.join(item.replace('\n', '') + '\n' if '\n' in item else item + '\n' for item in itens).encode()
+    finally:
+        lotes_itens.close()
+
+
+def gerar_pagina(lotes_itens, chave, inicio, limite):
+    """ Página {"chave": [...], "proximo": cursor} com os itens de inicio a inicio + limite.
+
+        A leitura do upstream é interrompida assim que a página e o item seguinte chegam.
+    """
+    try:
+        yield f'{{"{chave}": ['.encode()
+        posicao = 0
+        emitidos = 0
+        proximo = None
+        for itens in lotes_itens:
+            if posicao + len(itens) <= inicio:
+                posicao += len(itens)
+                continue
+            pagina = []
+            for item in itens:
+                if posicao >= inicio:
+                    if emitidos + len(pagina) == limite:
+                        proximo = cursor_posicao(posicao)
+                        break
+                    pagina.append(item)
+                posicao += 1
+            if pagina:
+                yield ((',' if emitidos else '') + ','.join(pagina)).encode()
+                emitidos += len(pagina)
+            if proximo is not None:
+                break
+        yield f'], "proximo": {json.dumps(proximo)}}}'.encode()
+    finally:
+        lotes_itens.close()
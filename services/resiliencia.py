@@ -0,0 +1,177 @@
+from contextvars import ContextVar
+import os
+import threading
+import time
+
+from services import metricas
+
+RESILIENCIA_PRAZO = 30.0
+RESILIENCIA_HEDGE = 0.0
+
+_politica = ContextVar('resiliencia', default=None)
+
+
+def _config_rota(endpoint, chave, padrao):
+    """ Lê RESILIENCIA_<ENDPOINT>_<CHAVE>, caindo para RESILIENCIA_<CHAVE> e depois para o padrão.
+    """
+    valor = os.getenv(f'RESILIENCIA_{endpoint.upper()}_{chave}', os.getenv(f'RESILIENCIA_{chave}'))
+    if valor is None or valor == '':
+        return padrao
+    return float(valor)
+
+
+class UpstreamIndisponivel(Exception):
+    """ Chamada a um upstream recusada pelo gateway antes de sair (circuito aberto ou prazo esgotado).
+    """
+    status = 503
+
+    def __init__(self, upstream, mensagem, retry_after=None):
+        super().__init__(mensagem)
+        self.upstream = upstream
+        self.mensagem = mensagem
+        self.retry_after = retry_after
+
+
+class CircuitoAberto(UpstreamIndisponivel):
+    def __init__(self, upstream, retry_after):
+        super().__init__(upstream, f"Serviço '{upstream}' indisponível no momento. Tente novamente em instantes.",
+                         retry_after)
+
+
+class PrazoEsgotado(UpstreamIndisponivel):
+    status = 504
+
+    def __init__(self, upstream):
+        super().__init__(upstream, f"Tempo limite da requisição esgotado aguardando o serviço '{upstream}'.")
+
+
+class Politica:
+    """ Prazo e hedge da requisição em andamento, por rota (endpoint do Flask).
+    """
+    def __init__(self, prazo, hedge):
+        self.prazo_ate = time.monotonic() + prazo if prazo > 0 else None
+        self.hedge = hedge
+
+
+def iniciar(endpoint):
+    endpoint = endpoint or 'nao_encontrada'
+    return _politica.set(Politica(_config_rota(endpoint, 'PRAZO', RESILIENCIA_PRAZO),
+                                  _config_rota(endpoint, 'HEDGE', RESILIENCIA_HEDGE)))
+
+
+def encerrar(token):
+    _politica.reset(token)
+
+
+def restante():
+    """ Segundos que sobram do prazo da requisição atual, ou None fora de uma requisição com prazo.
+    """
+    politica = _politica.get()
+    if politica is None or politica.prazo_ate is None:
+        return None
+    return politica.prazo_ate - time.monotonic()
+
+
+def atraso_hedge():
+    politica = _politica.get()
+    return politica.hedge if politica is not None else 0.0
+
+
+class Circuito:
+    """ Circuit breaker de um upstream (ou de um host, para clientes sem base_url).
+
+        Depois de `falhas` erros seguidos o circuito abre e as chamadas falham na hora com
+        CircuitoAberto por `abertura` segundos. Em seguida uma única chamada de teste passa:
+        se der certo o circuito fecha, se falhar abre de novo.
+    """
+    def __init__(self, upstream, host, falhas=5, abertura=30.0):
+        self.upstream = upstream
+        self.host = host
+        self.falhas = falhas
+        self.abertura = abertura
+        self.estado = 'fechado'
+        self.falhas_seguidas = 0
+        self.aberto_ate = 0.0
+        self.aberturas = 0
+        self.rejeitadas = 0
+        self._sonda = False
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        """ Devolve True quando a chamada é a de teste do circuito meio aberto; levanta CircuitoAberto se recusada.
+        """
+        if not self.falhas:
+            return False
+        with self._lock:
+            agora = time.monotonic()
+            if self.estado == 'aberto' and agora >= self.aberto_ate:
+                self.estado = 'meio_aberto'
+            if self.estado == 'fechado':
+                return False
+            if self.estado == 'meio_aberto' and not self._sonda:
+                self._sonda = True
+                return True
+            self.rejeitadas += 1
+        metricas.UPSTREAM_REJEITADAS.inc(self.upstream, 'circuito')
+        raise CircuitoAberto(self.upstream, max(1, round(self.aberto_ate - agora)))
+
+    def registrar(self, falhou, sonda=False):
+        if not self.falhas:
+            return
+        with self._lock:
+            if sonda:
+                self._sonda = False
+                if falhou:
+                    self._abrir()
+                else:
+                    self.estado = 'fechado'
+                    self.falhas_seguidas = 0
+                    metricas.UPSTREAM_CIRCUITO.dec(self.upstream, self.host)
+            elif self.estado == 'fechado':
+                self.falhas_seguidas = self.falhas_seguidas + 1 if falhou else 0
+                if self.falhas_seguidas >= self.falhas:
+                    self._abrir()
+                    metricas.UPSTREAM_CIRCUITO.inc(self.upstream, self.host)
+
+    def liberar(self, sonda):
+        """ A chamada foi cancelada sem resposta: se era a de teste, a próxima pode testar.
+        """
+        if sonda:
+            with self._lock:
+                self._sonda = False
+
+    def _abrir(self):
+        self.estado = 'aberto'
+        self.aberto_ate = time.monotonic() + self.abertura
+        self.aberturas += 1
+
+    def json(self):
+        with self._lock:
+            return {
+                'host': self.host,
+                'estado': self.estado,
+                'falhas_seguidas': self.falhas_seguidas,
+                'aberturas': self.aberturas,
+                'rejeitadas': self.rejeitadas
+            }
+
+
+def init_app(app):
+    """ Define a política da rota em cada requisição e responde 503/504 às chamadas recusadas.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _iniciar_politica():
+        g.resiliencia = iniciar(request.endpoint)
+
+    @app.teardown_request
+    def _encerrar_politica(exc):
+        token = g.pop('resiliencia', None)
+        if token is not None:
+            encerrar(token)
+
+    @app.errorhandler(UpstreamIndisponivel)
+    def _upstream_indisponivel(e):
+        headers = {'Retry-After': str(e.retry_after)} if e.retry_after else {}
+        return {'error': e.mensagem}, e.status, headers
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+import os
+import threading
+import time
+
+RESPOSTA_CACHE_TTL = float(os.getenv('RESPOSTA_CACHE_TTL', 30))
+RESPOSTA_CACHE_MAX = int(os.getenv('RESPOSTA_CACHE_MAX', 64))
+
+
+class TTLCache:
+    """ Cache de respostas com tempo de vida e limite de entradas (LRU).
+
+        As rotas que alteram os dados chamam invalidar, então uma leitura feita depois de
+        uma escrita do próprio gateway nunca recebe a listagem antiga. Uma leitura que começou
+        antes da invalidação não é guardada: salvar recebe a geracao lida antes da busca no
+        upstream e descarta o valor se houve invalidação no meio. ttl=0 desativa o cache.
+    """
+    def __init__(self, ttl=RESPOSTA_CACHE_TTL, max_itens=RESPOSTA_CACHE_MAX):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirados = 0
+        self.evicoes = 0
+        self.invalidacoes = 0
+        self.geracao = 0
+
+    def buscar(self, chave):
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.misses += 1
+                return None
+            expira_em, valor = item
+            if expira_em <= time.monotonic():
+                del self._itens[chave]
+                self.expirados += 1
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return valor
+
+    def salvar(self, chave, valor, geracao=None):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if geracao is not None and geracao != self.geracao:
+                return
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self.evicoes += 1
+
+    def invalidar(self, prefixo):
+        """ Remove todas as entradas cuja chave começa com prefixo.
+        """
+        with self._lock:
+            for chave in [chave for chave in self._itens if chave.startswith(prefixo)]:
+                del self._itens[chave]
+            self.invalidacoes += 1
+            self.geracao += 1
+
+    def json(self):
+        with self._lock:
+            return {
+                'ttl': self.ttl,
+                'max_itens': self.max_itens,
+                'itens': len(self._itens),
+                'hits': self.hits,
+                'misses': self.misses,
+                'expirados': self.expirados,
+                'evicoes': self.evicoes,
+                'invalidacoes': self.invalidacoes
+            }
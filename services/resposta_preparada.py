@@ -0,0 +1,69 @@
+import gzip
+import hashlib
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPOSTA_COMPRESSAO_MIN = int(os.getenv('RESPOSTA_COMPRESSAO_MIN', 1024))
+GZIP_NIVEL = 6
+BROTLI_QUALIDADE = 5
+
+CODIFICACOES = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _comprimir(corpo, codificacao):
+    if codificacao == 'br':
+        return brotli.compress(corpo, quality=BROTLI_QUALIDADE)
+    return gzip.compress(corpo, compresslevel=GZIP_NIVEL, mtime=0)
+
+
+class RespostaPreparada:
+    """ Corpo JSON já serializado, com ETag forte e as versões comprimidas feitas uma única vez.
+
+        Guardada no cache das listagens, atende cada requisição sem serializar nem comprimir de
+        novo: If-None-Match com a mesma ETag recebe 304 sem corpo, e clientes que aceitam br
+        (com o pacote opcional brotli) ou gzip recebem a versão comprimida quando o corpo passa
+        de `minimo` bytes. Cada codificação tem a sua ETag, como pede o HTTP para representações
+        diferentes do mesmo recurso.
+    """
+    def __init__(self, corpo, status=200, minimo=RESPOSTA_COMPRESSAO_MIN):
+        self.corpo = corpo
+        self.status = status
+        self.minimo = minimo
+        self.etag = hashlib.blake2b(corpo, digest_size=16).hexdigest()
+        self._comprimidos = {}
+        self._lock = threading.Lock()
+
+    def codificacao(self, request):
+        if len(self.corpo) < self.minimo:
+            return None
+        melhor = request.accept_encodings.best_match(CODIFICACOES)
+        return melhor if melhor and request.accept_encodings[melhor] > 0 else None
+
+    def comprimido(self, codificacao):
+        corpo = self._comprimidos.get(codificacao)
+        if corpo is None:
+            with self._lock:
+                corpo = self._comprimidos.get(codificacao)
+                if corpo is None:
+                    corpo = self._comprimidos[codificacao] = _comprimir(self.corpo, codificacao)
+        return corpo
+
+    def responder(self):
+        from flask import Response, request
+
+        codificacao = self.codificacao(request)
+        etag = f"{self.etag}-{codificacao}" if codificacao else self.etag
+        headers = {'ETag': f'"{etag}"', 'Vary': 'Accept-Encoding', 'Cache-Control': 'private, no-cache'}
+
+        if request.if_none_match.contains_weak(etag) or request.if_none_match.star_tag:
+            return Response(status=304, headers=headers)
+        if codificacao:
+            headers['Content-Encoding'] = codificacao
+            return Response(self.comprimido(codificacao), status=self.status, headers=headers,
+                            mimetype='application/json')
+        return Response(self.corpo, status=self.status, headers=headers, mimetype='application/json')
@@ -0,0 +1,225 @@
+import heapq
+import math
+import os
+import threading
+import time
+
+from sql_alchemy import DATABASE_URI
+
+REVOCACAO_BACKEND = os.getenv('REVOCACAO_BACKEND', 'memoria')
+REVOCACAO_BLOOM = os.getenv('REVOCACAO_BLOOM', 'false').lower() in ('1', 'true', 'sim')
+REVOCACAO_BLOOM_CAPACIDADE = int(os.getenv('REVOCACAO_BLOOM_CAPACIDADE', 100000))
+REVOCACAO_BLOOM_FP = float(os.getenv('REVOCACAO_BLOOM_FP', 0.001))
+REVOCACAO_SYNC = float(os.getenv('REVOCACAO_SYNC', 5))
+REVOCACAO_LIMPEZA = float(os.getenv('REVOCACAO_LIMPEZA', 300))
+REVOCACAO_TTL_PADRAO = float(os.getenv('REVOCACAO_TTL_PADRAO', 86400))
+
+_MASCARA_64 = (1 << 64) - 1
+
+
+class BloomFilter:
+    """ Conjunto aproximado: pode dar falso positivo, nunca falso negativo.
+
+        Usa hash duplo sobre o hash() do próprio str (que o Python guarda no objeto), então
+        a consulta não aloca nada além de inteiros. O hash() varia entre processos, por isso o
+        filtro é sempre local e reconstruído a partir do backend.
+    """
+    def __init__(self, capacidade, taxa_fp):
+        self.bits = max(8, int(-capacidade * math.log(taxa_fp) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / capacidade * math.log(2)))
+        self.capacidade = capacidade
+        self._dados = bytearray((self.bits + 7) // 8)
+        self.itens = 0
+
+    # O laço do hash duplo fica repetido em add e __contains__: um gerador de posições alocaria a cada consulta.
+    def add(self, valor):
+        h = hash(valor) & _MASCARA_64
+        posicao, passo, bits = h & 0xFFFFFFFF, (h >> 32) | 1, self.bits
+        dados = self._dados
+        for _ in range(self.hashes):
+            indice = posicao % bits
+            dados[indice >> 3] |= 1 << (indice & 7)
+            posicao += passo
+        self.itens += 1
+
+    def __contains__(self, valor):
+        h = hash(valor) & _MASCARA_64
+        posicao, passo, bits = h & 0xFFFFFFFF, (h >> 32) | 1, self.bits
+        dados = self._dados
+        for _ in range(self.hashes):
+            indice = posicao % bits
+            if not dados[indice >> 3] & (1 << (indice & 7)):
+                return False
+            posicao += passo
+        return True
+
+
+class MemoryBackend:
+    """ Revogações guardadas no processo, removidas quando o token expira.
+    """
+    compartilhado = False
+
+    def __init__(self):
+        self._tokens = {}
+        self._expiracoes = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        pass
+
+    def adicionar(self, jti, exp, agora):
+        with self._lock:
+            self._tokens[jti] = exp
+            heapq.heappush(self._expiracoes, (exp, jti))
+
+    def contem(self, jti, agora):
+        exp = self._tokens.get(jti)
+        return exp is not None and exp > agora
+
+    def remover_expirados(self, agora):
+        with self._lock:
+            while self._expiracoes and self._expiracoes[0][0] <= agora:
+                exp, jti = heapq.heappop(self._expiracoes)
+                if self._tokens.get(jti) == exp:
+                    del self._tokens[jti]
+
+    def ativos_desde(self, revogado_em, agora):
+        with self._lock:
+            return [jti for jti, exp in self._tokens.items() if exp > agora]
+
+
+class SQLiteBackend:
+    """ Revogações na tabela tokens_revogados do banco do gateway (sql_alchemy.banco).
+
+        Apontando DATABASE_URI para um arquivo em um volume comum, as réplicas do
+        docker-compose passam a enxergar os logouts umas das outras.
+    """
+    compartilhado = True
+
+    def __init__(self, uri=DATABASE_URI):
+        self.uri = uri
+
+    def init_app(self, app):
+        from sql_alchemy import banco
+        from model.token_revogado import TokenRevogadoModel
+
+        app.config.setdefault('SQLALCHEMY_DATABASE_URI', self.uri)
+        if 'sqlalchemy' not in app.extensions:
+            banco.init_app(app)
+        with app.app_context():
+            TokenRevogadoModel.__table__.create(banco.engine, checkfirst=True)
+
+    def adicionar(self, jti, exp, agora):
+        from model.token_revogado import TokenRevogadoModel
+        TokenRevogadoModel(jti, exp, agora).save_token()
+
+    def contem(self, jti, agora):
+        from model.token_revogado import TokenRevogadoModel
+        token = TokenRevogadoModel.find_by_jti(jti)
+        return token is not None and token.exp > agora
+
+    def remover_expirados(self, agora):
+        from model.token_revogado import TokenRevogadoModel
+        TokenRevogadoModel.delete_expirados(agora)
+
+    def ativos_desde(self, revogado_em, agora):
+        from model.token_revogado import TokenRevogadoModel
+        return [token.jti for token in TokenRevogadoModel.find_ativos_desde(revogado_em, agora)]
+
+
+class RevocationStore:
+    """ Lista de tokens revogados no logout, com expiração igual ao 'exp' do token.
+
+        Com bloom=True um BloomFilter fica na frente do backend: a maioria das consultas
+        (tokens não revogados) é respondida sem tocar no backend. Com backend compartilhado o
+        filtro é atualizado a cada REVOCACAO_SYNC segundos com os logouts das outras réplicas.
+    """
+    def __init__(self, backend, bloom=REVOCACAO_BLOOM, capacidade=REVOCACAO_BLOOM_CAPACIDADE,
+                 taxa_fp=REVOCACAO_BLOOM_FP, sync=REVOCACAO_SYNC, limpeza=REVOCACAO_LIMPEZA):
+        self.backend = backend
+        self.capacidade = capacidade
+        self.taxa_fp = taxa_fp
+        self.sync = sync
+        self.limpeza = limpeza
+        self.bloom = BloomFilter(capacidade, taxa_fp) if bloom else None
+        self._lock = threading.Lock()
+        self._ultimo_sync = 0.0
+        self._proximo_sync = 0.0
+        self._proxima_limpeza = 0.0
+        self.consultas = 0
+        self.negativos_bloom = 0
+        self.consultas_backend = 0
+        self.revogados = 0
+
+    def init_app(self, app):
+        self.backend.init_app(app)
+        if self.bloom is not None and self.backend.compartilhado:
+            with app.app_context():
+                self._sincronizar(time.time())
+
+    def add(self, jti, exp=None):
+        agora = time.time()
+        self.backend.adicionar(jti, exp or agora + REVOCACAO_TTL_PADRAO, agora)
+        self.revogados += 1
+        if self.bloom is not None:
+            with self._lock:
+                self.bloom.add(jti)
+        if agora >= self._proxima_limpeza:
+            self._limpar(agora)
+
+    def __contains__(self, jti):
+        self.consultas += 1
+        agora = time.time()
+        if self.bloom is not None:
+            if self.backend.compartilhado and agora >= self._proximo_sync:
+                self._sincronizar(agora)
+            if jti not in self.bloom:
+                self.negativos_bloom += 1
+                return False
+        self.consultas_backend += 1
+        return self.backend.contem(jti, agora)
+
+    def _sincronizar(self, agora):
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._proximo_sync = agora + self.sync
+            # Folga para logouts gravados por outra réplica com o relógio um pouco atrasado.
+            desde = self._ultimo_sync - self.sync
+            for jti in self.backend.ativos_desde(desde, agora):
+                self.bloom.add(jti)
+            self._ultimo_sync = agora
+        finally:
+            self._lock.release()
+        if agora >= self._proxima_limpeza:
+            self._limpar(agora)
+
+    def _limpar(self, agora):
+        """ Remove as revogações expiradas e reconstrói o filtro só com as ativas.
+        """
+        self._proxima_limpeza = agora + self.limpeza
+        self.backend.remover_expirados(agora)
+        if self.bloom is not None:
+            # Sob o lock: um add concorrente cai no filtro novo ou já está no backend lido aqui.
+            with self._lock:
+                bloom = BloomFilter(self.capacidade, self.taxa_fp)
+                for jti in self.backend.ativos_desde(0, agora):
+                    bloom.add(jti)
+                self.bloom = bloom
+
+    def json(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'bloom': self.bloom is not None,
+            'bloom_itens': self.bloom.itens if self.bloom is not None else 0,
+            'revogados': self.revogados,
+            'consultas': self.consultas,
+            'negativos_bloom': self.negativos_bloom,
+            'consultas_backend': self.consultas_backend
+        }
+
+
+def carregar_revogacao(backend=REVOCACAO_BACKEND):
+    if backend == 'sqlite':
+        return RevocationStore(SQLiteBackend())
+    return RevocationStore(MemoryBackend())
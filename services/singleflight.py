@@ -0,0 +1,56 @@
+import threading
+
+
+class _Chamada:
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class SingleFlight:
+    """ Agrupa chamadas idênticas e simultâneas em uma só.
+
+        A primeira chamada de uma chave executa a função; as que chegam enquanto ela está em
+        andamento esperam e recebem o mesmo resultado (ou a mesma exceção).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_voo = {}
+        self.execucoes = 0
+        self.compartilhadas = 0
+
+    def executar(self, chave, func):
+        with self._lock:
+            chamada = self._em_voo.get(chave)
+            lider = chamada is None
+            if lider:
+                chamada = self._em_voo[chave] = _Chamada()
+                self.execucoes += 1
+            else:
+                self.compartilhadas += 1
+
+        if not lider:
+            chamada.evento.wait()
+            if chamada.erro is not None:
+                raise chamada.erro
+            return chamada.resultado
+
+        try:
+            chamada.resultado = func()
+            return chamada.resultado
+        except Exception as e:
+            chamada.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._em_voo[chave]
+            chamada.evento.set()
+
+    def json(self):
+        with self._lock:
+            return {
+                'em_voo': len(self._em_voo),
+                'execucoes': self.execucoes,
+                'compartilhadas': self.compartilhadas
+            }
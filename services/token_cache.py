@@ -0,0 +1,66 @@
+from collections import OrderedDict
+import os
+import threading
+import time
+
+from services.metricas import ETAPA_DURACAO
+
+TOKEN_CACHE_MAX = int(os.getenv('TOKEN_CACHE_MAX', 1024))
+TOKEN_CACHE_MARGEM = float(os.getenv('TOKEN_CACHE_MARGEM', 300))
+
+
+class TokenCache:
+    """ Reaproveita o token emitido para os serviços internos enquanto ele estiver válido.
+
+        O token é indexado por uma chave barata de quem o pede (o jti do token do usuário, que
+        fixa a identidade) e só é emitido de novo quando faltam menos de margem segundos para
+        expirar. Guarda até max_itens chaves (LRU) e mede o tempo médio de assinatura para
+        estimar quanto tempo os reaproveitamentos economizaram.
+    """
+    def __init__(self, validade, max_itens=TOKEN_CACHE_MAX, margem=TOKEN_CACHE_MARGEM):
+        self.validade = validade
+        self.max_itens = max_itens
+        self.margem = margem
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.emissoes = 0
+        self.evicoes = 0
+        self.tempo_emissao = 0.0
+
+    def obter(self, chave, identidade, emitir):
+        agora = time.time()
+        with self._lock:
+            item = self._tokens.get(chave)
+            if item is not None and item[0] - self.margem > agora:
+                self._tokens.move_to_end(chave)
+                self.hits += 1
+                return item[1]
+
+        inicio = time.perf_counter()
+        token = emitir(identidade)
+        duracao = time.perf_counter() - inicio
+        ETAPA_DURACAO.observar(duracao, 'jwt_emissao')
+
+        with self._lock:
+            self.emissoes += 1
+            self.tempo_emissao += duracao
+            self._tokens[chave] = (agora + self.validade, token)
+            self._tokens.move_to_end(chave)
+            while len(self._tokens) > self.max_itens:
+                self._tokens.popitem(last=False)
+                self.evicoes += 1
+        return token
+
+    def json(self):
+        with self._lock:
+            media = self.tempo_emissao / self.emissoes if self.emissoes else 0.0
+            return {
+                'itens': len(self._tokens),
+                'max_itens': self.max_itens,
+                'hits': self.hits,
+                'emissoes': self.emissoes,
+                'evicoes': self.evicoes,
+                'emissao_media_ms': round(media * 1000, 3),
+                'economia_ms': round(self.hits * media * 1000, 3)
+            }
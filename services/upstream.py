@@ -0,0 +1,301 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
+import contextvars
+from http.cookiejar import DefaultCookiePolicy
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from services import metricas, resiliencia
+from services.balanceamento import Balanceador
+from services.resiliencia import Circuito, PrazoEsgotado
+
+CLIENTES = {}
+
+# Threads que executam as chamadas GET com hedge (a original e a duplicada).
+executor_hedge = ThreadPoolExecutor(max_workers=int(os.getenv('UPSTREAM_HEDGE_WORKERS', 32)),
+                                    thread_name_prefix='hedge')
+
+
+def _config(nome, chave, padrao):
+    """ Lê UPSTREAM_<NOME>_<CHAVE>, caindo para UPSTREAM_<CHAVE> e depois para o padrão.
+    """
+    valor = os.getenv(f'UPSTREAM_{nome.upper()}_{chave}', os.getenv(f'UPSTREAM_{chave}'))
+    if valor is None or valor == '':
+        return padrao
+    return type(padrao)(valor) if not isinstance(padrao, bool) else valor.lower() in ('1', 'true', 'sim')
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        self.hits = 0
+        self.novas_conexoes = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    def registrar(self, espera, reutilizada):
+        with self._lock:
+            self.requisicoes += 1
+            if reutilizada:
+                self.hits += 1
+            else:
+                self.novas_conexoes += 1
+            self.espera_total += espera
+            if espera > self.espera_max:
+                self.espera_max = espera
+
+    def json(self):
+        with self._lock:
+            media = self.espera_total / self.requisicoes if self.requisicoes else 0.0
+            return {
+                'requisicoes': self.requisicoes,
+                'hits': self.hits,
+                'novas_conexoes': self.novas_conexoes,
+                'espera_total_ms': round(self.espera_total * 1000, 3),
+                'espera_media_ms': round(media * 1000, 3),
+                'espera_max_ms': round(self.espera_max * 1000, 3)
+            }
+
+
+class _InstrumentedPoolMixin:
+    stats = None
+
+    def _get_conn(self, timeout=None):
+        inicio = time.perf_counter()
+        conn = super()._get_conn(timeout=timeout)
+        self.stats.registrar(time.perf_counter() - inicio, getattr(conn, 'sock', None) is not None)
+        return conn
+
+
+class PooledAdapter(HTTPAdapter):
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('HTTPConnectionPool', (_InstrumentedPoolMixin, HTTPConnectionPool), {'stats': self.stats}),
+            'https': type('HTTPSConnectionPool', (_InstrumentedPoolMixin, HTTPSConnectionPool), {'stats': self.stats})
+        }
+
+
+def balanceador(nome, base_url):
+    """ Balanceador das réplicas de base_url (URLs separadas por vírgula), ou None sem base_url.
+    """
+    urls = [url.strip().rstrip('/') for url in (base_url or '').split(',') if url.strip()]
+    if not urls:
+        return None
+    return Balanceador(nome, urls, politica=_config(nome, 'LB_POLITICA', 'p2c'), falhas=_config(nome, 'LB_FALHAS', 5),
+                       ejecao=_config(nome, 'LB_EJECAO', 30.0), lentidao=_config(nome, 'LB_LENTIDAO', 3.0))
+
+
+def _descartar(futuro):
+    if futuro.exception() is None:
+        futuro.result().close()
+
+
+class Chamada:
+    """ Uma chamada autorizada pelo circuito, com a réplica de destino e o prazo que restava.
+    """
+    def __init__(self, replica, url, host, circuito, sonda, restante):
+        self.replica = replica
+        self.url = url
+        self.host = host
+        self.circuito = circuito
+        self.sonda = sonda
+        self.restante = restante
+
+    def timeout(self, padrao):
+        """ (connect, read) limitados ao prazo da requisição.
+        """
+        if self.restante is None:
+            return padrao
+        return tuple(min(valor, self.restante) for valor in padrao)
+
+    def prazo_esgotado(self):
+        return self.restante is not None and resiliencia.restante() <= 0
+
+
+class UpstreamClient:
+    """ Cliente HTTP com sessão keep-alive e pool de conexões para um upstream.
+
+        Todas as rotas do gateway compartilham a mesma instância por upstream, então as
+        conexões TCP são reaproveitadas entre requisições. base_url pode listar várias réplicas
+        separadas por vírgula; cada chamada vai para a réplica escolhida pelo Balanceador.
+
+        Cada chamada respeita o prazo da rota em andamento (services/resiliencia.py) e passa
+        pelo circuit breaker do upstream; GETs de rotas com hedge configurado são duplicados
+        quando a resposta demora mais que o atraso do hedge.
+    """
+    def __init__(self, nome, base_url=None):
+        self.nome = nome
+        self.balanceador = balanceador(nome, base_url)
+        self.base_url = ','.join(replica.base_url for replica in self.balanceador.replicas) \
+            if self.balanceador else None
+        self.pool_size = _config(nome, 'POOL_SIZE', 10)
+        self.pool_hosts = _config(nome, 'POOL_HOSTS', 10)
+        self.pool_block = _config(nome, 'POOL_BLOCK', False)
+        self.timeout = (_config(nome, 'CONNECT_TIMEOUT', 5.0), _config(nome, 'READ_TIMEOUT', 30.0))
+        self.stats = PoolStats()
+        self.cb_falhas = _config(nome, 'CB_FALHAS', 5)
+        self.cb_abertura = _config(nome, 'CB_ABERTURA', 30.0)
+        self.circuitos = {}
+        self.hedge_max = _config(nome, 'HEDGE_MAX', 0.1)
+        self.hedge_chamadas = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+        adapter = PooledAdapter(self.stats, pool_connections=self.pool_hosts,
+                                pool_maxsize=self.pool_size, pool_block=self.pool_block)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # A sessão é compartilhada entre usuários: nenhum cookie do upstream pode ser reenviado.
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        CLIENTES[nome] = self
+
+    def circuito(self, host):
+        """ Circuito do upstream; clientes sem base_url (portais da SEFAZ) têm um por host.
+        """
+        chave = None if self.balanceador else host
+        circuito = self.circuitos.get(chave)
+        if circuito is None:
+            with self._lock:
+                circuito = self.circuitos.setdefault(chave, Circuito(self.nome, host or self.nome,
+                                                                     self.cb_falhas, self.cb_abertura))
+        return circuito
+
+    def preparar(self, path):
+        """ Passa pelo circuito e pelo prazo da rota e escolhe a réplica de destino.
+        """
+        absoluto = self.balanceador is None or path.startswith(('http://', 'https://'))
+        circuito = self.circuito(urlsplit(path).netloc if absoluto else None)
+        sonda = circuito.permitir()
+        restante = resiliencia.restante()
+        if restante is not None and restante <= 0:
+            circuito.liberar(sonda)
+            metricas.UPSTREAM_REJEITADAS.inc(self.nome, 'prazo')
+            raise PrazoEsgotado(self.nome)
+
+        if absoluto:
+            return Chamada(None, path, urlsplit(path).netloc, circuito, sonda, restante)
+        replica = self.balanceador.escolher()
+        return Chamada(replica, f"{replica.base_url}{path}", replica.host, circuito, sonda, restante)
+
+    def concluir(self, chamada, method, status, duracao):
+        """ Registra as métricas da chamada e devolve o resultado ao balanceador e ao circuito.
+
+            status é o código HTTP, 'erro' (exceção) ou 'cancelada' (a requisição do cliente foi
+            abandonada no modo ASGI, o que não diz nada sobre a saúde do upstream).
+        """
+        metricas.UPSTREAM_EM_ANDAMENTO.dec(self.nome)
+        metricas.UPSTREAM_DURACAO.observar(duracao, self.nome, chamada.host, method, str(status))
+        erro_http = isinstance(status, int) and status >= 500
+        if erro_http:
+            metricas.UPSTREAM_ERROS.inc(self.nome, chamada.host, str(status))
+        if status == 'cancelada':
+            chamada.circuito.liberar(chamada.sonda)
+            if chamada.replica is not None:
+                self.balanceador.liberar(chamada.replica, duracao)
+            return
+        falhou = status == 'erro' or erro_http
+        chamada.circuito.registrar(falhou, chamada.sonda)
+        if chamada.replica is not None:
+            self.balanceador.concluir(chamada.replica, duracao, falhou)
+
+    def permitir_hedge(self):
+        """ Limita as chamadas duplicadas a UPSTREAM_HEDGE_MAX (padrão 10%) das chamadas com hedge.
+        """
+        with self._lock:
+            self.hedge_chamadas += 1
+            if self.hedges >= self.hedge_max * self.hedge_chamadas:
+                return False
+            self.hedges += 1
+            return True
+
+    def request(self, method, path, **kwargs):
+        atraso = resiliencia.atraso_hedge() if method == 'GET' else 0.0
+        if atraso > 0:
+            return self._request_hedge(atraso, method, path, **kwargs)
+        return self._request(method, path, **kwargs)
+
+    def _request(self, method, path, **kwargs):
+        chamada = self.preparar(path)
+        kwargs['timeout'] = chamada.timeout(kwargs.get('timeout', self.timeout))
+        status = 'erro'
+        metricas.UPSTREAM_EM_ANDAMENTO.inc(self.nome)
+        inicio = time.perf_counter()
+        try:
+            response = self.session.request(method, chamada.url, **kwargs)
+            status = response.status_code
+            return response
+        except requests.Timeout as e:
+            metricas.UPSTREAM_ERROS.inc(self.nome, chamada.host, type(e).__name__)
+            if chamada.prazo_esgotado():
+                raise PrazoEsgotado(self.nome) from e
+            raise
+        except Exception as e:
+            metricas.UPSTREAM_ERROS.inc(self.nome, chamada.host, type(e).__name__)
+            raise
+        finally:
+            self.concluir(chamada, method, status, time.perf_counter() - inicio)
+
+    def _request_hedge(self, atraso, method, path, **kwargs):
+        """ Se a resposta não chega em atraso segundos, dispara a mesma chamada de novo (em geral
+            para outra réplica) e fica com a primeira resposta sem erro; a outra é descartada.
+        """
+        original = executor_hedge.submit(contextvars.copy_context().run, self._request, method, path, **kwargs)
+        try:
+            return original.result(timeout=atraso)
+        except FuturesTimeout:
+            pass
+        if not self.permitir_hedge():
+            return original.result()
+
+        duplicada = executor_hedge.submit(contextvars.copy_context().run, self._request, method, path, **kwargs)
+        vencedora = original
+        for futuro in as_completed((original, duplicada)):
+            if futuro.exception() is None and futuro.result().status_code < 500:
+                vencedora = futuro
+                break
+        perdedora = duplicada if vencedora is original else original
+        perdedora.add_done_callback(_descartar)
+        metricas.UPSTREAM_HEDGES.inc(self.nome, 'original' if vencedora is original else 'duplicada')
+        return vencedora.result()
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+    def json(self):
+        return {
+            'nome': self.nome,
+            'base_url': self.base_url,
+            'pool_size': self.pool_size,
+            'connect_timeout': self.timeout[0],
+            'read_timeout': self.timeout[1],
+            **self.stats.json(),
+            'replicas': self.balanceador.json() if self.balanceador else [],
+            'circuitos': [circuito.json() for circuito in list(self.circuitos.values())],
+            'hedges': self.hedges
+        }
+
+
+def estatisticas():
+    return [cliente.json() for cliente in CLIENTES.values()]
@@ -0,0 +1,151 @@
+import asyncio
+from http.cookiejar import DefaultCookiePolicy
+import itertools
+import math
+import time
+
+import httpx
+
+from services import metricas, resiliencia
+from services.resiliencia import PrazoEsgotado
+from services.upstream import _config
+
+
+class AsyncUpstreamClient:
+    """ Versão assíncrona (httpx) de um UpstreamClient, usada pelo modo ASGI (asgi.py).
+
+        Herda nome, réplicas (o mesmo Balanceador) e timeouts do cliente síncrono e registra as
+        mesmas métricas. Como uma conexão parada não ocupa thread, o pool é bem maior:
+        UPSTREAM_ASYNC_POOL_SIZE (padrão 1000) conexões simultâneas por upstream.
+
+        O pool do httpcore percorre todas as conexões a cada requisição que entra ou sai, o que
+        com milhares de chamadas em andamento trava o event loop por segundos. Por isso o pool é
+        dividido em UPSTREAM_ASYNC_SHARDS clientes menores, usados em rodízio.
+    """
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.nome = cliente.nome
+        self.pool_size = _config(self.nome, 'ASYNC_POOL_SIZE', 1000)
+        self.shards = max(1, _config(self.nome, 'ASYNC_SHARDS', 16))
+        keepalive = _config(self.nome, 'ASYNC_KEEPALIVE', 100)
+        limites = httpx.Limits(max_connections=math.ceil(self.pool_size / self.shards),
+                               max_keepalive_connections=math.ceil(keepalive / self.shards))
+        timeout = httpx.Timeout(cliente.timeout[1], connect=cliente.timeout[0])
+        self.clients = [httpx.AsyncClient(limits=limites, timeout=timeout) for _ in range(self.shards)]
+        for client in self.clients:
+            # Como no cliente síncrono: nenhum cookie do upstream é reenviado para outro usuário.
+            client.cookies.jar.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self._rodizio = itertools.cycle(self.clients)
+
+    async def request(self, method, path, **kwargs):
+        atraso = resiliencia.atraso_hedge() if method == 'GET' else 0.0
+        if atraso > 0:
+            return await self._request_hedge(atraso, method, path, **kwargs)
+        return await self._request(method, path, **kwargs)
+
+    async def _request(self, method, path, **kwargs):
+        chamada = self.cliente.preparar(path)
+        if chamada.restante is not None:
+            connect, read = chamada.timeout(self.cliente.timeout)
+            kwargs['timeout'] = httpx.Timeout(read, connect=connect)
+        status = 'erro'
+        metricas.UPSTREAM_EM_ANDAMENTO.inc(self.nome)
+        inicio = time.perf_counter()
+        try:
+            response = await next(self._rodizio).request(method, chamada.url, **kwargs)
+            status = response.status_code
+            return response
+        except asyncio.CancelledError:
+            status = 'cancelada'
+            raise
+        except httpx.TimeoutException as e:
+            metricas.UPSTREAM_ERROS.inc(self.nome, chamada.host, type(e).__name__)
+            if chamada.prazo_esgotado():
+                raise PrazoEsgotado(self.nome) from e
+            raise
+        except Exception as e:
+            metricas.UPSTREAM_ERROS.inc(self.nome, chamada.host, type(e).__name__)
+            raise
+        finally:
+            self.cliente.concluir(chamada, method, status, time.perf_counter() - inicio)
+
+    async def _request_hedge(self, atraso, method, path, **kwargs):
+        """ Como no cliente síncrono; aqui a chamada que perde é cancelada.
+        """
+        original = asyncio.ensure_future(self._request(method, path, **kwargs))
+        pendentes = {original}
+        try:
+            await asyncio.wait(pendentes, timeout=atraso)
+            if original.done() or not self.cliente.permitir_hedge():
+                return await original
+
+            duplicada = asyncio.ensure_future(self._request(method, path, **kwargs))
+            pendentes.add(duplicada)
+            vencedora = None
+            while pendentes and vencedora is None:
+                concluidas, pendentes = await asyncio.wait(pendentes, return_when=asyncio.FIRST_COMPLETED)
+                for tarefa in concluidas:
+                    if tarefa.exception() is None and tarefa.result().status_code < 500:
+                        vencedora = tarefa
+            vencedora = vencedora or original
+            metricas.UPSTREAM_HEDGES.inc(self.nome, 'original' if vencedora is original else 'duplicada')
+            return vencedora.result()
+        finally:
+            for tarefa in pendentes:
+                tarefa.cancel()
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request('PUT', path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request('DELETE', path, **kwargs)
+
+    async def aclose(self):
+        for client in self.clients:
+            await client.aclose()
+
+
+class AsyncSingleFlight:
+    """ SingleFlight para corrotinas: quem chega com a chave em andamento aguarda a mesma Future.
+    """
+    def __init__(self):
+        self._em_voo = {}
+        self.execucoes = 0
+        self.compartilhadas = 0
+
+    async def executar(self, chave, func):
+        futuro = self._em_voo.get(chave)
+        if futuro is not None:
+            self.compartilhadas += 1
+            return await asyncio.shield(futuro)
+
+        futuro = self._em_voo[chave] = asyncio.get_running_loop().create_future()
+        self.execucoes += 1
+        try:
+            resultado = await func()
+        except asyncio.CancelledError:
+            futuro.cancel()
+            raise
+        except Exception as e:
+            futuro.set_exception(e)
+            # Marca a exceção como lida quando ninguém mais aguardava a chamada.
+            futuro.exception()
+            raise
+        else:
+            futuro.set_result(resultado)
+            return resultado
+        finally:
+            del self._em_voo[chave]
+
+    def json(self):
+        return {
+            'em_voo': len(self._em_voo),
+            'execucoes': self.execucoes,
+            'compartilhadas': self.compartilhadas
+        }
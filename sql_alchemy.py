@@ -1,4 +1,19 @@
-from flask_sqlalchemy import SQLAlchemy
+import os
+import threading
 
+DATABASE_URI = os.getenv('DATABASE_URI', 'sqlite:///gateway.db')
 
-banco = SQLAlchemy()
+_lock = threading.Lock()
+
+
+def __getattr__(nome):
+    # `banco` só é criado no primeiro acesso: sem revogação em SQLite nem espelhos, o
+    # Flask-SQLAlchemy não é carregado, mas DATABASE_URI continua disponível.
+    if nome == 'banco':
+        global banco
+        with _lock:
+            if 'banco' not in globals():
+                from flask_sqlalchemy import SQLAlchemy
+                banco = SQLAlchemy()
+        return banco
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+import sys
+import time
+
+import pytest
+from flask import Flask
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from services.espelho_usuarios import USUARIOS_ESPELHO_CREDENCIAL_TTL, EspelhoUsuarios  # noqa: E402
+from sql_alchemy import banco  # noqa: E402
+
+IDENTIDADE = {'user_id': 1, 'login': 'teste', 'nivel': 1}
+
+
+class Resposta:
+    def __init__(self, status_code, corpo):
+        self.status_code = status_code
+        self.content = json.dumps(corpo).encode()
+
+
+def senha(texto):
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+@pytest.fixture
+def espelho():
+    from model.usuario import UserModel
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', JWT_SECRET_KEY='segredo')
+    banco.init_app(app)
+    espelho = EspelhoUsuarios(None, None, ativo=True)
+    espelho._chave = hashlib.sha256(b'segredo').digest()
+    espelho.ultima_sincronizacao = time.time()
+    with app.app_context():
+        UserModel.__table__.create(banco.engine)
+        usuario = UserModel('teste', '', 'teste@x', 1, 'S')
+        usuario.user_id = 1
+        banco.session.add(usuario)
+        banco.session.commit()
+        yield espelho
+
+
+def test_senha_aceita_pelo_upstream_troca_a_credencial(espelho):
+    espelho.aprender('teste', senha('antiga'), Resposta(201, IDENTIDADE))
+    assert espelho.verificar('teste', senha('antiga')) == IDENTIDADE
+
+    # A senha foi trocada no serviço: o login com a nova vai ao upstream, que o aceita.
+    assert espelho.verificar('teste', senha('nova')) is None
+    espelho.aprender('teste', senha('nova'), Resposta(201, IDENTIDADE))
+    assert espelho.verificar('teste', senha('antiga')) is None
+    assert espelho.verificar('teste', senha('nova')) == IDENTIDADE
+
+
+def test_login_recusado_pelo_upstream_nao_troca_a_credencial(espelho):
+    espelho.aprender('teste', senha('certa'), Resposta(201, IDENTIDADE))
+    espelho.aprender('teste', senha('errada'), Resposta(401, {'message': 'senha incorreta'}))
+    assert espelho.verificar('teste', senha('certa')) == IDENTIDADE
+
+
+def test_credencial_expirada_vai_ao_upstream(espelho):
+    from model.usuario import UserModel
+
+    espelho.aprender('teste', senha('antiga'), Resposta(201, IDENTIDADE))
+    UserModel.find_by_login('teste').senha_verificada_em -= USUARIOS_ESPELHO_CREDENCIAL_TTL + 1
+    assert espelho.verificar('teste', senha('antiga')) is None
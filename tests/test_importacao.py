@@ -0,0 +1,122 @@
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from services.importacao import RegistradorProdutos  # noqa: E402
+from services.resiliencia import CircuitoAberto, PrazoEsgotado  # noqa: E402
+
+ITENS = [{'nome': 'ARROZ', 'descricao': 'MERCADO', 'preco': 10.0, 'quantidade': 1},
+         {'nome': 'FEIJAO', 'descricao': 'MERCADO', 'preco': 8.5, 'quantidade': 2}]
+
+
+class Resposta:
+    def __init__(self, status_code, corpo):
+        self.status_code = status_code
+        self.content = json.dumps(corpo).encode()
+
+
+class Cliente:
+    """ Serviço de produtos sem produtos; o POST do lote falha com `erro`.
+    """
+    def __init__(self, erro=None):
+        self.erro = erro
+        self.gets = []
+        self.posts = []
+
+    def get(self, path, **kwargs):
+        self.gets.append(path)
+        return Resposta(200, {'products': [{'product_id': 1, 'nome': 'ARROZ', 'descricao': 'MERCADO',
+                                            'preco': 5.0, 'quantidade': 1}]})
+
+    def post(self, path, json=None, **kwargs):
+        self.posts.append(path)
+        if path == '/api/lote' and self.erro is not None:
+            raise self.erro
+        return Resposta(201, {'message': 'ok'})
+
+
+class ClienteAsync(Cliente):
+    async def get(self, path, **kwargs):
+        return Cliente.get(self, path, **kwargs)
+
+    async def post(self, path, json=None, **kwargs):
+        return Cliente.post(self, path, json, **kwargs)
+
+
+def _prazo_apos(erro):
+    try:
+        raise PrazoEsgotado('produto') from erro
+    except PrazoEsgotado as e:
+        return e
+
+
+def _conexao_recusada():
+    return requests.ConnectionError(MaxRetryError(None, '/api/lote', NewConnectionError(None, 'recusada')))
+
+
+NAO_ENVIADOS = {
+    'conexao_recusada': _conexao_recusada(),
+    'connect_timeout': requests.ConnectTimeout(),
+    'circuito_aberto': CircuitoAberto('produto', 30),
+    'prazo_antes_do_envio': PrazoEsgotado('produto'),
+}
+
+TALVEZ_ENVIADOS = {
+    'read_timeout': requests.ReadTimeout(),
+    'prazo_na_leitura': _prazo_apos(requests.ReadTimeout()),
+    'conexao_caiu': requests.ConnectionError(),
+}
+
+
+@pytest.mark.parametrize('erro', NAO_ENVIADOS.values(), ids=NAO_ENVIADOS.keys())
+def test_lote_que_nao_saiu_vai_item_a_item(erro):
+    cliente = Cliente(erro)
+    resultados = RegistradorProdutos(cliente, lote_path='/api/lote').registrar([dict(i) for i in ITENS], {})
+    assert cliente.posts == ['/api/lote', '/api/registrar', '/api/registrar']
+    assert [r['status'] for r in resultados] == ['registrado', 'registrado']
+
+
+@pytest.mark.parametrize('erro', TALVEZ_ENVIADOS.values(), ids=TALVEZ_ENVIADOS.keys())
+def test_lote_talvez_aceito_nao_e_reenviado(erro):
+    cliente = Cliente(erro)
+    resultados = RegistradorProdutos(cliente, lote_path='/api/lote').registrar([dict(i) for i in ITENS], {})
+    assert cliente.posts == ['/api/lote']
+    assert resultados == [{'nome': 'ARROZ', 'status': 'erro', 'codigo': None},
+                          {'nome': 'FEIJAO', 'status': 'erro', 'codigo': None}]
+
+
+@pytest.mark.parametrize('erro, reenviado', [
+    (httpx.ConnectError('recusada'), True),
+    (httpx.ConnectTimeout('timeout'), True),
+    (CircuitoAberto('produto', 30), True),
+    (httpx.ReadTimeout('timeout'), False),
+    (_prazo_apos(httpx.ReadTimeout('timeout')), False),
+    (httpx.RemoteProtocolError('caiu'), False),
+], ids=['connect_error', 'connect_timeout', 'circuito_aberto', 'read_timeout', 'prazo_na_leitura', 'conexao_caiu'])
+def test_lote_async(erro, reenviado):
+    cliente = ClienteAsync(erro)
+    registrador = RegistradorProdutos(None, lote_path='/api/lote')
+    resultados = asyncio.run(registrador.registrar_async([dict(i) for i in ITENS], {}, cliente))
+    if reenviado:
+        assert cliente.posts == ['/api/lote', '/api/registrar', '/api/registrar']
+        assert [r['status'] for r in resultados] == ['registrado', 'registrado']
+    else:
+        assert cliente.posts == ['/api/lote']
+        assert [(r['status'], r['codigo']) for r in resultados] == [('erro', None), ('erro', None)]
+
+
+def test_sem_catalogo_os_itens_so_sao_cadastrados():
+    cliente = Cliente()
+    resultados = RegistradorProdutos(cliente, lote_path=None).registrar([dict(i) for i in ITENS], {})
+    assert cliente.gets == []
+    assert cliente.posts == ['/api/registrar', '/api/registrar']
+    assert [r['status'] for r in resultados] == ['registrado', 'registrado']
@@ -0,0 +1,44 @@
+import datetime
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from services.json_rapido import JSONRapidoProvider, orjson  # noqa: E402
+
+pytestmark = pytest.mark.skipif(orjson is None, reason="orjson não instalado")
+
+CORPOS = {
+    'produtos': {'products': [{'product_id': 1, 'nome': 'PÃO', 'preco': 4.99, 'quantidade': 2}], 'proximo': None},
+    'nan': {'preco': float('nan'), 'proximo': None},
+    'infinito': [1.5, {'total': float('inf')}, {'total': float('-inf')}],
+    'chave_int': {2: 'a', 1: None},
+    'data': {'criado_em': datetime.datetime(2024, 5, 1, 12, 30)},
+    'inteiro_grande': {'valor': 2 ** 70},
+    'del': {'texto': 'a\x7fb'},
+}
+
+
+@pytest.fixture
+def providers():
+    app = Flask(__name__)
+    rapido = JSONRapidoProvider(app)
+    rapido.rapido = True
+    padrao = JSONRapidoProvider(app)
+    padrao.rapido = False
+    return rapido, padrao
+
+
+@pytest.mark.parametrize('corpo', CORPOS.values(), ids=CORPOS.keys())
+def test_igual_ao_provider_padrao(providers, corpo):
+    rapido, padrao = providers
+    assert rapido.serializar(corpo) == padrao.serializar(corpo)
+
+
+def test_nao_finitos_como_na_biblioteca_padrao(providers):
+    rapido, _ = providers
+    assert rapido.serializar({'a': float('nan'), 'b': float('inf')}) == b'{"a":NaN,"b":Infinity}'
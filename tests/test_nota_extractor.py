@@ -0,0 +1,92 @@
+import os
+import re
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks.stubs import carregar_fixture, gerar_nota  # noqa: E402
+from services.nota_fiscal_eletronica import NotaFiscalExtractor  # noqa: E402
+from services.nota_fiscal_rapida import FastNotaParser, etree  # noqa: E402
+
+BACKENDS = ['html.parser', pytest.param('lxml', marks=pytest.mark.skipif(etree is None, reason="lxml não instalado"))]
+
+PAGINA = gerar_nota(3).decode()
+
+FIXTURES = {
+    'sem_itens': carregar_fixture('nfce_pr.html'),
+    'um_item': gerar_nota(1),
+    'sete_itens': gerar_nota(7),
+    'sessenta_itens': gerar_nota(60, produtos=60),
+}
+
+MALFORMADAS = {
+    'tr_sem_fechamento': PAGINA.replace('</tr>', '', 1),
+    'span_sem_fechamento': PAGINA.replace('</span>', '', 3),
+    'fechamentos_sobrando': PAGINA.replace('<table', '</div></span><table', 1),
+    'sem_fim_do_documento': PAGINA[:PAGINA.rindex('</body>')],
+    'tags_maiusculas': re.sub(r'<(/?)(tr|td|div|span|label)\b', lambda m: f'<{m.group(1)}{m.group(2).upper()}', PAGINA),
+    'item_dentro_de_script': PAGINA.replace(
+        '<table', '<script>var x = "<tr id=\'Item + 9\'><td>FALSO</td></tr>";</script><table', 1),
+    'item_em_comentario': PAGINA.replace('<table', '<!-- <tr id="Item + 9"><td>FALSO</td></tr> --><table', 1),
+    'entidades': PAGINA.replace('PRODUTO BENCHMARK 1<', 'P&Atilde;O &amp; LEITE<', 1),
+    'atributo_sem_aspas': PAGINA.replace('id="Item + 1"', 'id=Item1'),
+    'sem_pagamento': re.sub(r'<div id="linhaForma".*', '</body></html>', PAGINA, flags=re.S),
+    'sem_empresa': PAGINA.replace('id="u20"', 'id="u21"'),
+    'latin1': PAGINA.replace('utf-8', 'iso-8859-1').replace('PRODUTO BENCHMARK 1<', 'MAÇÃ<', 1).encode('latin-1'),
+    # O BeautifulSoup e o html.parser põem a coluna do valor total dentro da primeira, e o lxml fecha a
+    # célula aberta; o valor unitário termina no rótulo "Vl. Total" nos dois casos.
+    'td_sem_fechamento': PAGINA.replace('</td>', '', 1),
+    'item_sem_codigo': re.sub(r'<span class="RCod">.*?</span>', '', PAGINA, flags=re.S),
+    'rotulo_depois_do_valor': PAGINA.replace('4,99</span>', '4,99</span><span>Desconto: 0,50</span>'),
+}
+
+
+def padrao(pagina):
+    return NotaFiscalExtractor(url='', engine='padrao').parse(pagina)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('pagina', FIXTURES.values(), ids=FIXTURES.keys())
+def test_fixtures_iguais_ao_padrao(backend, pagina):
+    assert FastNotaParser(backend).parse(pagina) == padrao(pagina)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('pagina', MALFORMADAS.values(), ids=MALFORMADAS.keys())
+def test_malformadas_iguais_ao_padrao(backend, pagina):
+    assert FastNotaParser(backend).parse(pagina) == padrao(pagina)
+
+
+def test_parse_devolve_os_itens_como_dicts():
+    itens = NotaFiscalExtractor(url='', engine='rapido').parse(PAGINA)['Itens']
+    assert itens == padrao(PAGINA)['Itens']
+    assert itens[0] == {'Produto': 'PRODUTO BENCHMARK 1', 'Qtde': '2', 'UN': 'UN', 'Vl. Unit.': '4,99', 'Vl. Total': '9,98'}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_pagamento_incompleto_falha_nos_dois_engines(backend):
+    pagina = PAGINA.replace('class="txtMax2"', 'class="tx"')
+    with pytest.raises(AttributeError):
+        padrao(pagina)
+    with pytest.raises(AttributeError):
+        FastNotaParser(backend).parse(pagina)
+
+
+@pytest.mark.parametrize('engine', ['padrao', 'rapido'])
+@pytest.mark.parametrize('pagina', [*FIXTURES.values(), *MALFORMADAS.values()],
+                         ids=[*FIXTURES.keys(), *MALFORMADAS.keys()])
+def test_parse_stream_igual_ao_parse(engine, pagina):
+    extractor = NotaFiscalExtractor(url='', engine=engine)
+    nota, itens = extractor.parse_stream(pagina)
+    nota['Itens'] = [item.json() for item in itens]
+    assert nota == extractor.parse(pagina)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('bloco', [1, 64, 4096])
+def test_iter_items_em_blocos(backend, bloco):
+    pagina = FIXTURES['sessenta_itens']
+    assert [item.json() for item in FastNotaParser(backend).iter_items(pagina, bloco)] == padrao(pagina)['Itens']
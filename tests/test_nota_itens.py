@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from services.nota_itens import ItemRecord, parse_item  # noqa: E402
+
+
+@pytest.mark.parametrize('coluna', [
+    'ARROZ 5KG(Código: 7890001 )Qtde.:2UN:UNVl. Unit.:4,99',
+    'ARROZ 5KGQtde.:2UN:UNVl. Unit.:4,99',
+    'ARROZ 5KG(Código: 7890001 )Qtde.:2UN:UNVl. Unit.:4,99Vl. Total9,98',
+    'ARROZ 5KG(Código: 7890001 )Qtde.:2UN:UNVl. Unit.:4,99Desconto:0,50',
+], ids=['com_codigo', 'sem_codigo', 'valor_total_na_coluna', 'rotulo_depois_do_valor'])
+def test_parse_item(coluna):
+    assert parse_item(coluna, 'Vl. Total9,98') == ItemRecord('ARROZ 5KG', '2', 'UN', '4,99', '9,98')
+
+
+def test_parse_item_fica_com_o_nome_ate_o_primeiro_parentese():
+    item = parse_item('SABAO (PO)(Código: 1 )Qtde.:1UN:KGVl. Unit.:1.234,50', 'Vl. Total1.234,50')
+    assert item == ItemRecord('SABAO', '1', 'KG', '1.234,50', '1.234,50')
+
+
+def test_parse_item_sem_quantidade_falha():
+    with pytest.raises(ValueError):
+        parse_item('ARROZ(Código: 1 )UN:UNVl. Unit.:4,99', 'Vl. Total4,99')